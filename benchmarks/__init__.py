@@ -0,0 +1,4 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
@@ -0,0 +1,263 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+import logging as log
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from hicmc import typing as t
+from hicmc import constants as consts
+from hicmc import statistics as stats
+from hicmc import masking
+from hicmc import transform
+from hicmc import domain
+from hicmc import codec
+from hicmc.encode import encode_chromosome
+from hicmc.wrapper import jbig
+from .synthetic import generate_chromosome
+
+SIZES_DEFAULT = [1_000, 2_000, 5_000, 10_000, 20_000, 30_000]
+
+#? Bytes per pixel of the uncompressed input (bin1_id, bin2_id and count as int32, as in the cooler pixel-table)
+RAW_BYTES_PER_PIXEL = 12
+
+def _peak_rss_mb() -> float:
+    #? High-water mark of the process (ru_maxrss is in kilobytes on Linux, in bytes on macOS)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss /= 1024
+
+    return peak_rss / 1024
+
+class StageTimer:
+    #? Records wall-time (minimum of repeated runs), throughput and peak RSS of each stage
+
+    def __init__(
+        self,
+        npixels:int,
+        repeat:int=1
+    ):
+        self.npixels = npixels
+        self.repeat = repeat
+        self.stages = {}
+
+    def run(
+        self,
+        name:str,
+        func:t.Callable[..., t.Any],
+        *args,
+        **kwargs
+    ) -> t.Any:
+
+        seconds = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds.append(time.perf_counter() - start)
+
+        self.stages[name] = dict(
+            seconds=min(seconds),
+            pixels_per_s=self.npixels / max(min(seconds), 1e-9),
+            peak_rss_mb=_peak_rss_mb(),
+        )
+        log.info(f'{name:>24}: {min(seconds):10.4f}s')
+        return result
+
+    def add_sizes(
+        self,
+        name:str,
+        input_bytes:int,
+        output_bytes:int
+    ):
+        self.stages[name].update(
+            input_bytes=input_bytes,
+            output_bytes=output_bytes,
+            compression_ratio=input_bytes / max(output_bytes, 1),
+        )
+
+def benchmark_size(
+    n:int,
+    seed:int,
+    repeat:int
+) -> t.Dict[str, t.Any]:
+
+    #? Same stages as encode.encode_chromosome, each stage is timed on its own
+    log.info(f'Benchmarking {n} bins')
+    chrom = generate_chromosome(n, seed=seed)
+    timer = StageTimer(chrom.contact_mat.nnz, repeat)
+
+    contact_mat, mask = masking.mask_sparse(chrom.contact_mat)
+    weights = np.nan_to_num(chrom.weights[~mask], nan=1)
+    balanced_contact_mat = contact_mat.balance(weights)
+    boundaries = np.flatnonzero(chrom.boundary_mask[~mask])
+    dist_mat = transform.DistanceMatrix(np.flatnonzero(~mask))
+
+    #? Dense distance-matrix (the encoder computes blocks on access instead)
+    timer.run('gen_dist_mat', transform.gen_dist_mat, contact_mat.n)
+
+    #? The median deviation is used as threshold, so both simple and complex model are used
+    domain_stats = timer.run('map_domains', stats.map_domains, balanced_contact_mat, boundaries, stats.STATISTIC_FUNCS['deviation'])
+    domain_mask_threshold = float(np.median(domain_stats))
+    domain_mask = domain_stats > domain_mask_threshold
+
+    domain_index = timer.run('domain_index', domain.DomainIndex, dist_mat, boundaries, domain_mask)
+    domain_values, dist_table = timer.run(
+        'build_model',
+        domain.build_model,
+        balanced_contact_mat,
+        domain_index,
+        stats.STATISTIC_FUNCS['average']
+    )
+    model = timer.run('reconstruct_model', domain.reconstruct_model, domain_index, domain_values, dist_table)
+    model = transform.revert_balanced_matrix(model, weights)
+
+    contact_mask, contact_data = timer.run(
+        'transform_argsort',
+        transform.transform_argsort_coo,
+        contact_mat.row_ids,
+        contact_mat.col_ids,
+        contact_mat.data,
+        model
+    )
+    del model
+
+    #? Codecs of the contact-streams, unavailable codecs (e.g. missing third-party tools) are reported as error
+    _payload = timer.run('jbig.encode', jbig.encode_binary_matrix, contact_mask)
+    timer.add_sizes('jbig.encode', contact_mask.size // 8, len(_payload))
+    timer.run('jbig.decode', jbig.decode_binary_matrix, _payload)
+
+    data = contact_data.tobytes()
+    for codec_name in codec.CODECS:
+        try:
+            _payload = timer.run(f'{codec_name}.encode', codec.encode_bytes, data, codec_name, model_order=contact_data.dtype.itemsize*2)
+        except RuntimeError as err:
+            log.warning(f'Codec {codec_name} is not available: {err}')
+            timer.stages[f'{codec_name}.encode'] = dict(error=str(err))
+            continue
+
+        timer.add_sizes(f'{codec_name}.encode', len(data), len(_payload))
+        timer.run(f'{codec_name}.decode', codec.decode_bytes, _payload)
+
+    #? Complete encoder, compression-ratio of all streams w.r.t. the uncompressed pixel-table
+    streams = timer.run(
+        'encode_chromosome',
+        encode_chromosome,
+        chrom.contact_mat,
+        chrom.weights,
+        chrom.boundary_mask,
+        stats.STATISTIC_FUNCS['deviation'],
+        domain_mask_threshold,
+        consts.WEIGHTS_PRECISION_DEFAULT,
+        consts.DOMAIN_VALUES_PRECISION_DEFAULT,
+        consts.DISTANCE_TABLE_PRECISION_DEFAULT
+    )
+    timer.add_sizes(
+        'encode_chromosome',
+        chrom.contact_mat.nnz * RAW_BYTES_PER_PIXEL,
+        sum(len(stream.payload) for stream in streams.values())
+    )
+
+    return dict(
+        n=n,
+        nbins=contact_mat.n,
+        npixels=chrom.contact_mat.nnz,
+        stages=timer.stages
+    )
+
+def _git_commit() -> t.Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    results = []
+    for n in args.sizes:
+        #? One process per size, so the peak RSS of one size does not include the previous sizes
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(benchmark_size, n, args.seed, args.repeat).result())
+
+    report = dict(
+        meta=dict(
+            commit=_git_commit(),
+            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            python=platform.python_version(),
+            numpy=np.__version__,
+            platform=platform.platform(),
+            seed=args.seed,
+            repeat=args.repeat,
+        ),
+        results=results
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    log.info(f'Results written to {args.output}')
+
+def compare(args):
+    #? Relative change of the wall-time of every stage and size present in both results
+    with open(args.baseline, 'r') as f:
+        baseline = {result['n']: result['stages'] for result in json.load(f)['results']}
+
+    with open(args.current, 'r') as f:
+        current = {result['n']: result['stages'] for result in json.load(f)['results']}
+
+    nregressions = 0
+    print(f'{"n":>8} {"stage":>24} {"baseline":>10} {"current":>10} {"change":>8}')
+    for n in sorted(set(baseline).intersection(current)):
+        for name, stage in current[n].items():
+            if 'seconds' not in stage or 'seconds' not in baseline[n].get(name, {}):
+                continue
+
+            change = stage['seconds'] / max(baseline[n][name]['seconds'], 1e-9) - 1
+            flag = ''
+            if change > args.threshold:
+                flag = ' !'
+                nregressions += 1
+
+            print(f'{n:>8} {name:>24} {baseline[n][name]["seconds"]:10.4f} {stage["seconds"]:10.4f} {change:+8.1%}{flag}')
+
+    if nregressions:
+        sys.exit(f'{nregressions} stage(s) slower by more than {args.threshold:.0%}')
+
+def _parse_sizes(value:str) -> t.List[int]:
+    try:
+        return [int(n) for n in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid sizes: {value}')
+
+parser = argparse.ArgumentParser(
+    prog=f'{consts.PROGRAM_NAME} benchmark',
+    description=f'Benchmark of the {consts.PROGRAM_NAME} stages on synthetic contact-matrices',
+)
+subparsers = parser.add_subparsers(dest='mode', help='Mode, either RUN or COMPARE')
+
+run_parser = subparsers.add_parser('RUN')
+run_parser.add_argument('--sizes', type=_parse_sizes, default=SIZES_DEFAULT, help='Comma-separated list of matrix sizes (bins), default: ' + ','.join(map(str, SIZES_DEFAULT)))
+run_parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic contact-matrices, default: 0')
+run_parser.add_argument('--repeat', type=int, default=1, help='Number of runs per stage, the minimum wall-time is reported, default: 1')
+run_parser.add_argument('-o', '--output', type=str, default='benchmark.json', help='Output file (JSON), default: benchmark.json')
+
+compare_parser = subparsers.add_parser('COMPARE')
+compare_parser.add_argument('--threshold', type=float, default=0.1, help='Report stages slower by more than this fraction, default: 0.1')
+compare_parser.add_argument('baseline', type=str, help='Results of the baseline (JSON)')
+compare_parser.add_argument('current', type=str, help='Results to compare (JSON)')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    log.basicConfig(format='[%(asctime)s] [%(levelname)-8s] --- [%(processName)-11s] %(message)s', level=log.INFO)
+
+    if args.mode == 'RUN':
+        run(args)
+    elif args.mode == 'COMPARE':
+        compare(args)
+    else:
+        parser.print_help()
@@ -0,0 +1,100 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import numpy as np
+from hicmc import typing as t
+from hicmc.sparse import SparseContactMatrix
+
+class SyntheticChromosome(t.NamedTuple):
+    contact_mat: SparseContactMatrix
+    #? Balancing-weights (float32), NaN for masked bins
+    weights: t.NDArray[np.floating]
+    #? Insulation-boundaries as in the insulation-table (with some noise w.r.t. the TADs)
+    boundary_mask: t.NDArray[np.bool_]
+
+def _tad_starts(
+    rng:np.random.Generator,
+    n:int,
+    tad_size:float
+) -> t.NDArray[np.integer]:
+
+    #? TAD-sizes are geometrically distributed, at least 2 bins
+    sizes = 2 + rng.geometric(1 / max(tad_size - 1, 1), size=n // 2 + 1)
+    starts = np.cumsum(sizes) - sizes[0]
+    return starts[starts < n]
+
+def _sample_distances(
+    rng:np.random.Generator,
+    n:int,
+    decay:float,
+    size:int
+) -> t.NDArray[np.integer]:
+
+    #? Power-law distance decay, P(d) ~ (d + 1)^-decay
+    cdf = np.cumsum((np.arange(n) + 1.0) ** -decay)
+    return np.minimum(np.searchsorted(cdf, rng.random(size) * cdf[-1], side='right'), n - 1)
+
+def generate_chromosome(
+    n:int,
+    seed:int=0,
+    depth:float=100,
+    decay:float=1.1,
+    tad_size:float=20,
+    tad_fraction:float=0.3,
+    mask_fraction:float=0.05,
+    boundary_noise:float=0.1
+) -> SyntheticChromosome:
+
+    #? Simulates n * depth read-pairs: background read-pairs follow the distance decay, a fraction of
+    #? the read-pairs is drawn within TADs. Read-pairs are binned into the upper-triangle of an n x n matrix.
+    rng = np.random.default_rng(seed)
+    nreads = int(n * depth)
+    ntad_reads = int(nreads * tad_fraction)
+
+    #? Background
+    dists = _sample_distances(rng, n, decay, nreads - ntad_reads)
+    row_ids = (rng.random(len(dists)) * (n - dists)).astype(np.int64)
+    col_ids = row_ids + dists
+
+    #? TADs, larger TADs receive more read-pairs (proportional to their area)
+    tad_starts = _tad_starts(rng, n, tad_size)
+    tad_sizes = np.diff(tad_starts, append=n)
+    tad_ids = rng.choice(len(tad_starts), size=ntad_reads, p=tad_sizes**2 / np.sum(tad_sizes**2))
+    tad_a = tad_starts[tad_ids] + (rng.random(ntad_reads) * tad_sizes[tad_ids]).astype(np.int64)
+    tad_b = tad_starts[tad_ids] + (rng.random(ntad_reads) * tad_sizes[tad_ids]).astype(np.int64)
+    row_ids = np.concatenate([row_ids, np.minimum(tad_a, tad_b)])
+    col_ids = np.concatenate([col_ids, np.maximum(tad_a, tad_b)])
+
+    #? Masked bins: scattered bins and one contiguous gap (e.g. centromere), read-pairs of masked bins are removed
+    nmasked = int(n * mask_fraction)
+    mask = np.zeros(n, dtype=bool)
+    mask[rng.choice(n, size=nmasked // 2, replace=False)] = True
+    gap_start = n // 3
+    mask[gap_start:gap_start + nmasked - nmasked // 2] = True
+    keep = ~(mask[row_ids] | mask[col_ids])
+    row_ids, col_ids = row_ids[keep], col_ids[keep]
+
+    #? Count read-pairs per pixel, unique keys are ordered by row, then col
+    keys, counts = np.unique(row_ids * n + col_ids, return_counts=True)
+    row_ids, col_ids = np.divmod(keys, n)
+    counts = counts.astype(np.min_scalar_type(counts.max(initial=0)))
+    contact_mat = SparseContactMatrix(n, row_ids, col_ids, counts)
+
+    #? Coverage-based weights (mean 1), masked bins have no weight
+    coverage = (
+        np.bincount(row_ids, weights=counts, minlength=n)
+        + np.bincount(col_ids, weights=counts, minlength=n)
+    )
+    weights = coverage / np.mean(coverage[coverage > 0])
+    weights[coverage == 0] = np.nan
+    weights = weights.astype(np.float32)
+
+    #? Boundaries at the TAD-starts, some are missed and some are spurious
+    boundary_mask = np.zeros(n, dtype=bool)
+    boundary_mask[tad_starts[1:]] = True
+    flip = rng.random(n) < boundary_noise * len(tad_starts) / n
+    boundary_mask ^= flip
+
+    return SyntheticChromosome(contact_mat, weights, boundary_mask)
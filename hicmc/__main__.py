@@ -2,18 +2,14 @@
 # @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
 # @copyright Institute fuer Informationsverarbeitung
 
-import os
-import shutil
 import logging as log
 import argparse
-import numpy as np
 from . import utils
-from . import typing as t
 from . import constants as consts
 from . import statistics as stats
-from . import domain
-from .encode import encode
-from .decode import decode
+from . import codec
+from . import output
+from . import profiling
 
 parser = argparse.ArgumentParser(
     prog=consts.PROGRAM_NAME,
@@ -22,11 +18,12 @@ parser = argparse.ArgumentParser(
 parser.add_argument('-l', '--log_level', help='log level', choices=consts.AVAIL_LOG_LEVELS.keys(), default='info')
 parser.add_argument('--dry-run', action='store_true')
 parser.add_argument('--overwrite', action='store_true')
-subparsers = parser.add_subparsers(dest='mode', help='Mde, either ENCODE or DECODE')
+parser.add_argument('--profile-report', type=str, default=None, help='Write wall-time, CPU-time and peak RSS of each stage and chromosome (and the stream-sizes) to this JSON file')
+subparsers = parser.add_subparsers(dest='mode', help='Mde, either ENCODE, DECODE, VERIFY or SWEEP')
 
 encode_parser = subparsers.add_parser('ENCODE')
-encode_parser.add_argument('--check-result', action='store_true', help="Check the decoded contact matrix equals the original matrix")
-encode_parser.add_argument('--insulation-file', type=str)
+encode_parser.add_argument('--check-result', action='store_true', help="Check the decoded contact matrix equals the original matrix (in memory, reusing the model)")
+encode_parser.add_argument('--insulation-file', type=str, help='Insulation table, {res} is replaced by the resolution')
 encode_parser.add_argument('--insulation-window', type=int)
 encode_parser.add_argument('--insulation-window-mult', type=int)
 encode_parser.add_argument('--weights-precision', type=int, default=consts.WEIGHTS_PRECISION_DEFAULT)
@@ -34,14 +31,42 @@ encode_parser.add_argument('--domain-mask-statistic', choices=stats.STATISTIC_FU
 encode_parser.add_argument('--domain-mask-threshold', type=float, default=1)
 encode_parser.add_argument('--domain-values-precision', type=int, default=consts.DOMAIN_VALUES_PRECISION_DEFAULT, help='Number of bits used for floating-point compression')
 encode_parser.add_argument('--distance-table-precision', type=int, default=consts.DISTANCE_TABLE_PRECISION_DEFAULT, help='Number of bits used for floating-point compression')
-encode_parser.add_argument('--balancing', type=str, default='KR', help='Select a balancing method, default: KR')
+encode_parser.add_argument('--balancing', type=str, default=consts.BALANCING_DEFAULT, help=f'Select a balancing method, default: {consts.BALANCING_DEFAULT}')
+encode_parser.add_argument('--contact-data-codec', choices=codec.CODECS.keys(), default=consts.CONTACT_DATA_CODEC_DEFAULT, help=f'Entropy codec of the contact-data, default: {consts.CONTACT_DATA_CODEC_DEFAULT}')
+encode_parser.add_argument('--tile-size', type=int, default=None, help='Order and code the contact-data in independent tiles of this many bins, enables region queries')
+encode_parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of chromosomes encoded in parallel, default: 1')
+encode_parser.add_argument('--resume', action='store_true', help='Keep the chromosomes of the existing output whose input and parameters did not change, only encode the others')
 encode_parser.add_argument('input_file', type=str, help='input file path (.cool or .mcool)')
-encode_parser.add_argument('resolution', type=int)
-encode_parser.add_argument('output_directory', type=str)
+encode_parser.add_argument('resolution', type=utils.parse_resolutions, help='Resolution, comma-separated list of resolutions or all (all resolutions of the .mcool file)')
+encode_parser.add_argument('output', type=str, help='Output file path (single-file container)')
 
 decode_parser = subparsers.add_parser('DECODE')
+decode_parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of chromosomes decoded in parallel, default: 1')
+decode_parser.add_argument('--resolution', type=int, default=None, help='Resolution to decode, required if the payload holds multiple resolutions')
+decode_parser.add_argument('--output-format', choices=output.OUTPUT_FORMATS, default=consts.OUTPUT_FORMAT_DEFAULT, help=f'Format of the decoded contact matrices, default: {consts.OUTPUT_FORMAT_DEFAULT}')
 decode_parser.add_argument('input', type=str, help='Path to the HiCMC encoded payload')
-decode_parser.add_argument('output', type=str, help='Output directory')
+decode_parser.add_argument('output', type=str, help='Output directory, output file (.cool or .mcool) for output-format cool')
+
+verify_parser = subparsers.add_parser('VERIFY')
+verify_parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of chromosomes verified in parallel, default: 1')
+verify_parser.add_argument('input', type=str, help='Path to the HiCMC encoded payload')
+
+sweep_parser = subparsers.add_parser('SWEEP')
+sweep_parser.add_argument('--insulation-file', type=str, help='Insulation table, {res} is replaced by the resolution')
+sweep_parser.add_argument('--insulation-window', type=int)
+sweep_parser.add_argument('--insulation-window-mult', type=int)
+sweep_parser.add_argument('--weights-precision', type=utils.parse_list(int), default=[consts.WEIGHTS_PRECISION_DEFAULT], help='Comma-separated list of weights-precisions')
+sweep_parser.add_argument('--domain-mask-statistic', type=utils.parse_list(str), default=['deviation'], help='Comma-separated list of statistics, choices: ' + ','.join(stats.STATISTIC_FUNCS))
+sweep_parser.add_argument('--domain-mask-threshold', type=utils.parse_list(float), default=[1], help='Comma-separated list of thresholds')
+sweep_parser.add_argument('--domain-values-precision', type=utils.parse_list(int), default=[consts.DOMAIN_VALUES_PRECISION_DEFAULT], help='Comma-separated list of domain-values-precisions')
+sweep_parser.add_argument('--distance-table-precision', type=utils.parse_list(int), default=[consts.DISTANCE_TABLE_PRECISION_DEFAULT], help='Comma-separated list of distance-table-precisions')
+sweep_parser.add_argument('--balancing', type=str, default=consts.BALANCING_DEFAULT, help=f'Select a balancing method, default: {consts.BALANCING_DEFAULT}')
+sweep_parser.add_argument('--contact-data-codec', choices=codec.CODECS.keys(), default=consts.CONTACT_DATA_CODEC_DEFAULT, help=f'Entropy codec of the contact-data, default: {consts.CONTACT_DATA_CODEC_DEFAULT}')
+sweep_parser.add_argument('--tile-size', type=int, default=None, help='Order and code the contact-data in independent tiles of this many bins')
+sweep_parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of chromosomes evaluated in parallel, default: 1')
+sweep_parser.add_argument('input_file', type=str, help='input file path (.cool or .mcool)')
+sweep_parser.add_argument('resolution', type=utils.parse_resolutions, help='Resolution, comma-separated list of resolutions or all (all resolutions of the .mcool file)')
+sweep_parser.add_argument('output', type=str, help='Output file path of the report (JSON)')
 
 if __name__ == '__main__':
     args = parser.parse_args()
@@ -51,11 +76,28 @@ if __name__ == '__main__':
 
     utils.set_log_level(args.log_level)
     utils.print_banner()
+
+    if args.profile_report is not None:
+        profile_report = profiling.ProfileReport()
+        profiling.add_hook(profile_report)
     
+    #? Modes are imported on use, so that e.g. --help does not import cooler and pandas
     if args.mode == 'ENCODE':
+        from .encode import encode
         encode(args)
     elif args.mode == 'DECODE':
         # raise NotImplementedError(f'Mode not yet implemented: {args.mode}')
+        from .decode import decode
         decode(args)
+    elif args.mode == 'VERIFY':
+        from .verify import verify
+        verify(args)
+    elif args.mode == 'SWEEP':
+        from .sweep import sweep
+        sweep(args)
     else:
-        raise ValueError(f'Invalid value for mode: {args.mode}')
\ No newline at end of file
+        raise ValueError(f'Invalid value for mode: {args.mode}')
+
+    if args.profile_report is not None:
+        profile_report.save(args.profile_report)
+        log.info(f'Profile report written to {args.profile_report}')
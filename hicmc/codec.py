@@ -0,0 +1,85 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import bz2
+import lzma
+import enum
+import struct
+from . import typing as t
+from . import constants as consts
+from .wrapper import ppmd
+
+class CodecID(enum.IntEnum):
+    PPMD = 0
+    LZMA = 1
+    BZ2 = 2
+    SEVEN_ZIP_PPMD = 3
+
+#? Signature of a 7z archive, i.e. contact-data encoded before the codec-id was written to the payload
+SEVEN_ZIP_SIGNATURE = b'7z\xbc\xaf\x27\x1c'
+
+#? Model-order (1 byte), memory-size (4 bytes) and number of decoded bytes (8 bytes)
+_PPMD_HEADER = struct.Struct('<BIQ')
+
+#? pyppmd is imported on use, so that the CLI (which imports this module for its choices) does not depend on it
+
+def _ppmd_encode(data:bytes, model_order:int) -> bytes:
+    import pyppmd
+
+    #? PPMd variant H, the variant used by 7z
+    encoder = pyppmd.Ppmd7Encoder(model_order, consts.PPMD_MEM_SIZE)
+    _payload = encoder.encode(data) + encoder.flush(endmark=False)
+    return _PPMD_HEADER.pack(model_order, consts.PPMD_MEM_SIZE, len(data)) + _payload
+
+def _ppmd_decode(payload:bytes) -> bytes:
+    import pyppmd
+
+    model_order, mem_size, nbytes = _PPMD_HEADER.unpack_from(payload)
+    decoder = pyppmd.Ppmd7Decoder(model_order, mem_size)
+    return decoder.decode(payload[_PPMD_HEADER.size:], nbytes)
+
+def _lzma_encode(data:bytes, model_order:int) -> bytes:
+    return lzma.compress(data)
+
+def _bz2_encode(data:bytes, model_order:int) -> bytes:
+    return bz2.compress(data)
+
+def _seven_zip_ppmd_encode(data:bytes, model_order:int) -> bytes:
+    return ppmd.encode_bytes(data, model_order=model_order)
+
+class Codec(t.NamedTuple):
+    codec_id: CodecID
+    encode: t.Callable[[bytes, int], bytes]
+    decode: t.Callable[[bytes], bytes]
+
+CODECS = {
+    'ppmd': Codec(CodecID.PPMD, _ppmd_encode, _ppmd_decode),
+    'lzma': Codec(CodecID.LZMA, _lzma_encode, lzma.decompress),
+    'bz2': Codec(CodecID.BZ2, _bz2_encode, bz2.decompress),
+    '7z-ppmd': Codec(CodecID.SEVEN_ZIP_PPMD, _seven_zip_ppmd_encode, ppmd.decode_bytes),
+}
+
+_CODECS_BY_ID = {codec.codec_id: codec for codec in CODECS.values()}
+
+def encode_bytes(
+    data:bytes,
+    codec_name:str=consts.CONTACT_DATA_CODEC_DEFAULT,
+    model_order:int=2
+) -> bytes:
+
+    #? The model-order is only used by PPMd codecs
+    codec = CODECS[codec_name]
+    return bytes([codec.codec_id]) + codec.encode(data, model_order)
+
+def decode_bytes(payload:bytes) -> bytes:
+    if payload.startswith(SEVEN_ZIP_SIGNATURE):
+        return ppmd.decode_bytes(payload)
+
+    try:
+        codec = _CODECS_BY_ID[CodecID(payload[0])]
+    except (IndexError, ValueError):
+        raise ValueError('Invalid payload, unknown codec!')
+
+    return codec.decode(payload[1:])
@@ -5,26 +5,22 @@
 
 import os
 import enum
+import functools
 import logging as log
-from git.repo import Repo
 from . import typing as t
 
 PROGRAM_NAME = 'HiCMC'
 PROGRAM_LONGNAME = 'High-Efficiency Contact Matrix Compressor'
 PROGRAM_DESC = PROGRAM_LONGNAME
 
-def get_root_path() -> str:
-    #? Documentation: https://gitpython.readthedocs.io/en/stable/reference.html#module-git.repo.base
-    repository = Repo('.', search_parent_directories=True)
+#? Directory of the third-party tools (jbigkit, 7z), defaults to third-party/ of the source tree
+THIRD_PARTY_PATH_ENV = 'HICMC_THIRD_PARTY_PATH'
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-    _out = repository.working_tree_dir
-    if not isinstance(_out, str):
-        raise RuntimeError(f'Output is not a string, Type: {type(_out)}')
-
-    return _out
-
-ROOT_PATH = get_root_path()
-THIRD_PARTY_PATH = os.path.join(ROOT_PATH, 'third-party')
+@functools.lru_cache(maxsize=None)
+def get_third_party_path() -> str:
+    #? Resolved on first use of a third-party tool, not at import
+    return os.environ.get(THIRD_PARTY_PATH_ENV, os.path.join(ROOT_PATH, 'third-party'))
 
 AVAIL_LOG_LEVELS = {
     'critical': log.CRITICAL,
@@ -39,6 +35,39 @@ DOMAIN_VALUES_PRECISION_DEFAULT: t.Union[t.Literal[32], t.Literal[64]] = 32
 DISTANCE_TABLE_PRECISION_DEFAULT: t.Union[t.Literal[32], t.Literal[64]] = 32
 MODEL_PRECISION: t.Union[t.Literal[32], t.Literal[64]] = 32
 
+#? Version of the model computation of the encoder, part of the manifest-parameters (see encode.encode) as it changes the
+#? payload without changing the container-layout, chromosomes encoded by an older encoder are stale.
+#? Version 2: domain-values and distance-table from moments accumulated in double precision
+#? Version 3: distance-table bit-identical to np.average of each group (as version 1)
+MODEL_VERSION = 3
+
+#? Balancing-weights of the input, hicmc divides the contacts by them
+BALANCING_DEFAULT = 'KR'
+#? Balancing-weights stored in divisive form by hic2cool (see cooler.api), weights of cooler itself are multiplicative
+DIVISIVE_WEIGHTS = ['KR', 'VC', 'VC_SQRT']
+
+#? Entropy-codec of the contact-data (see codec.CODECS)
+CONTACT_DATA_CODEC_DEFAULT = 'ppmd'
+#? Memory used by in-process PPMd (same as the 7z default)
+PPMD_MEM_SIZE = 16 << 20
+
+#? Number of pixels read from the cooler pixel-table at once
+PIXELS_CHUNKSIZE = 10_000_000
+
+#? Number of cached index-arrays per transform (keyed by matrix size)
+INDEX_CACHE_SIZE = 4
+#? Number of model-cells numbered at once when sorting the model (bounds the temporary index-arrays)
+SORT_CHUNKSIZE = 10_000_000
+
+#? Suffix of the index of an insulation-table, stored next to the table
+INSULATION_INDEX_SUFFIX = '.hicmc-index'
+
+#? Output-format of the decoder (see output.OUTPUT_FORMATS)
+OUTPUT_FORMAT_DEFAULT = 'csv'
+#? Number of pixels per decoded chunk and number of chunks queued for the background writer
+OUTPUT_CHUNKSIZE = 1_000_000
+OUTPUT_QUEUE_SIZE = 2
+
 class Axis(enum.IntEnum):
     ROW = 0
     COL = 1
@@ -0,0 +1,286 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import json
+import zlib
+import struct
+from . import typing as t
+
+#? Layout: header | streams | index (JSON) | footer
+#? The index stores meta and offset, length, dtype and CRC32 of every stream per resolution, the footer the position of the index.
+#? The manifest of a resolution stores source-key, input-hash and parameters of each chromosome (see encode.encode), if known.
+CONTAINER_MAGIC = b'HICMC\x00'
+#? Version 2: contact-data ordered by the stable model-order (meta: stable_order)
+#? Version 3: multiple resolutions per container, older versions hold one resolution (index: meta, chromosomes)
+CONTAINER_VERSION = 3
+
+_HEADER = struct.Struct('<6sH')
+_FOOTER = struct.Struct('<QQ6s')
+
+#? Streams of one chromosome, named after the files of the (legacy) directory layout
+MODEL_STREAM_NAMES = [
+    'mask.bin',
+    'weights.fpzip',
+    'boundaries.bin',
+    'domain-mask.jbig',
+    'domain-values.fpizp',
+    'distance-table.fpizp',
+]
+STREAM_NAMES = MODEL_STREAM_NAMES + [
+    'contact-mask.jbig',
+    'contact-data.ppmd',
+]
+
+def tile_stream_names(
+    tile_row:int,
+    tile_col:int
+) -> t.Tuple[str, str]:
+
+    #? Contact-mask and contact-data streams of one tile (tiled encoding)
+    return f'contact-mask-{tile_row}-{tile_col}.jbig', f'contact-data-{tile_row}-{tile_col}.ppmd'
+
+def stream_sizes(streams:t.Dict[str, 'Stream']) -> t.Dict[str, int]:
+    #? Size of each of the STREAM_NAMES, the streams of all tiles are summed up
+    sizes = dict.fromkeys(STREAM_NAMES, 0)
+    for name, stream in streams.items():
+        if name.startswith('contact-mask-'):
+            name = 'contact-mask.jbig'
+        elif name.startswith('contact-data-'):
+            name = 'contact-data.ppmd'
+
+        sizes[name] += len(stream.payload)
+
+    return sizes
+
+class Stream(t.NamedTuple):
+    payload: bytes
+    #? dtype of the encoded array, None if unknown (legacy directory layout)
+    dtype: t.Optional[str]
+
+class ContainerWriter:
+    #? Written to a temporary file, which replaces fpath on close, i.e. fpath is either the complete old or new container
+    def __init__(
+        self,
+        fpath:str
+    ):
+        self.fpath = fpath
+        self.resolutions = {}
+        self._tmp_fpath = f'{fpath}.tmp'
+        self._file = open(self._tmp_fpath, 'wb')
+        self._file.write(_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION))
+
+    def add_resolution(
+        self,
+        meta:t.Dict[str, t.Any]
+    ):
+        self.resolutions[str(meta['res'])] = dict(meta=meta, chromosomes={}, manifest={})
+
+    def write_chromosome(
+        self,
+        res:int,
+        chr_name:str,
+        streams:t.Dict[str, Stream],
+        manifest:t.Optional[t.Dict[str, t.Any]]=None
+    ):
+        index = {}
+        for name, stream in streams.items():
+            index[name] = dict(
+                offset=self._file.tell(),
+                length=len(stream.payload),
+                dtype=stream.dtype,
+                crc32=zlib.crc32(stream.payload)
+            )
+            self._file.write(stream.payload)
+
+        self.resolutions[str(res)]['chromosomes'][chr_name] = index
+        if manifest is not None:
+            self.resolutions[str(res)]['manifest'][chr_name] = manifest
+
+    def close(self):
+        _payload = json.dumps(dict(resolutions=self.resolutions)).encode('utf-8')
+        index_offset = self._file.tell()
+        self._file.write(_payload)
+        self._file.write(_FOOTER.pack(index_offset, len(_payload), CONTAINER_MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_fpath, self.fpath)
+
+    def __enter__(self) -> 'ContainerWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            #? Do not leave a container without index behind
+            self._file.close()
+            os.remove(self._tmp_fpath)
+
+def _check_payload(
+    payload:bytes,
+    entry:t.Dict[str, t.Any]
+) -> t.Optional[bool]:
+
+    if len(payload) != entry['length']:
+        return False
+
+    #? Containers written before checksums were introduced
+    if 'crc32' not in entry:
+        return None
+
+    return zlib.crc32(payload) == entry['crc32']
+
+def _read_index(fpath:str) -> t.Dict[str, t.Dict[str, t.Any]]:
+    #? Index of every resolution (meta and chromosomes), keyed by the resolution
+    with open(fpath, 'rb') as file:
+        magic, version = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != CONTAINER_MAGIC:
+            raise ValueError(f'Not a HiCMC container: {fpath}')
+
+        if version > CONTAINER_VERSION:
+            raise ValueError(f'Unsupported container version: {version}')
+
+        file.seek(-_FOOTER.size, os.SEEK_END)
+        index_offset, index_length, magic = _FOOTER.unpack(file.read(_FOOTER.size))
+        if magic != CONTAINER_MAGIC:
+            raise ValueError(f'Container is truncated: {fpath}')
+
+        file.seek(index_offset)
+        index = json.loads(file.read(index_length))
+
+    if 'resolutions' not in index:
+        return {str(index['meta']['res']): index}
+
+    return index['resolutions']
+
+class ContainerReader:
+    def __init__(
+        self,
+        fpath:str,
+        res:t.Optional[int]=None
+    ):
+        self.fpath = fpath
+        resolutions = _read_index(fpath)
+        self.resolutions = sorted(int(_res) for _res in resolutions)
+
+        #? The only resolution is selected by default
+        if res is None:
+            if len(resolutions) > 1:
+                raise ValueError(f'Container holds multiple resolutions, select one of {self.resolutions}: {fpath}')
+
+            res = self.resolutions[0]
+
+        if str(res) not in resolutions:
+            raise ValueError(f'Resolution {res} not found, available: {self.resolutions}')
+
+        self.meta = resolutions[str(res)]['meta']
+        self.chromosomes = resolutions[str(res)]['chromosomes']
+        #? Containers written before manifests were introduced have none
+        self.manifest = resolutions[str(res)].get('manifest', {})
+
+    @property
+    def chr_names(self) -> t.List[str]:
+        return self.meta['chr_names']
+
+    def read_chromosome(
+        self,
+        chr_name:str,
+        names:t.Optional[t.Iterable[str]]=None
+    ) -> t.Dict[str, Stream]:
+
+        #? Only read the streams of the requested chromosome, optionally only the given (existing) streams
+        index = self.chromosomes[chr_name]
+        if names is not None:
+            index = {name: index[name] for name in names if name in index}
+
+        streams = {}
+        with open(self.fpath, 'rb') as file:
+            for name, entry in index.items():
+                file.seek(entry['offset'])
+                payload = file.read(entry['length'])
+                if _check_payload(payload, entry) is False:
+                    raise ValueError(f'Stream {name} of chromosome {chr_name} is corrupted: {self.fpath}')
+
+                streams[name] = Stream(payload, entry['dtype'])
+
+        return streams
+
+    def check_chromosome(
+        self,
+        chr_name:str
+    ) -> t.Dict[str, t.Optional[bool]]:
+
+        #? Check the streams of one chromosome against their checksums, None if a stream has no checksum
+        status = {}
+        with open(self.fpath, 'rb') as file:
+            for name, entry in self.chromosomes[chr_name].items():
+                file.seek(entry['offset'])
+                status[name] = _check_payload(file.read(entry['length']), entry)
+
+        return status
+
+class DirectoryReader:
+    #? Legacy layout: chr_names.json and one NN-NN directory holding one file per stream for each chromosome
+    def __init__(
+        self,
+        dpath:str,
+        res:t.Optional[int]=None
+    ):
+        self.dpath = dpath
+        with open(os.path.join(dpath, 'chr_names.json'), 'r') as f:
+            self.meta = json.load(f)
+
+        self.resolutions = [self.meta['res']]
+        if res is not None and res != self.meta['res']:
+            raise ValueError(f'Resolution {res} not found, available: {self.resolutions}')
+
+    @property
+    def chr_names(self) -> t.List[str]:
+        return self.meta['chr_names']
+
+    def read_chromosome(
+        self,
+        chr_name:str,
+        names:t.Optional[t.Iterable[str]]=None
+    ) -> t.Dict[str, Stream]:
+
+        chr_idx = self.chr_names.index(chr_name)
+        chr_dpath = os.path.join(self.dpath, f'{chr_idx:02}-{chr_idx:02}')
+
+        streams = {}
+        for name in STREAM_NAMES if names is None else set(STREAM_NAMES).intersection(names):
+            with open(os.path.join(chr_dpath, name), 'rb') as file:
+                streams[name] = Stream(file.read(), None)
+
+        return streams
+
+    def check_chromosome(
+        self,
+        chr_name:str
+    ) -> t.Dict[str, t.Optional[bool]]:
+
+        #? The legacy layout has no checksums, only check that all streams exist
+        chr_idx = self.chr_names.index(chr_name)
+        chr_dpath = os.path.join(self.dpath, f'{chr_idx:02}-{chr_idx:02}')
+        return {name: None if os.path.isfile(os.path.join(chr_dpath, name)) else False for name in STREAM_NAMES}
+
+def open_payload(
+    path:str,
+    res:t.Optional[int]=None
+) -> t.Union[ContainerReader, DirectoryReader]:
+
+    if os.path.isdir(path):
+        return DirectoryReader(path, res)
+
+    return ContainerReader(path, res)
+
+def list_resolutions(path:str) -> t.List[int]:
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'chr_names.json'), 'r') as f:
+            return [json.load(f)['res']]
+
+    return sorted(int(res) for res in _read_index(path))
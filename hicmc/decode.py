@@ -5,9 +5,8 @@
 
 import os
 import shutil
-import json
+import functools
 import logging as log
-import pandas as pd
 import numpy as np
 import fpzip
 from . import typing as t
@@ -16,81 +15,304 @@ from . import masking
 from . import serializer
 from . import transform
 from . import domain
-from .wrapper import jbig, ppmd
+from . import utils
+from . import codec
+from . import container
+from . import output
+from . import profiling
+from .container import Stream
+from .sparse import SparseContactMatrix
+from .packed import BalancedPackedMatrix
+from .output import ContactPixels
+from .wrapper import jbig
 
-def decode_chromosome(
-    input_path:str
-) -> t.NDArray[np.integer]:
+class ChromosomeModel(t.NamedTuple):
+    mask: t.NDArray[np.bool_]
+    weights: t.NDArray
+    domain_index: domain.DomainIndex
+    domain_values: t.NDArray
+    dist_table: t.NDArray
+
+def decode_model(
+    streams:t.Dict[str, Stream]
+) -> ChromosomeModel:
     
     #? Load row-/col-mask
-    with open(os.path.join(input_path, 'mask.bin'), 'rb') as file:
-        mask = serializer.decode_binary_array(file.read())
+    mask = serializer.decode_binary_array(streams['mask.bin'].payload)
     
-    #? Build distance-matrix
-    dist_mat = transform.gen_dist_mat(len(mask))
-    dist_mat = dist_mat[~mask, :]
-    dist_mat = dist_mat[:, ~mask]
+    #? Distance-matrix between the remaining bins (computed on access)
+    dist_mat = transform.DistanceMatrix(np.flatnonzero(~mask))
 
     #? Load balancing-weights
-    with open(os.path.join(input_path, 'weights.fpzip'), 'rb') as file:
-        weights = np.squeeze(fpzip.decompress(file.read()))
+    #? Keep one dimension, also for chromosomes with a single bin
+    weights = np.reshape(fpzip.decompress(streams['weights.fpzip'].payload), -1)
 
     #? Load insulation-boundaries
-    with open(os.path.join(input_path, 'boundaries.bin'), 'rb') as file:
-        boundaries = serializer.decode_binary_array(file.read())
+    boundaries = serializer.decode_binary_array(streams['boundaries.bin'].payload)
 
     boundaries = np.where(boundaries)[0]
 
     #? Load domain-mask
-    with open(os.path.join(input_path, 'domain-mask.jbig'), 'rb') as file:
-        _temp = jbig.decode_binary_matrix(file.read())
+    _temp = jbig.decode_binary_matrix(streams['domain-mask.jbig'].payload)
 
     domain_mask = transform.inverse_tranform_diagonal_mode0(_temp)
 
     #? Load domain-values
-    with open(os.path.join(input_path, 'domain-values.fpizp'), 'rb') as file:
-        domain_values = np.reshape(fpzip.decompress(file.read()), -1)
+    domain_values = np.reshape(fpzip.decompress(streams['domain-values.fpizp'].payload), -1)
 
     #? Load distance-table
-    with open(os.path.join(input_path, 'distance-table.fpizp'), 'rb') as file:
-        dist_table = np.reshape(fpzip.decompress(file.read()), -1) 
+    dist_table = np.reshape(fpzip.decompress(streams['distance-table.fpizp'].payload), -1) 
 
-    #? Reconstruct model
-    model = domain.reconstruct_model(
-        dist_mat, 
-        boundaries, 
-        domain_mask, 
-        domain_values, 
-        dist_table
+    domain_index = domain.DomainIndex(dist_mat, boundaries, domain_mask)
+    return ChromosomeModel(mask, weights, domain_index, domain_values, dist_table)
+
+def decode_weights(
+    streams:t.Dict[str, Stream]
+) -> t.NDArray[np.float64]:
+
+    #? Balancing-weights of all bins (after lossy compression), NaN for masked bins
+    mask = serializer.decode_binary_array(streams['mask.bin'].payload)
+    weights = np.full(len(mask), np.nan)
+    weights[~mask] = np.reshape(fpzip.decompress(streams['weights.fpzip'].payload), -1)
+    return weights
+
+def reconstruct_model(
+    chr_model:ChromosomeModel,
+    start:int=0,
+    end:t.Optional[int]=None
+) -> t.Union[t.NDArray, BalancedPackedMatrix]:
+
+    #? Model of the bins [start, end) (after row-/col-masking), the model of all bins is kept as packed upper-triangle
+    end = chr_model.domain_index.n if end is None else end
+    if start == 0 and end == chr_model.domain_index.n:
+        model = domain.reconstruct_model(
+            chr_model.domain_index, 
+            chr_model.domain_values, 
+            chr_model.dist_table
+        )
+        return transform.revert_balanced_matrix(model, chr_model.weights)
+
+    model = domain.reconstruct_model_block(
+        chr_model.domain_index, 
+        chr_model.domain_values, 
+        chr_model.dist_table,
+        start,
+        end
     )
-    model = transform.revert_balanced_matrix(model, weights)
+    return transform.revert_balanced_matrix(model, chr_model.weights[start:end])
 
-    #? Load contact-mask
-    with open(os.path.join(input_path, 'contact-mask.jbig'), 'rb') as file:
-        contact_mask = jbig.decode_binary_matrix(file.read())
-    
-    #? Load contact-data
-    with open(os.path.join(input_path, 'contact-data.ppmd'), 'rb') as file:
-        _buffer = ppmd.decode_bytes(file.read())
-        _bytes = len(_buffer) // np.sum(contact_mask)
-        if _bytes == 1:
-            contact_data = np.frombuffer(_buffer, np.uint8)
+def reconstruct_model_tile(
+    chr_model:ChromosomeModel,
+    row_start:int,
+    row_end:int,
+    col_start:int,
+    col_end:int
+) -> t.NDArray:
+
+    #? Block of the model of the bins (after row-/col-masking), only valid in the upper-triangle
+    model = domain.reconstruct_model_tile(
+        chr_model.domain_index, 
+        chr_model.domain_values, 
+        chr_model.dist_table,
+        row_start,
+        row_end,
+        col_start,
+        col_end
+    )
+    return transform.balance_block(
+        model, 
+        chr_model.weights[row_start:row_end], 
+        chr_model.weights[col_start:col_end], 
+        mult_op=True
+    )
+
+def decode_contact_data(
+    stream:Stream,
+    nentries:int
+) -> t.NDArray[np.integer]:
+
+    _buffer = codec.decode_bytes(stream.payload)
+    if stream.dtype is not None:
+        return np.frombuffer(_buffer, np.dtype(stream.dtype))
+
+    #? Legacy directory layout does not store the dtype
+    _bytes = len(_buffer) // nentries
+    if _bytes == 1:
+        contact_data = np.frombuffer(_buffer, np.uint8)
+
+    elif _bytes == 2:
+        contact_data = np.frombuffer(_buffer, np.uint16)
+
+    elif _bytes == 4:
+        contact_data = np.frombuffer(_buffer, np.uint32)
+
+    elif _bytes == 8:
+        contact_data = np.frombuffer(_buffer, np.uint64)
+
+    else: 
+        raise NotImplementedError(_bytes)
+
+    return contact_data
+
+def decode_tiles(
+    streams:t.Dict[str, Stream],
+    model:t.Union[t.NDArray, BalancedPackedMatrix],
+    model_start:int,
+    tile_size:int,
+    tiles:t.Iterable[t.Tuple[int, int]]
+) -> t.Tuple[t.NDArray[np.integer], t.NDArray[np.integer], t.NDArray[np.integer]]:
+
+    #? Returns the upper-triangle coordinates and values of the given tiles, the model must cover all tiles.
+    #? Rows and columns of the model start at model_start
+    row_ids, col_ids, data = [], [], []
+    for tile_row, tile_col in tiles:
+        mask_name, data_name = container.tile_stream_names(tile_row, tile_col)
+        if mask_name not in streams:
+            #? Empty tile
+            continue
+
+        contact_mask = jbig.decode_binary_matrix(streams[mask_name].payload).reshape(-1)
+        contact_data = decode_contact_data(streams[data_name], np.sum(contact_mask))
+
+        row_start = tile_row * tile_size
+        col_start = tile_col * tile_size
+        model_tile = model[
+            row_start - model_start:row_start - model_start + tile_size, 
+            col_start - model_start:col_start - model_start + tile_size
+        ]
+        _row_ids, _col_ids, _data = transform.inverse_transform_argsort_tile(
+            contact_mask,
+            contact_data,
+            model_tile,
+            row_start,
+            col_start
+        )
+        row_ids.append(_row_ids)
+        col_ids.append(_col_ids)
+        data.append(_data)
 
-        elif _bytes == 2:
-            contact_data = np.frombuffer(_buffer, np.uint16)
+    if not data:
+        return np.zeros(0, np.intp), np.zeros(0, np.intp), np.zeros(0, np.uint8)
 
-        elif _bytes == 4:
-            contact_data = np.frombuffer(_buffer, np.uint32)
+    return np.concatenate(row_ids), np.concatenate(col_ids), np.concatenate(data)
 
-        elif _bytes == 8:
-            contact_data = np.frombuffer(_buffer, np.uint64)
+def _tile_range(
+    start:int,
+    end:int,
+    tile_size:int
+) -> t.List[t.Tuple[int, int]]:
 
-        else: 
-            raise NotImplementedError(_bytes)
+    #? All upper-triangle tiles overlapping the block [start, end) x [start, end)
+    tile_ids = range(start // tile_size, -(-end // tile_size))
+    return [(tile_row, tile_col) for tile_row in tile_ids for tile_col in tile_ids if tile_row <= tile_col]
 
-    #? Reconstruct original contact-matrix
-    contact_mat = transform.inverse_transform_split(contact_mask, contact_data)
-    contact_mat = transform.inverse_transform_argsort(contact_mat, model)
+def decode_contact_matrix(
+    streams:t.Dict[str, Stream],
+    model:t.Union[t.NDArray, BalancedPackedMatrix],
+    tile_size:t.Optional[int]=None,
+    stable_order:bool=True
+) -> SparseContactMatrix:
+
+    #? Contact-matrix after row-/col-masking decoded with the given model, without building the dense matrix
+    n = model.shape[0]
+    if tile_size is None:
+        contact_mask = jbig.decode_binary_matrix(streams['contact-mask.jbig'].payload)
+        contact_data = decode_contact_data(streams['contact-data.ppmd'], np.sum(contact_mask))
+        row_ids, col_ids, data = transform.inverse_transform_argsort_coo(contact_mask, contact_data, model, stable_order)
+
+    else:
+        row_ids, col_ids, data = decode_tiles(streams, model, 0, tile_size, _tile_range(0, n, tile_size))
+
+    return SparseContactMatrix.from_coo(n, row_ids, col_ids, data)
+
+def iter_pixels(
+    streams:t.Dict[str, Stream],
+    tile_size:t.Optional[int]=None,
+    stable_order:bool=True,
+    chunksize:int=consts.OUTPUT_CHUNKSIZE
+) -> t.Iterator[ContactPixels]:
+
+    #? Upper-triangle pixels of the contact-matrix in chunks ordered by row, then col, the dense matrix is never built.
+    #? Tiled payloads are decoded one row of tiles at a time, using only the model of that row.
+    with profiling.span('decode_model'):
+        chr_model = decode_model(streams)
+    n = len(chr_model.mask)
+
+    #? Kept-bin index, i.e. the original bin of each row/col after row-/col-masking
+    bin_ids = np.flatnonzero(~chr_model.mask)
+
+    if tile_size is None:
+        with profiling.span('reconstruct_model'):
+            model = reconstruct_model(chr_model)
+
+        with profiling.span('decode_contact_matrix'):
+            contact_mat = decode_contact_matrix(streams, model, stable_order=stable_order)
+        del model
+
+        blocks = [(contact_mat.row_ids, contact_mat.col_ids, contact_mat.data)]
+
+    else:
+        blocks = _iter_tile_rows(streams, chr_model, tile_size)
+
+    nentries = 0
+    dtype = np.uint8
+    for row_ids, col_ids, data in blocks:
+        dtype = data.dtype
+        for chunk_start in range(0, len(data), chunksize):
+            chunk = slice(chunk_start, chunk_start + chunksize)
+            nentries += len(data[chunk])
+            yield ContactPixels(n, bin_ids[row_ids[chunk]], bin_ids[col_ids[chunk]], data[chunk])
+
+    #? Chromosome without contacts
+    if not nentries:
+        yield ContactPixels(n, np.zeros(0, np.intp), np.zeros(0, np.intp), np.zeros(0, dtype))
+
+def _iter_tile_rows(
+    streams:t.Dict[str, Stream],
+    chr_model:ChromosomeModel,
+    tile_size:int
+) -> t.Iterator[t.Tuple[t.NDArray[np.integer], t.NDArray[np.integer], t.NDArray[np.integer]]]:
+
+    n = chr_model.domain_index.n
+    ntiles = -(-n // tile_size)
+    for tile_row in range(ntiles):
+        row_start = tile_row * tile_size
+        row_end = min(row_start + tile_size, n)
+        model = reconstruct_model_tile(chr_model, row_start, row_end, row_start, n)
+
+        tiles = [(tile_row, tile_col) for tile_col in range(tile_row, ntiles)]
+        row_ids, col_ids, data = decode_tiles(streams, model, row_start, tile_size, tiles)
+        order = np.lexsort((col_ids, row_ids))
+        yield row_ids[order], col_ids[order], data[order]
+
+def decode_chromosome(
+    streams:t.Dict[str, Stream],
+    tile_size:t.Optional[int]=None,
+    stable_order:bool=True
+) -> t.NDArray[np.integer]:
+
+    #? Reconstruct model
+    chr_model = decode_model(streams)
+    mask = chr_model.mask
+    model = reconstruct_model(chr_model)
+
+    if tile_size is None:
+        #? Load contact-mask
+        contact_mask = jbig.decode_binary_matrix(streams['contact-mask.jbig'].payload)
+        
+        #? Load contact-data
+        contact_data = decode_contact_data(streams['contact-data.ppmd'], np.sum(contact_mask))
+
+        #? Reconstruct original contact-matrix
+        contact_mat = transform.inverse_transform_split(contact_mask, contact_data)
+        contact_mat = transform.inverse_transform_argsort(contact_mat, model, stable_order)
+
+    else:
+        n = model.shape[0]
+        row_ids, col_ids, data = decode_tiles(streams, model, 0, tile_size, _tile_range(0, n, tile_size))
+        contact_mat = np.zeros((n, n), dtype=data.dtype)
+        contact_mat[row_ids, col_ids] = data
+        contact_mat[col_ids, row_ids] = data
 
     #? Remove row-/col-masking
     contact_mat = masking.unmask_axis(contact_mat, consts.Axis.ROW, mask) 
@@ -98,51 +320,277 @@ def decode_chromosome(
 
     return contact_mat
 
+class RegionDecoder:
+    #? Decodes sub-matrices of a payload. For tiled payloads only the model of the region and the 
+    #? overlapping tiles are decoded, otherwise the whole chromosome is decoded.
+
+    def __init__(
+        self,
+        input_path:str,
+        res:t.Optional[int]=None
+    ):
+        self.payload = container.open_payload(input_path, res)
+        self.res = self.payload.meta['res']
+        self.tile_size = self.payload.meta.get('tile_size')
+        #? Payloads written before the stable model-order was introduced use the order of np.argsort
+        self.stable_order = self.payload.meta.get('stable_order', False)
+        self._cached_model = (None, None)
+
+    def _chromosome_model(
+        self,
+        chr_name:str
+    ) -> ChromosomeModel:
+
+        #? Keep the model of the last chromosome, consecutive queries usually target the same chromosome
+        cached_name, chr_model = self._cached_model
+        if cached_name != chr_name:
+            chr_model = decode_model(self.payload.read_chromosome(chr_name, container.MODEL_STREAM_NAMES))
+            self._cached_model = (chr_name, chr_model)
+
+        return chr_model
+
+    def decode_region(
+        self,
+        chr_name:str,
+        start:int,
+        end:int
+    ) -> t.NDArray[np.integer]:
+
+        #? Contact-matrix of all bins overlapping the genomic region [start, end)
+        bin_start = start // self.res
+        bin_end = -(-end // self.res)
+
+        if self.tile_size is None:
+            contact_mat = decode_chromosome(self.payload.read_chromosome(chr_name), stable_order=self.stable_order)
+            return contact_mat[bin_start:bin_end, bin_start:bin_end]
+
+        chr_model = self._chromosome_model(chr_name)
+        mask = chr_model.mask
+        bin_end = min(bin_end, len(mask))
+        bin_start = min(bin_start, bin_end)
+
+        #? Region and the overlapping tiles after row-/col-masking
+        region_start = np.count_nonzero(~mask[:bin_start])
+        region_end = np.count_nonzero(~mask[:bin_end])
+        tiles = _tile_range(region_start, region_end, self.tile_size)
+        model_start = region_start // self.tile_size * self.tile_size
+        model_end = min(-(-region_end // self.tile_size) * self.tile_size, chr_model.domain_index.n)
+
+        model = reconstruct_model(chr_model, model_start, model_end)
+        names = [name for tile in tiles for name in container.tile_stream_names(*tile)]
+        streams = self.payload.read_chromosome(chr_name, names)
+        row_ids, col_ids, data = decode_tiles(streams, model, model_start, self.tile_size, tiles)
+
+        #? Only keep entries within the region
+        within = (row_ids >= region_start) & (col_ids < region_end)
+        row_ids = row_ids[within] - region_start
+        col_ids = col_ids[within] - region_start
+        data = data[within]
+
+        contact_mat = np.zeros((region_end - region_start, region_end - region_start), dtype=data.dtype)
+        contact_mat[row_ids, col_ids] = data
+        contact_mat[col_ids, row_ids] = data
+
+        #? Remove row-/col-masking
+        region_mask = mask[bin_start:bin_end]
+        contact_mat = masking.unmask_axis(contact_mat, consts.Axis.ROW, region_mask) 
+        contact_mat = masking.unmask_axis(contact_mat, consts.Axis.COL, region_mask) 
+
+        return contact_mat
+
+def decode_region(
+    input_path:str,
+    chr_name:str,
+    start:int,
+    end:int,
+    res:t.Optional[int]=None
+) -> t.NDArray[np.integer]:
+
+    return RegionDecoder(input_path, res).decode_region(chr_name, start, end)
+
+def iter_chromosome_pixels(
+    input_path:str,
+    res:int,
+    chr_name:str
+) -> t.Iterator[ContactPixels]:
+
+    #? Pixels of one chromosome in chunks, decoded while they are consumed (see iter_pixels)
+    return profiling.iter_scope(_iter_chromosome_pixels(input_path, res, chr_name), res=res, chr_name=chr_name)
+
+def _iter_chromosome_pixels(
+    input_path:str,
+    res:int,
+    chr_name:str
+) -> t.Iterator[ContactPixels]:
+
+    log.info(f'Processing chromosome {chr_name}')
+    with profiling.span('decode_chromosome'):
+        payload = container.open_payload(input_path, res)
+        with profiling.span('read_chromosome'):
+            streams = payload.read_chromosome(chr_name)
+
+        yield from iter_pixels(
+            streams, 
+            payload.meta.get('tile_size'),
+            payload.meta.get('stable_order', False)
+        )
+
+def decode_chromosome_weights(
+    input_path:str,
+    res:int,
+    chr_name:str
+) -> t.NDArray[np.float64]:
+
+    payload = container.open_payload(input_path, res)
+    return decode_weights(payload.read_chromosome(chr_name, ['mask.bin', 'weights.fpzip']))
+
+def decode_chromosome_job(
+    input_path:str,
+    res:int,
+    chr_name:str
+) -> t.Tuple[t.List[ContactPixels], t.NDArray[np.float64]]:
+
+    #? Job of a worker process, the chunks are returned to the writer of the main process at once
+    return (
+        list(iter_chromosome_pixels(input_path, res, chr_name)), 
+        decode_chromosome_weights(input_path, res, chr_name)
+    )
+
+def stream_chromosome_job(
+    writer:t.Optional[output.BackgroundWriter],
+    input_path:str,
+    res:int,
+    chr_name:str
+):
+
+    #? Job of the main process, the chunks are decoded while the writer consumes them (drained if there is no writer)
+    weights = decode_chromosome_weights(input_path, res, chr_name)
+    chunks = iter_chromosome_pixels(input_path, res, chr_name)
+    if writer is None:
+        for _ in chunks:
+            pass
+    else:
+        writer.write_chromosome(chr_name, chunks, weights)
+
+def chromosome_lengths(
+    payload:t.Union[container.ContainerReader, container.DirectoryReader]
+) -> t.List[int]:
+
+    if 'chr_lengths' in payload.meta:
+        return payload.meta['chr_lengths']
+
+    #? Older payloads do not store the lengths, use the number of bins (the length of the row-/col-mask)
+    res = payload.meta['res']
+    chr_lengths = []
+    for chr_name in payload.chr_names:
+        _payload = payload.read_chromosome(chr_name, ['mask.bin'])['mask.bin'].payload
+        chr_lengths.append(len(serializer.decode_binary_array(_payload)) * res)
+
+    return chr_lengths
+
+def balancing_name(
+    payload:t.Union[container.ContainerReader, container.DirectoryReader]
+) -> str:
+
+    #? Balancing-weights the payload was encoded with, payloads without manifest were encoded with the default
+    for manifest in getattr(payload, 'manifest', {}).values():
+        return manifest['params']['balancing']
+
+    return consts.BALANCING_DEFAULT
+
+def _replay_spans(
+    results:t.Iterator[t.Tuple[str, t.Tuple[t.Any, t.List[profiling.Span]]]],
+    res:int
+) -> t.Iterator[t.Tuple[str, t.Any]]:
+
+    for chr_name, (result, spans) in results:
+        profiling.replay(spans, res=res)
+        yield chr_name, result
+
+def _decode_chromosomes(
+    writer:t.Optional[output.BackgroundWriter],
+    jobs:t.Dict[str, t.Dict[str, t.Any]],
+    njobs:int,
+    res:int
+):
+
+    #? Chunks are streamed to the writer by a single job, so only a few chunks are held at once
+    if njobs == 1:
+        utils.run_jobs(functools.partial(stream_chromosome_job, writer), jobs)
+        return
+
+    #? Jobs return their spans with the pixels, as worker processes do not have the hooks
+    if profiling.enabled():
+        results = _replay_spans(utils.iter_jobs(functools.partial(profiling.run_recorded, decode_chromosome_job), jobs, njobs), res)
+    else:
+        results = utils.iter_jobs(decode_chromosome_job, jobs, njobs)
+
+    for chr_name, (chunks, weights) in results:
+        if writer is not None:
+            writer.write_chromosome(chr_name, chunks, weights)
+
 def decode(args):
     
     overwrite = args.overwrite
     dry_run = args.dry_run
-    input_dpath = args.input
-    output_dpath = args.output
+    input_path = args.input
+    output_path = os.path.normpath(args.output)
+    output_format = args.output_format
     
-    #? Setup output-directory
-    output_dpath = os.path.normpath(output_dpath)
-    if not dry_run:
-        if not os.path.exists(output_dpath):
+    #? Single-file container or legacy directory layout
+    payload = container.open_payload(input_path, args.resolution)
+    chr_names = payload.chr_names
+    res = payload.meta['res']
+    
+    #? Setup output-file (cool) or output-directory (one file per chromosome)
+    if dry_run:
+        pass
+
+    elif output_format == 'cool':
+        if os.path.exists(output_path):
+            if not overwrite:
+                raise FileExistsError(f'Output already exists: {output_path}, use --overwrite')
+
+            os.remove(output_path)
+
+        output_dpath = os.path.dirname(output_path)
+        if output_dpath and not os.path.exists(output_dpath):
             os.makedirs(output_dpath)
+
+    else:
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
         else:
             if overwrite:
-                shutil.rmtree(output_dpath)
-                os.makedirs(output_dpath)
+                shutil.rmtree(output_path)
+                os.makedirs(output_path)
     
-    meta_fpath = os.path.join(input_dpath, 'chr_names.json')
-    with open(meta_fpath, 'r') as f:
-        meta_dict = json.load(f)
-        
-    chr_names = meta_dict['chr_names']
-    res = meta_dict['res']
-    
-    for chr_idx, chr_name in enumerate(chr_names):
+    jobs = {}
+    for chr_name in chr_names:
+        jobs[chr_name] = dict(
+            input_path=input_path,
+            res=res,
+            chr_name=chr_name,
+        )
 
-        log.info(f'Processing chromosome {chr_name} at {res}kb')
-        chr_dpath = os.path.join(input_dpath, f'{chr_idx:02}-{chr_idx:02}')
-        
-        contact_mat = decode_chromosome(chr_dpath)
-        
-        if not dry_run:
-            triu_contact_mat = np.triu(contact_mat)
-            row_ids, col_ids = np.where(triu_contact_mat)
-            
-            df = pd.DataFrame(
-                data={
-                    'row_ids':row_ids, 
-                    'col_ids':col_ids, 
-                    'counts':triu_contact_mat[row_ids, col_ids]
-                }
-            )
-            
-            out_csv_fpath = os.path.join(output_dpath, f'{chr_idx:02}-{chr_idx:02}.csv')
-            df.to_csv(
-                out_csv_fpath,
-                index=False
-            )
\ No newline at end of file
+    log.info(f'Decoding {len(jobs)} chromosomes at {res}kb using {args.jobs} job(s)')
+    if dry_run:
+        writer = None
+    elif output_format == 'cool':
+        writer = output.CoolerWriter(
+            output_path, 
+            chr_names, 
+            chromosome_lengths(payload), 
+            res,
+            divisive_weights=balancing_name(payload) in consts.DIVISIVE_WEIGHTS
+        )
+    else:
+        writer = output.FileWriter(output_path, output_format, chr_names)
+
+    if writer is None:
+        _decode_chromosomes(writer, jobs, args.jobs, res)
+        return
+
+    #? Chromosomes are written in the background while the next ones are decoded
+    with writer:
+        _decode_chromosomes(writer, jobs, args.jobs, res)
@@ -1,10 +1,13 @@
-import functools
+import os
+import json
+import struct
+import logging as log
 import numpy as np
-import pandas as pd
 from . import typing as t
 from . import constants as consts
 from . import statistics as stats
 from . import transform
+from .packed import PackedMatrix
 
 def _insulation_remove_prefix(string: str, prefix: str) -> str:
     if string.startswith(prefix):
@@ -12,54 +15,167 @@ def _insulation_remove_prefix(string: str, prefix: str) -> str:
 
     return string
 
-def _insulation_windows(table: pd.DataFrame) -> t.List[int]:
+def _insulation_windows(columns: t.Iterable[str]) -> t.List[int]:
     _prefix = 'log2_insulation_score_'
-    return [int(_insulation_remove_prefix(name, _prefix)) for name in filter(lambda string: string.startswith(_prefix), table.columns)] # type: ignore
-
-def load_insulation_table(file_path: str):
-    #? Load data-frame
-    
+    return [int(_insulation_remove_prefix(name, _prefix)) for name in filter(lambda string: string.startswith(_prefix), columns)]
+
+class InsulationTable:
+    #? Boundaries of all insulation-windows, rows are grouped by chromosome (in order of first appearance).
+    #? boundaries[win_idx, offsets[chr_idx]:offsets[chr_idx+1]] are the boundaries of one chromosome.
+
+    def __init__(
+        self,
+        res:int,
+        windows:t.List[int],
+        chr_names:t.List[str],
+        offsets:t.NDArray[np.integer],
+        boundaries:t.NDArray[np.bool_]
+    ):
+        self.res = res
+        self.windows = windows
+        self.chr_names = chr_names
+        self.offsets = offsets
+        self.boundaries = boundaries
+        self._chr_ids = {chr_name: chr_idx for chr_idx, chr_name in enumerate(chr_names)}
+
+    def select(
+        self,
+        chr_name:str,
+        win_size:int
+    ) -> t.NDArray[np.bool_]:
+
+        if win_size not in self.windows:
+            raise ValueError(f'Invalid insulation windows: {win_size}. Available: {self.windows}')
+
+        #? Chromosomes missing in the table have no boundaries
+        if chr_name not in self._chr_ids:
+            return np.zeros(0, dtype=bool)
+
+        chr_idx = self._chr_ids[chr_name]
+        return np.asarray(self.boundaries[self.windows.index(win_size), self.offsets[chr_idx]:self.offsets[chr_idx+1]])
+
+def _parse_insulation_table(file_path: str) -> InsulationTable:
     if file_path.endswith('tsv'):
-        df = pd.read_csv(
-            file_path,
-            delimiter='\t',
-            dtype=dict(chrom=str, region=str)
-        )
+        delimiter = '\t'
     elif file_path.endswith('csv'):
-        df = pd.read_csv(
-            file_path,
-            dtype=dict(chrom=str, region=str)
-        )
+        delimiter = ','
     else:
         raise ValueError("Invalid format!")
-    
-    windows = _insulation_windows(df)
+
+    #? pandas is only required if the sidecar is missing or outdated
+    import pandas as pd
 
     #? Only load necessary columns
+    columns = pd.read_csv(file_path, delimiter=delimiter, nrows=0).columns
+    windows = _insulation_windows(columns)
     _prefix = 'is_boundary_'
-    cols = ['chrom', 'start', 'end'] + [_prefix + str(window) for window in windows]
-    df = (
-        df[cols]
-        .rename(
-            columns=functools.partial(
-                _insulation_remove_prefix, 
-                prefix=_prefix
-            )
-        )
+    df = pd.read_csv(
+        file_path,
+        delimiter=delimiter,
+        usecols=['chrom', 'start', 'end'] + [_prefix + str(window) for window in windows],
+        dtype=dict(chrom=str)
     )
-    return df
 
-def select_boundaries(
-    df:pd.DataFrame, 
-    chr_name: str, 
-    win_size: int
-) -> t.NDArray[np.bool_]:
-    
-    df = (
-        df[df.chrom == chr_name]
-        .reset_index(drop=True)
+    #? Group rows by chromosome, stable to keep the order of the rows within a chromosome
+    chr_codes, chr_names = pd.factorize(df['chrom'])
+    order = np.argsort(chr_codes, kind='stable')
+    offsets = np.zeros(len(chr_names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(chr_codes, minlength=len(chr_names)), out=offsets[1:])
+
+    boundaries = np.zeros((len(windows), len(df)), dtype=bool)
+    for win_idx, window in enumerate(windows):
+        boundaries[win_idx] = df[_prefix + str(window)].to_numpy(dtype=bool)[order]
+
+    res = int(df['end'].iloc[0] - df['start'].iloc[0]) if len(df) else 0
+    return InsulationTable(res, windows, list(chr_names), offsets, boundaries)
+
+#? Sidecar layout: header | index (JSON) | boundaries (bool, nwindows x nrows)
+_INSULATION_INDEX_MAGIC = b'HICMCI'
+_INSULATION_INDEX_HEADER = struct.Struct('<6sQ')
+
+def _insulation_source_key(file_path: str) -> t.Dict[str, t.Any]:
+    #? The sidecar is only valid for the exact file it was created from
+    stat = os.stat(file_path)
+    return dict(path=os.path.abspath(file_path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+def _read_insulation_index(
+    index_path: str,
+    source_key: t.Dict[str, t.Any]
+) -> t.Optional[InsulationTable]:
+
+    try:
+        with open(index_path, 'rb') as file:
+            magic, index_length = _INSULATION_INDEX_HEADER.unpack(file.read(_INSULATION_INDEX_HEADER.size))
+            if magic != _INSULATION_INDEX_MAGIC:
+                return None
+
+            index = json.loads(file.read(index_length))
+
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if index['source'] != source_key:
+        return None
+
+    nrows = index['offsets'][-1]
+    if len(index['windows']) and nrows:
+        boundaries = np.memmap(
+            index_path, 
+            dtype=bool, 
+            mode='r', 
+            offset=_INSULATION_INDEX_HEADER.size + index_length, 
+            shape=(len(index['windows']), nrows)
+        )
+    else:
+        boundaries = np.zeros((len(index['windows']), nrows), dtype=bool)
+
+    return InsulationTable(
+        index['res'], 
+        index['windows'], 
+        index['chr_names'], 
+        np.array(index['offsets'], dtype=np.int64), 
+        boundaries
     )
-    return df[str(win_size)].to_numpy()
+
+def _write_insulation_index(
+    index_path: str,
+    source_key: t.Dict[str, t.Any],
+    table: InsulationTable
+):
+    _payload = json.dumps(dict(
+        source=source_key,
+        res=table.res,
+        windows=table.windows,
+        chr_names=table.chr_names,
+        offsets=table.offsets.tolist(),
+    )).encode('utf-8')
+
+    #? Write to a temporary file first, concurrent encoders never see a partial sidecar
+    tmp_path = f'{index_path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(_INSULATION_INDEX_HEADER.pack(_INSULATION_INDEX_MAGIC, len(_payload)))
+            file.write(_payload)
+            file.write(np.ascontiguousarray(table.boundaries).tobytes())
+
+        os.replace(tmp_path, index_path)
+
+    except OSError as err:
+        log.warning(f'Unable to write insulation index {index_path}: {err}')
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_insulation_table(file_path: str) -> InsulationTable:
+    #? Parse the table once, later calls memory-map the boundaries from the sidecar next to the table
+    source_key = _insulation_source_key(file_path)
+    index_path = file_path + consts.INSULATION_INDEX_SUFFIX
+
+    table = _read_insulation_index(index_path, source_key)
+    if table is None:
+        table = _parse_insulation_table(file_path)
+        _write_insulation_index(index_path, source_key, table)
+
+    return table
 
 def _transform_domain_values(
     domain_values:t.NDArray, 
@@ -82,73 +198,128 @@ def _inverse_transform_domain_values(
 
     return transform.inverse_tranform_diagonal_mode0(_domain_values)
 
-def _transform_distance_table(
-    dist_table:t.NDArray,
-    dist_ids: t.NDArray
-):
-    
-    max_dist = dist_table.shape[0]
-    return np.concatenate([dist_table[dist, :dist_ids[dist]] for dist in range(max_dist)])
-
-def _inverse_transfrom_distance_table(
-    transformed: t.NDArray, 
-    dist_ids: t.NDArray[np.integer]
-) -> t.NDArray:
-    
-    trans_idx = 0
-    _out = np.zeros((len(dist_ids), dist_ids.max()))
-    for distance, entries in enumerate(dist_ids):
-        _out[distance,:entries] = transformed[trans_idx:trans_idx+entries]
-        trans_idx += entries
-
-    return _out
-
-def _recon_dist_ids(
-    distances: t.NDArray[np.integer], 
-    boundaries: t.NDArray, 
-    domain_mask: t.NDArray[np.bool_]
-) -> t.NDArray[np.integer]:
+def _iter_domain_stripes(
+    n:int,
+    boundaries:t.NDArray
+) -> t.Iterator[t.Tuple[int, int, int, t.NDArray[np.integer]]]:
     
-    #? Type-check input
-    n = stats.assert_square(distances, return_n=True)
-
-    #? Initialize distance-index
-    domain_count = len(boundaries) + 1
-    distance_index = np.zeros((distances.max() + 1), dtype=np.min_scalar_type(domain_count * 2))
+    #? Domain-index of every bin
+    domain_ids = np.searchsorted(boundaries, np.arange(n), side='right')
 
-    #? Iterate over all domain-indices in the upper-triangle (because contact-matrix is symmetric)
-    for row_index, col_index in np.ndindex((domain_count, domain_count)):
-        if col_index < row_index:
-            continue
-
-        #? Calculate row-/col-indices of domain-matrix
+    #? A stripe covers all rows of one domain and all columns of this and the following domains,
+    #? i.e. all domain-pairs in the upper-triangle (because contact-matrix is symmetric) of one row
+    for row_index in range(len(boundaries) + 1):
         row_start = boundaries[row_index - 1] if not row_index == 0 else 0
         row_end = boundaries[row_index] if not row_index == len(boundaries) else n
-        col_start = boundaries[col_index - 1] if not col_index == 0 else 0
-        col_end = boundaries[col_index] if not col_index == len(boundaries) else n
-
-        #? The domain-mask indicates wheter simple or complex model is used
-        if not domain_mask[row_index, col_index]:
+        if row_end <= row_start:
             continue
+
+        yield row_index, row_start, row_end, domain_ids[row_start:]
+
+class DomainStripe(t.NamedTuple):
+    row_index: int
+    row_start: int
+    row_end: int
+    col_domain_ids: t.NDArray[np.integer]
+    active_cols: t.NDArray[np.bool_]
+    #? Sorted (col-domain, distance) keys of the groups of the stripe and their slots
+    keys: t.NDArray[np.int64]
+    key_slots: t.NDArray[np.integer]
+
+class DomainIndex:
+    #? Maps every cell of a complex-model domain-matrix to its slot in the (transformed) distance-table.
+    #? A slot is shared by all cells of one (domain-pair, distance) group. Slots are ordered by distance 
+    #? first and domain-pair second, which is the order of the distance-table written to the payload.
+    #? Only the groups are stored, the slots of the cells are derived per block (see slots).
+
+    def __init__(
+        self,
+        distances:t.NDArray[np.integer],
+        boundaries:t.NDArray,
+        domain_mask:t.NDArray[np.bool_]
+    ):
+        #? Type-check input
+        self.n = stats.assert_square(distances, return_n=True)
+        self.distances = distances
+        self.boundaries = boundaries
+        self.domain_mask = domain_mask
+        self.ndistances = int(distances.max()) + 1 if self.n else 1
+
+        stripes = []
+        group_dists = []
+        ngroups = 0
+        for row_index, row_start, row_end, col_domain_ids in _iter_domain_stripes(self.n, boundaries):
+
+            #? The domain-mask indicates wheter simple or complex model is used
+            active_cols = domain_mask[row_index, col_domain_ids]
+
+            #? Label every cell with its (col-domain, distance) group, only the groups are kept
+            _keys = np.unique(self._keys(row_start, row_end, row_start, col_domain_ids, np.flatnonzero(active_cols)))
+
+            stripes.append((row_index, row_start, row_end, col_domain_ids, active_cols, _keys, np.arange(ngroups, ngroups + len(_keys))))
+            group_dists.append(_keys % self.ndistances)
+            ngroups += len(_keys)
+
+        group_dists = np.concatenate(group_dists) if group_dists else np.zeros(0, dtype=np.int64)
         
-        #? Increment distance-index
-        distance_index[np.unique(distances[row_start:row_end, col_start:col_end])] += 1
+        #? Groups are ordered by domain-pair, slots by distance first
+        slot_ids = np.empty(ngroups, dtype=np.min_scalar_type(max(ngroups - 1, 0)))
+        slot_ids[np.argsort(group_dists, kind='stable')] = np.arange(ngroups)
+
+        self.stripes = [
+            DomainStripe(*stripe[:-1], slot_ids[stripe[-1]]) for stripe in stripes
+        ]
+        self.ngroups = ngroups
+        self.dist_ids = np.bincount(group_dists, minlength=self.ndistances).astype(
+            np.min_scalar_type(len(boundaries) * 2 + 2)
+        )
+
+    def _keys(
+        self,
+        row_start:int,
+        row_end:int,
+        stripe_start:int,
+        col_domain_ids:t.NDArray[np.integer],
+        cols:t.NDArray[np.integer]
+    ) -> t.NDArray[np.int64]:
+
+        #? Group-key of the cells of the rows [row_start, row_end) and the given cols (relative to the stripe)
+        return (
+            col_domain_ids[cols].astype(np.int64) * self.ndistances 
+            + self.distances[row_start:row_end, stripe_start + cols]
+        )
 
-    return distance_index
+    def slots(
+        self,
+        stripe:DomainStripe,
+        row_start:int,
+        row_end:int,
+        col_start:int,
+        col_end:int
+    ) -> t.NDArray[np.integer]:
+
+        #? Slots of the complex-model cells of the block [row_start, row_end) x [col_start, col_end) within the stripe,
+        #? one row per row of the block and one column per active column
+        col_offset = col_start - stripe.row_start
+        cols = np.flatnonzero(stripe.active_cols[col_offset:col_end - stripe.row_start]) + col_offset
+        keys = self._keys(row_start, row_end, stripe.row_start, stripe.col_domain_ids, cols)
+        return stripe.key_slots[np.searchsorted(stripe.keys, keys)]
 
 def build_model(
     balanced_contact_mat:t.NDArray,
-    dist_mat:t.NDArray,
-    boundaries:t.NDArray,
+    domain_index:DomainIndex,
     stat_f:t.Statistic,
-    domain_mask:t.NDArray
+    moments:t.Optional[stats.Moments]=None
 ):
 
     #? Type-check input
     n = stats.assert_square(balanced_contact_mat, return_n=True)
+    assert n == domain_index.n, "Domain-index does not match the contact-matrix!"
     
-    #? Calculate domain-values
-    domain_values = stats.map_domains(balanced_contact_mat, boundaries, stat_f)
+    #? Calculate domain-values, the moments of the domain-matrices may be shared with the domain-mask
+    if moments is None:
+        moments = stats.domain_moments(balanced_contact_mat, domain_index.boundaries)
+    domain_values = stat_f(moments)
     if consts.DOMAIN_VALUES_PRECISION_DEFAULT == 32:
         domain_values = domain_values.astype(np.float32)
 
@@ -160,108 +331,142 @@ def build_model(
 
     #? Initialize distance-table
     if consts.DISTANCE_TABLE_PRECISION_DEFAULT == 32:
-        distance_table = np.zeros((dist_mat.max() + 1, np.sum(np.triu(domain_mask))), dtype=np.float32)
+        distance_table = np.zeros(domain_index.ngroups, dtype=np.float32)
 
     elif consts.DISTANCE_TABLE_PRECISION_DEFAULT == 64:
-        distance_table = np.zeros((dist_mat.max() + 1, np.sum(np.triu(domain_mask))), dtype=np.float64)
+        distance_table = np.zeros(domain_index.ngroups, dtype=np.float64)
 
     else:
         raise NotImplementedError(consts.DISTANCE_TABLE_PRECISION_DEFAULT)
 
-    #? Initialize distance-index
-    ndomains = stats.assert_square(domain_mask, return_n=True)
-    dist_indices = np.zeros((dist_mat.max() + 1), dtype=np.min_scalar_type(ndomains * 2))
-
-    #? Iterate over all domain-indices in the upper-triangle (because contact-matrix is symmetric)
-    for row_index, col_index in np.ndindex(domain_mask.shape):
-        if col_index < row_index:
-            continue
-        
-        #? Calculate row-/col-indices of domain-matrix
-        row_start = boundaries[row_index - 1] if not row_index == 0 else 0
-        row_end = boundaries[row_index] if not row_index == len(boundaries) else n
-        col_start = boundaries[col_index - 1] if not col_index == 0 else 0
-        col_end = boundaries[col_index] if not col_index == len(boundaries) else n
-
-        #? The domain-mask indicates wheter simple or complex model is used
-        if not domain_mask[row_index, col_index]:
-            continue
-        
-        #? Generate intra-/inter-domain matrices
-        domain_balanced_contact_mat = balanced_contact_mat[row_start:row_end, col_start:col_end]
-        domain_dist_mat = dist_mat[row_start:row_end, col_start:col_end]
-
-        #? Fill distance-table and increment distance-index
-        for distance in np.unique(domain_dist_mat):
-            distance_table[distance, dist_indices[distance]] = stat_f(
-                domain_balanced_contact_mat[np.where(domain_dist_mat == distance)]
-            )
-            dist_indices[distance] += 1
+    #? Gather the cells of all groups, stripe by stripe
+    group_slots = []
+    group_sizes = []
+    group_values = []
+    for stripe in domain_index.stripes:
+        slots = domain_index.slots(stripe, stripe.row_start, stripe.row_end, stripe.row_start, domain_index.n).reshape(-1)
+        values = balanced_contact_mat[stripe.row_start:stripe.row_end, stripe.row_start:][:, stripe.active_cols].reshape(-1)
+
+        #? Sort cells by slot, stable so that every group keeps the row-major order of its cells (and np.average its rounding)
+        order = np.argsort(slots, kind='stable')
+        slots = slots[order]
+        group_starts = np.flatnonzero(np.diff(slots, prepend=-1))
+
+        group_slots.append(slots[group_starts])
+        group_sizes.append(np.diff(group_starts, append=len(slots)))
+        group_values.append(values[order])
+
+    #? Reduce all groups at once and scatter them into the distance-table
+    if group_slots:
+        distance_table[np.concatenate(group_slots)] = stats.grouped_statistic(
+            stat_f, 
+            np.concatenate(group_values), 
+            np.concatenate(group_sizes)
+        )
     
     return (
-        _transform_domain_values(domain_values, domain_mask), 
-        _transform_distance_table(distance_table, dist_indices)
+        _transform_domain_values(domain_values, domain_index.domain_mask), 
+        distance_table
     )
     
+def _model_dtype():
+    if consts.MODEL_PRECISION == 32:
+        return np.float32
+
+    elif consts.MODEL_PRECISION == 64:
+        return np.float64
+
+    else:
+        raise NotImplementedError(consts.MODEL_PRECISION)
+
 def reconstruct_model(
-    distances:t.NDArray[np.integer], 
-    boundaries:t.NDArray, 
-    domain_mask:t.NDArray[np.bool_], 
+    domain_index:DomainIndex,
     domain_vals:t.NDArray, 
     dist_table:t.NDArray
-):
+) -> PackedMatrix:
     
-    #? Type-check input
-    n = stats.assert_square(distances, return_n=True)
+    #? Whole model as packed upper-triangle, equals reconstruct_model_block(..., 0, n) without building the dense matrix
+    if len(dist_table) != domain_index.ngroups:
+        raise ValueError(f'Invalid distance-table, expected {domain_index.ngroups} entries, got {len(dist_table)}')
+
+    domain_vals = _inverse_transform_domain_values(domain_vals, domain_index.domain_mask)
+    model = PackedMatrix.zeros(domain_index.n, _model_dtype())
+
+    #? One stripe at a time, only its rows are materialized
+    for stripe in domain_index.stripes:
+        block = np.zeros((stripe.row_end - stripe.row_start, domain_index.n - stripe.row_start), dtype=model.dtype)
+        _fill_model_tile(block, domain_index, [stripe], domain_vals, dist_table, stripe.row_start, stripe.row_end, stripe.row_start, domain_index.n)
+        model.set_upper_rows(stripe.row_start, block)
+
+    return model
+
+def reconstruct_model_block(
+    domain_index:DomainIndex,
+    domain_vals:t.NDArray, 
+    dist_table:t.NDArray,
+    start:int,
+    end:int
+):
     
-    #? Reconstruct distance-index and distance-table
-    distance_index = _recon_dist_ids(distances, boundaries, domain_mask)
-    dist_table = _inverse_transfrom_distance_table(dist_table, distance_index)
+    #? Equals reconstruct_model(...)[start:end, start:end], only the stripes overlapping the block are used
+    model = reconstruct_model_tile(domain_index, domain_vals, dist_table, start, end, start, end)
+
+    #? Copy upper-triangle to lower-triangle
+    return transform.make_mat_symmetrical(model)
 
-    #? Initialize distance-index
-    domain_count = len(boundaries) + 1
-    distance_index = np.zeros((distances.max() + 1), dtype=np.min_scalar_type(domain_count * 2))
+def reconstruct_model_tile(
+    domain_index:DomainIndex,
+    domain_vals:t.NDArray, 
+    dist_table:t.NDArray,
+    row_start:int,
+    row_end:int,
+    col_start:int,
+    col_end:int
+):
+    
+    #? Block [row_start, row_end) x [col_start, col_end) of the model without copying the upper- to the lower-triangle,
+    #? i.e. only cells right of the first row of their domain are set, the remaining cells are zero
+    if len(dist_table) != domain_index.ngroups:
+        raise ValueError(f'Invalid distance-table, expected {domain_index.ngroups} entries, got {len(dist_table)}')
 
     #? Reconstruct domain-values
-    domain_vals = _inverse_transform_domain_values(domain_vals, domain_mask)
+    domain_vals = _inverse_transform_domain_values(domain_vals, domain_index.domain_mask)
 
     #? Initialize model-matrix
-    if consts.MODEL_PRECISION == 32:
-        model = np.zeros((n, n), dtype=np.float32)
-
-    elif consts.MODEL_PRECISION == 64:
-        model = np.zeros((n, n), dtype=np.float64)
+    model = np.zeros((row_end - row_start, col_end - col_start), dtype=_model_dtype())
+    _fill_model_tile(model, domain_index, domain_index.stripes, domain_vals, dist_table, row_start, row_end, col_start, col_end)
 
-    else:
-        raise NotImplementedError(consts.MODEL_PRECISION)
+    return model
 
-    #? Iterate over all domain-indices in the upper-triangle (because contact-matrix is symmetric)
-    for row_index, col_index in np.ndindex((domain_count, domain_count)):
-        if col_index < row_index:
-            continue
-        
-        #? Calculate row-/col-indices of domain-matrix
-        row_start = boundaries[row_index - 1] if not row_index == 0 else 0
-        row_end = boundaries[row_index] if not row_index == len(boundaries) else n
-        col_start = boundaries[col_index - 1] if not col_index == 0 else 0
-        col_end = boundaries[col_index] if not col_index == len(boundaries) else n
+def _fill_model_tile(
+    model:t.NDArray,
+    domain_index:DomainIndex,
+    stripes:t.List[DomainStripe],
+    domain_vals:t.NDArray, 
+    dist_table:t.NDArray,
+    row_start:int,
+    row_end:int,
+    col_start:int,
+    col_end:int
+):
 
-        #? The domain-mask indicates wheter simple or complex model is used
-        if not domain_mask[row_index, col_index]:
-            model[row_start : row_end, col_start : col_end] = domain_vals[row_index, col_index]
+    #? Fill all domain-matrices of one stripe at once
+    for stripe in stripes:
+        _row_start = max(stripe.row_start, row_start)
+        _row_end = min(stripe.row_end, row_end)
+        _col_start = max(stripe.row_start, col_start)
+        if _row_end <= _row_start or col_end <= _col_start:
             continue
 
-        #? Generate intra-/inter-domain matrices
-        _distances = distances[row_start : row_end, col_start : col_end]
-        _model = np.zeros(_distances.shape, dtype=model.dtype)
+        #? Only the columns of the block from the first row of the stripe onwards (upper-triangle)
+        col_offset = _col_start - stripe.row_start
+        active_cols = stripe.active_cols[col_offset:col_end - stripe.row_start]
+        slots = domain_index.slots(stripe, _row_start, _row_end, _col_start, col_end)
+        col_domain_ids = stripe.col_domain_ids[col_offset:col_end - stripe.row_start]
 
-        #? Fill domain-model and increment distance-index
-        for distance in np.unique(_distances):
-            _model[np.where(_distances == distance)] = dist_table[distance, distance_index[distance]]
-            distance_index[distance] += 1
+        _model = model[_row_start - row_start:_row_end - row_start, _col_start - col_start:]
 
-        #? Copy domain-model
-        model[row_start : row_end, col_start : col_end] = _model
+        #? Complex model: look up the distance-table, simple model: use the domain-value
+        _model[:, active_cols] = dist_table[slots]
+        _model[:, ~active_cols] = domain_vals[stripe.row_index, col_domain_ids[~active_cols]]
 
-    #? Copy upper-triangle to lower-triangle
-    return transform.make_mat_symmetrical(model)
\ No newline at end of file
@@ -4,8 +4,10 @@
 # @copyright Institute fuer Informationsverarbeitung
 
 import os
-import json
 import shutil
+import struct
+import hashlib
+import functools
 import logging as log
 import numpy as np
 import cooler
@@ -17,237 +19,704 @@ from . import masking
 from . import serializer
 from . import transform
 from . import domain
-from .decode import decode_chromosome
-from .wrapper import jbig, ppmd
-
-def encode_chromosome(
-    output_path: str,
-    contact_mat:t.NDArray,
+from . import utils
+from . import codec
+from . import container
+from . import profiling
+from .sparse import SparseContactMatrix, BalancedContactMatrix
+from .packed import BalancedPackedMatrix
+from .container import ContainerReader, ContainerWriter, Stream
+from .decode import decode_contact_matrix
+from .wrapper import jbig
+
+class MaskedChromosome(t.NamedTuple):
+    #? Row-/col-masked input of one chromosome and its streams (mask, weights and boundaries)
+    contact_mat: SparseContactMatrix
+    mask: t.NDArray[np.bool_]
+    #? Balancing-weights after lossy compression
+    weights: t.NDArray
+    balanced_contact_mat: BalancedContactMatrix
+    boundary_mask: t.NDArray[np.bool_]
+    boundaries: t.NDArray[np.integer]
+    dist_mat: transform.DistanceMatrix
+    #? Moments of the domain-matrices of the balanced contact-matrix, shared by domain-mask and domain-model
+    moments: stats.Moments
+    streams: t.Dict[str, Stream]
+
+class MaskedContacts(t.NamedTuple):
+    #? Row-/col-masked input of one chromosome before balancing and its streams (mask and boundaries)
+    contact_mat: SparseContactMatrix
+    mask: t.NDArray[np.bool_]
+    #? Balancing-weights of the remaining bins, before lossy compression
+    weights: t.NDArray
+    boundary_mask: t.NDArray[np.bool_]
+    boundaries: t.NDArray[np.integer]
+    dist_mat: transform.DistanceMatrix
+    streams: t.Dict[str, Stream]
+
+def mask_contacts(
+    contact_mat:SparseContactMatrix,
     weights:t.NDArray,
-    boundary_mask:t.NDArray,
-    stat_f:t.Statistic,
-    domain_mask_threshold:float,
-    weights_precision:int,
-    domain_values_precision:int,
-    distance_table_precision:int
-):
+    boundary_mask:t.NDArray
+) -> MaskedContacts:
 
-    #? Generate distance-matrix
-    n = contact_mat.shape[0]
-    dist_mat = transform.gen_dist_mat(n)
+    streams = {}
 
-    #? Apply row-masking
-    contact_mat, mask = masking.mask_axis(contact_mat, consts.Axis.ROW)
-    dist_mat = dist_mat[~mask, :]
+    with profiling.span('mask'):
+        #? Apply row-/col-masking
+        contact_mat, mask = masking.mask_sparse(contact_mat)
 
-    #? Apply col-masking
-    contact_mat, mask = masking.mask_axis(contact_mat, consts.Axis.COL)
-    dist_mat = dist_mat[:, ~mask]
+        #? Distance-matrix between the remaining bins (computed on access)
+        dist_mat = transform.DistanceMatrix(np.flatnonzero(~mask))
 
-    #? Save row-/col-mask (only save one for intra-chromosomal)    
-    _payload = serializer.encode_binary_array(mask, True)
-    with open(os.path.join(output_path, 'mask.bin'), 'wb') as file:
-        file.write(_payload)
+        #? Save row-/col-mask (only save one for intra-chromosomal)    
+        _payload = serializer.encode_binary_array(mask, True)
+        streams['mask.bin'] = Stream(_payload, mask.dtype.str)
 
     weights = weights[~mask]
-    weights = np.nan_to_num(weights, nan=1)
-
-    #? Save balancing-weights
-    _payload = fpzip.compress(weights, precision=weights_precision)
-    with open(os.path.join(output_path, 'weights.fpzip'), 'wb') as file:
-        file.write(_payload)
-
-    #? Reload balancing-weights (because of lossy compression)
-    weights = np.squeeze(fpzip.decompress(_payload))
-    if weights.ndim == 0:
-        weights = np.array([weights])
-
-    balanced_contact_mat = transform.balance_matrix(contact_mat, weights)
     boundary_mask = boundary_mask[~mask]
 
     #? Save insulation-boundaries
-    _payload = serializer.encode_binary_array(boundary_mask, True)
-    with open(os.path.join(output_path, 'boundaries.bin'), 'wb') as file:
-        file.write(_payload)
+    with profiling.span('boundaries'):
+        _payload = serializer.encode_binary_array(boundary_mask, True)
+        streams['boundaries.bin'] = Stream(_payload, boundary_mask.dtype.str)
 
     # TODO: Add boundaries at mask-transition
     boundaries = np.argwhere(boundary_mask).reshape(-1)
 
-    #? Generate domain-mask
-    domain_mask = stats.map_domains(
+    return MaskedContacts(contact_mat, mask, weights, boundary_mask, boundaries, dist_mat, streams)
+
+def balance_chromosome(
+    masked:MaskedContacts,
+    weights_precision:int
+) -> MaskedChromosome:
+
+    with profiling.span('weights'):
+        weights = np.nan_to_num(masked.weights, nan=1)
+
+        #? Save balancing-weights
+        _payload = fpzip.compress(weights, precision=weights_precision)
+        weights_stream = Stream(_payload, weights.dtype.str)
+
+        #? Reload balancing-weights (because of lossy compression)
+        weights = np.reshape(fpzip.decompress(_payload), -1)
+
+    #? Balanced contact-matrix (computed on access)
+    balanced_contact_mat = masked.contact_mat.balance(weights)
+
+    with profiling.span('domain_moments'):
+        moments = stats.domain_moments(balanced_contact_mat, masked.boundaries)
+
+    #? Streams in the order of the container: mask, weights and boundaries
+    streams = {
+        'mask.bin': masked.streams['mask.bin'],
+        'weights.fpzip': weights_stream,
+        'boundaries.bin': masked.streams['boundaries.bin'],
+    }
+    return MaskedChromosome(
+        masked.contact_mat, 
+        masked.mask, 
+        weights, 
         balanced_contact_mat, 
-        boundaries, 
-        stat_f
-    ) > domain_mask_threshold
+        masked.boundary_mask, 
+        masked.boundaries, 
+        masked.dist_mat, 
+        moments, 
+        streams
+    )
+
+def mask_chromosome(
+    contact_mat:SparseContactMatrix,
+    weights:t.NDArray,
+    boundary_mask:t.NDArray,
+    weights_precision:int
+) -> MaskedChromosome:
+
+    return balance_chromosome(mask_contacts(contact_mat, weights, boundary_mask), weights_precision)
+
+def encode_domain_mask(
+    domain_mask:t.NDArray[np.bool_]
+) -> t.Dict[str, Stream]:
 
     #? Encode domain-mask using JBIG
-    _temp = transform.transform_diagonal_mode0(domain_mask)
-    _payload = jbig.encode_binary_matrix(_temp)
-    with open(os.path.join(output_path, 'domain-mask.jbig'), 'wb') as file:
-        file.write(_payload)
+    with profiling.span('domain_mask'):
+        _temp = transform.transform_diagonal_mode0(domain_mask)
+        _payload = jbig.encode_binary_matrix(_temp)
+        return {'domain-mask.jbig': Stream(_payload, domain_mask.dtype.str)}
+
+def build_domain_model(
+    chrom:MaskedChromosome,
+    domain_mask:t.NDArray[np.bool_]
+) -> t.Tuple[domain.DomainIndex, t.NDArray, t.NDArray]:
+
+    #? Index the (domain-pair, distance) groups shared by model building and reconstruction
+    with profiling.span('domain_index'):
+        domain_index = domain.DomainIndex(chrom.dist_mat, chrom.boundaries, domain_mask)
 
     #? Build domain-model
-    domain_values, dist_table = domain.build_model(
-        balanced_contact_mat, 
-        dist_mat, 
-        boundaries, 
-        stats.STATISTIC_FUNCS['average'], 
-        domain_mask
-    )
+    with profiling.span('build_model'):
+        domain_values, dist_table = domain.build_model(
+            chrom.balanced_contact_mat, 
+            domain_index, 
+            stats.STATISTIC_FUNCS['average'],
+            chrom.moments
+        )
 
-    #? Save domain-values using fpZIP
-    _payload = fpzip.compress(domain_values, precision=domain_values_precision)
-    with open(os.path.join(output_path, 'domain-values.fpizp'), 'wb') as file:
-        file.write(_payload)
+    return domain_index, domain_values, dist_table
 
-    #? Reload domain-values (because of lossy compression)
-    domain_values = np.reshape(fpzip.decompress(_payload), -1)
+def encode_model(
+    chrom:MaskedChromosome,
+    domain_index:domain.DomainIndex,
+    domain_values:t.NDArray,
+    dist_table:t.NDArray,
+    domain_values_precision:int,
+    distance_table_precision:int
+) -> t.Tuple[t.Dict[str, Stream], BalancedPackedMatrix]:
+
+    #? Streams of the domain-model and the model reconstructed from them (i.e. as seen by the decoder)
+    streams = {}
+    with profiling.span('model_streams'):
+        #? Save domain-values using fpZIP
+        _payload = fpzip.compress(domain_values, precision=domain_values_precision)
+        streams['domain-values.fpizp'] = Stream(_payload, domain_values.dtype.str)
+
+        #? Reload domain-values (because of lossy compression)
+        domain_values = np.reshape(fpzip.decompress(_payload), -1)
 
-    #? Save distance-table
-    _payload = fpzip.compress(dist_table, precision=distance_table_precision)
-    with open(os.path.join(output_path, 'distance-table.fpizp'), 'wb') as file:
-        file.write(_payload)
+        #? Save distance-table
+        _payload = fpzip.compress(dist_table, precision=distance_table_precision)
+        streams['distance-table.fpizp'] = Stream(_payload, dist_table.dtype.str)
 
-    #? Reload distance-table (because of lossy compression)
-    dist_table = np.reshape(fpzip.decompress(_payload), -1)
+        #? Reload distance-table (because of lossy compression)
+        dist_table = np.reshape(fpzip.decompress(_payload), -1)
 
     #? Reconstruct model
-    model = domain.reconstruct_model(
-        dist_mat, 
-        boundaries, 
-        domain_mask, 
-        domain_values, 
-        dist_table
-    )
-    model = transform.revert_balanced_matrix(model, weights)
+    with profiling.span('reconstruct_model'):
+        model = domain.reconstruct_model(
+            domain_index, 
+            domain_values, 
+            dist_table
+        )
+        model = transform.revert_balanced_matrix(model, chrom.weights)
+
+    return streams, model
+
+def encode_contacts(
+    contact_mat:SparseContactMatrix,
+    model:BalancedPackedMatrix,
+    contact_data_codec:str=consts.CONTACT_DATA_CODEC_DEFAULT,
+    tile_size:t.Optional[int]=None
+) -> t.Dict[str, Stream]:
+
+    if tile_size is not None:
+        with profiling.span('encode_tiles'):
+            return encode_tiles(contact_mat, model, tile_size, contact_data_codec)
+
+    streams = {}
 
     #? Transform original contact-matrix
-    contact_mat = transform.transform_argsort(contact_mat, model)
-    contact_mask, contact_data = transform.transform_split(contact_mat)
+    with profiling.span('transform_argsort'):
+        contact_mask, contact_data = transform.transform_argsort_coo(
+            contact_mat.row_ids,
+            contact_mat.col_ids,
+            contact_mat.data,
+            model
+        )
 
     #? Save contact-mask
-    _payload = jbig.encode_binary_matrix(contact_mask)
-    with open(os.path.join(output_path, 'contact-mask.jbig'), 'wb') as file:
-        file.write(_payload)
+    with profiling.span('contact_mask'):
+        _payload = jbig.encode_binary_matrix(contact_mask)
+        streams['contact-mask.jbig'] = Stream(_payload, contact_mask.dtype.str)
 
     #? Save contact-data
-    bytes_per_val = contact_data.dtype.itemsize
-    _payload = ppmd.encode_bytes(contact_data.tobytes(), model_order=bytes_per_val*2)
-    with open(os.path.join(output_path, 'contact-data.ppmd'), 'wb') as file:
-        file.write(_payload)
-        
-def encode(args):    
-    overwrite = args.overwrite
-    res = args.resolution
-    input_file = args.input_file
-    ins_win = args.insulation_window
-    ins_win_mult = args.insulation_window_mult
-    stat_name = args.domain_mask_statistic
-    stat_f = stats.STATISTIC_FUNCS[stat_name]
-    domain_mask_threshold, = args.domain_mask_threshold,
-    weights_precision,  = args.weights_precision, 
-    domain_values_precision,  = args.domain_values_precision, 
-    distance_table_precision = args.distance_table_precision
-    balancing_name = args.balancing
-    
-    log.info(f'Encoding {input_file}')
+    with profiling.span('contact_data', codec=contact_data_codec):
+        bytes_per_val = contact_data.dtype.itemsize
+        _payload = codec.encode_bytes(contact_data.tobytes(), contact_data_codec, model_order=bytes_per_val*2)
+        streams['contact-data.ppmd'] = Stream(_payload, contact_data.dtype.str)
 
-    #? Load cooler file
-    store = cooler.Cooler(os.path.normpath(input_file) + f'::/resolutions/{res}')
-    matrix_selector = store.matrix(balance=False)
-    balancing_selector = store.bins()
-    chr_names = store.chromnames
+    return streams
 
-    #? Setup output-directory
-    output_dpath = os.path.normpath(args.output_directory)
-    if not os.path.exists(output_dpath):
-        os.makedirs(output_dpath)
-    else:
-        if overwrite:
-            shutil.rmtree(output_dpath)
-            os.makedirs(output_dpath)
-            
-    meta_fpath = os.path.join(output_dpath, 'chr_names.json')
-    meta_dict = {
-        'res': res,
-        'chr_names': chr_names
-    }
-    with open(meta_fpath, 'w') as f:
-        json.dump(meta_dict, f, indent=4)
+def encode_chromosome(
+    contact_mat:SparseContactMatrix,
+    weights:t.NDArray,
+    boundary_mask:t.NDArray,
+    stat_f:t.Statistic,
+    domain_mask_threshold:float,
+    weights_precision:int,
+    domain_values_precision:int,
+    distance_table_precision:int,
+    contact_data_codec:str=consts.CONTACT_DATA_CODEC_DEFAULT,
+    tile_size:t.Optional[int]=None,
+    check_result:bool=False
+) -> t.Dict[str, Stream]:
 
-    #? Load insulation-table
-    if ins_win_mult is not None:
-        ins_win = ins_win_mult * res
-    
-    insulation_df = domain.load_insulation_table(args.insulation_file)
-    if str(ins_win) not in insulation_df.columns:
-        raise ValueError(
-            f'Invalid insulation windows: {ins_win}. ' +  
-            f'Available: {list(insulation_df.columns[3:])}'
-        )
-    insulation_rec = insulation_df.iloc[0]
-    assert insulation_rec.end - insulation_rec.start == res, "Invalid insulation file for given resolution!"
+    chrom = mask_chromosome(contact_mat, weights, boundary_mask, weights_precision)
+    streams = dict(chrom.streams)
+
+    #? Generate domain-mask
+    with profiling.span('map_domains'):
+        domain_mask = stat_f(chrom.moments) > domain_mask_threshold
 
-    #? Iterate over all chromosomes, TODO: Add argument to select chromosome
-    for chr_idx in range(len(chr_names)):
-        chr_name = chr_names[chr_idx]
+    streams.update(encode_domain_mask(domain_mask))
 
-        log.info(f'Processing chromosome {chr_name} at {res}kb')
-        chr_dpath = os.path.join(output_dpath, f'{chr_idx:02}-{chr_idx:02}')
-        if not os.path.exists(chr_dpath):
-            os.makedirs(chr_dpath)
+    domain_index, domain_values, dist_table = build_domain_model(chrom, domain_mask)
+    model_streams, model = encode_model(
+        chrom, 
+        domain_index, 
+        domain_values, 
+        dist_table, 
+        domain_values_precision, 
+        distance_table_precision
+    )
+    streams.update(model_streams)
+    streams.update(encode_contacts(chrom.contact_mat, model, contact_data_codec, tile_size))
+
+    if check_result:
+        with profiling.span('check_result'):
+            check_streams(streams, chrom.contact_mat, chrom.mask, chrom.boundary_mask, domain_mask, model, tile_size)
+
+    return streams
+
+def check_streams(
+    streams:t.Dict[str, Stream],
+    contact_mat:SparseContactMatrix,
+    mask:t.NDArray[np.bool_],
+    boundary_mask:t.NDArray[np.bool_],
+    domain_mask:t.NDArray[np.bool_],
+    model:BalancedPackedMatrix,
+    tile_size:t.Optional[int]
+):
 
-        else:
-            if len(os.listdir(chr_dpath)) == 8:
-                log.info(f'Chromosome already processed!')
-                continue
+    #? Round-trip the lossless streams in memory. The lossy streams were already reloaded to build the model,
+    #? so the contact-streams are decoded with this model instead of reconstructing it from the streams.
+    assert np.array_equal(serializer.decode_binary_array(streams['mask.bin'].payload), mask), \
+        "Decoded row-/col-mask differs from the original mask"
+
+    assert np.array_equal(serializer.decode_binary_array(streams['boundaries.bin'].payload), boundary_mask), \
+        "Decoded boundaries differ from the original boundaries"
+
+    _temp = jbig.decode_binary_matrix(streams['domain-mask.jbig'].payload)
+    assert np.array_equal(transform.inverse_tranform_diagonal_mode0(_temp), domain_mask), \
+        "Decoded domain-mask differs from the original domain-mask"
+
+    recon_contact_mat = decode_contact_matrix(streams, model, tile_size)
+    assert contact_mat.equals(recon_contact_mat), \
+        "Decoded contact matrix differ from the original contact matrix"
+
+def encode_tiles(
+    contact_mat:SparseContactMatrix,
+    model:BalancedPackedMatrix,
+    tile_size:int,
+    contact_data_codec:str
+) -> t.Dict[str, Stream]:
+
+    #? Order and code the contact-data of every upper-triangle tile independently, empty tiles are not stored
+    streams = {}
+    ntiles = -(-contact_mat.n // tile_size)
+    tile_ids = (contact_mat.row_ids // tile_size) * ntiles + contact_mat.col_ids // tile_size
+    order = np.argsort(tile_ids, kind='stable')
+    tile_ids = tile_ids[order]
+    tile_starts = np.flatnonzero(np.diff(tile_ids, prepend=-1))
+    tile_ends = np.append(tile_starts[1:], len(tile_ids))
+
+    for tile_start, tile_end in zip(tile_starts, tile_ends):
+        tile_row, tile_col = divmod(int(tile_ids[tile_start]), ntiles)
+        entry_ids = order[tile_start:tile_end]
+        row_start = tile_row * tile_size
+        col_start = tile_col * tile_size
+        model_tile = model[row_start:row_start + tile_size, col_start:col_start + tile_size]
+
+        contact_mask, contact_data = transform.transform_argsort_tile(
+            contact_mat.row_ids[entry_ids],
+            contact_mat.col_ids[entry_ids],
+            contact_mat.data[entry_ids],
+            model_tile,
+            row_start,
+            col_start
+        )
+        mask_name, data_name = container.tile_stream_names(tile_row, tile_col)
+
+        #? Save contact-mask as image with the width of the tile
+        ncols = model_tile.shape[1]
+        _temp = np.zeros(-(-len(contact_mask) // ncols) * ncols, dtype=bool)
+        _temp[:len(contact_mask)] = contact_mask
+        _payload = jbig.encode_binary_matrix(_temp.reshape(-1, ncols))
+        streams[mask_name] = Stream(_payload, contact_mask.dtype.str)
+
+        #? Save contact-data
+        bytes_per_val = contact_data.dtype.itemsize
+        _payload = codec.encode_bytes(contact_data.tobytes(), contact_data_codec, model_order=bytes_per_val*2)
+        streams[data_name] = Stream(_payload, contact_data.dtype.str)
+
+    return streams
+
+def fetch_chromosome(
+    cooler_uri:str,
+    chr_name:str,
+    balancing_name:str
+) -> t.Tuple[SparseContactMatrix, t.NDArray]:
+
+    #? Open a cooler handle per job (h5py handles must not be shared between processes)
+    store = cooler.Cooler(cooler_uri)
+    balancing_selector = store.bins()
 
-        #? Fetch contact-matrix from selector
-        log.info(f'Fetching contact matrix...')
-        contact_mat = matrix_selector.fetch(chr_name)
+    #? Stream upper-triangle pixels of the contact-matrix
+    log.info(f'Fetching contact matrix...')
+    with profiling.span('fetch_contact_matrix'):
+        contact_mat = SparseContactMatrix.from_cooler(store, chr_name)
         contact_mat = contact_mat.astype(np.min_scalar_type(contact_mat.max()))
-        stats.assert_square(contact_mat)
 
-        #? Fetch balancing-weights from selector
-        log.info(f'Fetching balancing weights...')
+    #? Fetch balancing-weights from selector
+    log.info(f'Fetching balancing weights...')
+    with profiling.span('fetch_weights'):
         balancing_weights = balancing_selector.fetch(chr_name)
-        try:
-            weights = balancing_weights[balancing_name]
-        except:
-            ValueError(f'Cannot found the balancing method: {balancing_name}')
-
-        if consts.WEIGHTS_PRECISION_DEFAULT == 32:
-            weights = weights.astype(np.float32)
-        elif consts.WEIGHTS_PRECISION_DEFAULT == 64:
-            weights = weights.astype(np.float64)
-        else:
-            raise ValueError(consts.WEIGHTS_PRECISION_DEFAULT)
-
-        #? Load insulation boundaries for this chromosome
-        log.info(f'Loading TAD boundaries...')
-        boundary_mask = domain.select_boundaries(
-            insulation_df,
-            chr_name,
-            ins_win
-        )
+    try:
+        weights = balancing_weights[balancing_name]
+    except KeyError:
+        raise ValueError(f'Cannot found the balancing method: {balancing_name}')
+
+    if consts.WEIGHTS_PRECISION_DEFAULT == 32:
+        weights = weights.astype(np.float32)
+    elif consts.WEIGHTS_PRECISION_DEFAULT == 64:
+        weights = weights.astype(np.float64)
+    else:
+        raise ValueError(consts.WEIGHTS_PRECISION_DEFAULT)
+
+    return contact_mat, weights
+
+def encode_chromosome_job(
+    cooler_uri:str,
+    chr_name:str,
+    boundary_mask:t.NDArray,
+    balancing_name:str,
+    stat_name:str,
+    domain_mask_threshold:float,
+    weights_precision:int,
+    domain_values_precision:int,
+    distance_table_precision:int,
+    contact_data_codec:str,
+    tile_size:t.Optional[int],
+    check_result:bool
+) -> t.Tuple[t.Dict[str, Stream], str, t.Dict[str, t.Any]]:
+    log.info(f'Processing chromosome {chr_name}')
+    with profiling.scope(chr_name=chr_name), profiling.span('encode_chromosome') as attrs:
+
+        #? Source-key of the input before it is read, a later change makes the manifest stale
+        source_key = input_source_key(cooler_uri, chr_name, boundary_mask)
+        contact_mat, weights = fetch_chromosome(cooler_uri, chr_name, balancing_name)
+        with profiling.span('hash_input'):
+            input_hash = hash_input(contact_mat, weights, boundary_mask)
 
         log.info(f'Encoding contact matrix...')
-        encode_chromosome(
-            chr_dpath, 
+        streams = encode_chromosome(
             contact_mat, 
             weights, 
             boundary_mask,
-            stat_f, 
+            stats.STATISTIC_FUNCS[stat_name], 
             domain_mask_threshold,
             weights_precision, 
             domain_values_precision, 
-            distance_table_precision
+            distance_table_precision,
+            contact_data_codec,
+            tile_size,
+            check_result
         )
-        
-        if args.check_result:
-            recon_contact_mat = decode_chromosome(
-                chr_dpath
+
+        #? Compressed size of each stream (tile-streams summed up)
+        attrs['stream_sizes'] = container.stream_sizes(streams)
+
+    return streams, input_hash, source_key
+
+def hash_input(
+    contact_mat:SparseContactMatrix,
+    weights:t.NDArray,
+    boundary_mask:t.NDArray
+) -> str:
+
+    #? Hash of the input of one chromosome: contact-matrix, balancing-weights and boundaries
+    _hash = hashlib.sha256()
+    for array in (contact_mat.row_ids, contact_mat.col_ids, contact_mat.data, weights, boundary_mask):
+        _hash.update(array.dtype.str.encode('utf-8'))
+        _hash.update(np.ascontiguousarray(array).tobytes())
+
+    return _hash.hexdigest()
+
+def hash_chromosome_job(
+    cooler_uri:str,
+    chr_name:str,
+    boundary_mask:t.NDArray,
+    balancing_name:str
+) -> str:
+
+    contact_mat, weights = fetch_chromosome(cooler_uri, chr_name, balancing_name)
+    return hash_input(contact_mat, weights, boundary_mask)
+
+def input_source_key(
+    cooler_uri:str,
+    chr_name:str,
+    boundary_mask:t.NDArray
+) -> t.Dict[str, t.Any]:
+
+    #? Cheap key of the input of one chromosome: the cooler file, the bins and pixels of the chromosome and its boundaries.
+    #? The input is only hashed again if the key changed.
+    fpath, _, group = cooler_uri.partition('::')
+    stat = os.stat(fpath)
+    store = cooler.Cooler(cooler_uri)
+    bin_start, bin_end = store.extent(chr_name)
+    with store.open('r') as grp:
+        pixel_start, pixel_end = grp['indexes']['bin1_offset'][[bin_start, bin_end]]
+
+    return dict(
+        path=os.path.abspath(fpath),
+        group=group,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        bins=[int(bin_start), int(bin_end)],
+        pixels=[int(pixel_start), int(pixel_end)],
+        boundaries=hashlib.sha256(np.ascontiguousarray(boundary_mask).tobytes()).hexdigest(),
+    )
+
+def _read_manifest(
+    fpath:str,
+    res:int,
+    chr_name:str
+) -> t.Optional[t.Dict[str, t.Any]]:
+
+    #? Manifest of the chromosome of the container if all its streams are intact
+    try:
+        reader = ContainerReader(fpath, res)
+    except (OSError, ValueError, struct.error):
+        return None
+
+    manifest = reader.manifest.get(chr_name)
+    if manifest is None or not all(reader.check_chromosome(chr_name).values()):
+        return None
+
+    return manifest
+
+def insulation_window(
+    args,
+    res:int
+) -> int:
+
+    #? Insulation-window of the resolution, either given or as multiple of the resolution
+    if args.insulation_window_mult is not None:
+        return args.insulation_window_mult * res
+
+    return args.insulation_window
+
+def load_insulation_table(
+    insulation_file:str,
+    res:int,
+    ins_win:int
+) -> domain.InsulationTable:
+
+    #? Load insulation-table, {res} in the path is replaced by the resolution
+    with profiling.span('load_insulation_table'):
+        insulation_table = domain.load_insulation_table(insulation_file.replace('{res}', str(res)))
+    if ins_win not in insulation_table.windows:
+        raise ValueError(
+            f'Invalid insulation windows: {ins_win}. ' +  
+            f'Available: {insulation_table.windows}'
+        )
+    assert insulation_table.res == res, "Invalid insulation file for given resolution!"
+
+    return insulation_table
+
+def list_resolutions(input_file:str) -> t.List[int]:
+    #? Resolutions of a .mcool file (/resolutions/<res>)
+    _prefix = '/resolutions/'
+    return sorted(
+        int(path[len(_prefix):]) for path in cooler.fileops.list_coolers(input_file) if path.startswith(_prefix)
+    )
+
+def encode(args):    
+    overwrite = args.overwrite
+    resume = args.resume
+    resolutions = args.resolution
+    input_file = args.input_file
+    stat_name = args.domain_mask_statistic
+    domain_mask_threshold, = args.domain_mask_threshold,
+    weights_precision,  = args.weights_precision, 
+    domain_values_precision,  = args.domain_values_precision, 
+    distance_table_precision = args.distance_table_precision
+    balancing_name = args.balancing
+    contact_data_codec = args.contact_data_codec
+    tile_size = args.tile_size
+    
+    log.info(f'Encoding {input_file}')
+
+    #? All resolutions of the input file
+    if resolutions is None:
+        resolutions = list_resolutions(input_file)
+        if not resolutions:
+            raise ValueError(f'No resolutions found: {input_file}')
+
+    #? Setup output-file, an existing container is only replaced once the new one is complete
+    output_fpath = os.path.normpath(args.output)
+    if os.path.isdir(output_fpath):
+        #? Legacy directory layout
+        if not overwrite:
+            raise FileExistsError(f'Output already exists: {output_fpath}, use --overwrite')
+
+        shutil.rmtree(output_fpath)
+
+    elif os.path.exists(output_fpath) and not (overwrite or resume):
+        raise FileExistsError(f'Output already exists: {output_fpath}, use --overwrite or --resume')
+
+    output_dpath = os.path.dirname(output_fpath)
+    if output_dpath and not os.path.exists(output_dpath):
+        os.makedirs(output_dpath)
+
+    #? Encoded chromosomes are kept as single-chromosome containers until the output is complete,
+    #? valid ones of an interrupted run are reused
+    parts_dpath = output_fpath + '.parts'
+    os.makedirs(parts_dpath, exist_ok=True)
+
+    #? Collect one job per resolution and chromosome, all jobs share one worker pool
+    #? TODO: Add argument to select chromosome
+    meta_dicts = {}
+    jobs = {}
+    job_ids = {}
+    part_fpaths = {}
+    params = {}
+    for res in resolutions:
+
+        #? Load cooler file
+        cooler_uri = os.path.normpath(input_file) + f'::/resolutions/{res}'
+        store = cooler.Cooler(cooler_uri)
+        chr_names = store.chromnames
+
+        meta_dicts[res] = {
+            'res': res,
+            'chr_names': chr_names,
+            'chr_lengths': store.chromsizes[chr_names].tolist(),
+            'tile_size': tile_size,
+            'stable_order': True
+        }
+
+        ins_win = insulation_window(args, res)
+        with profiling.scope(res=res):
+            insulation_table = load_insulation_table(args.insulation_file, res, ins_win)
+
+        #? Parameters of the encoding, chromosomes encoded with other parameters are stale
+        params[res] = dict(
+            balancing=balancing_name,
+            domain_mask_statistic=stat_name,
+            domain_mask_threshold=domain_mask_threshold,
+            weights_precision=weights_precision,
+            domain_values_precision=domain_values_precision,
+            distance_table_precision=distance_table_precision,
+            contact_data_codec=contact_data_codec,
+            tile_size=tile_size,
+            insulation_window=ins_win,
+            container_version=container.CONTAINER_VERSION,
+            model_version=consts.MODEL_VERSION,
+        )
+
+        for chr_idx, chr_name in enumerate(chr_names):
+
+            #? Load insulation boundaries for this chromosome
+            boundary_mask = insulation_table.select(chr_name, ins_win)
+
+            jobs[f'{res}/{chr_name}'] = dict(
+                cooler_uri=cooler_uri,
+                chr_name=chr_name,
+                boundary_mask=boundary_mask,
+                balancing_name=balancing_name,
+                stat_name=stat_name,
+                domain_mask_threshold=domain_mask_threshold,
+                weights_precision=weights_precision,
+                domain_values_precision=domain_values_precision,
+                distance_table_precision=distance_table_precision,
+                contact_data_codec=contact_data_codec,
+                tile_size=tile_size,
+                check_result=args.check_result,
             )
-            
-            assert np.array_equal(contact_mat, recon_contact_mat), \
-                "Decoded contact matrix differ from the original contact matrix"
\ No newline at end of file
+            job_ids[f'{res}/{chr_name}'] = (res, chr_name)
+            part_fpaths[f'{res}/{chr_name}'] = os.path.join(parts_dpath, f'{res}-{chr_idx:04}.hicmc')
+
+    #? The manifest of each chromosome (source-key, input-hash and parameters) decides whether it is up-to-date.
+    #? Candidates are parts of an interrupted run, then the existing output, encoded with the same parameters. The cooler
+    #? is only opened for the source-key of chromosomes with a candidate, the first one with the same source-key is used.
+    source_keys = {}
+    candidates = {}
+    manifests = {}
+    sources = {}
+    for key, (res, chr_name) in job_ids.items():
+        candidates[key] = []
+        for fpath in [part_fpaths[key]] + ([output_fpath] if resume else []):
+            manifest = _read_manifest(fpath, res, chr_name)
+            if manifest is None or manifest.get('params') != params[res]:
+                continue
+
+            if key not in source_keys:
+                source_keys[key] = input_source_key(jobs[key]['cooler_uri'], chr_name, jobs[key]['boundary_mask'])
+
+            if manifest.get('source') == source_keys[key]:
+                sources[key] = fpath
+                manifests[key] = dict(source=source_keys[key], input_hash=manifest['input_hash'], params=params[res])
+                break
+
+            candidates[key].append((fpath, manifest))
+
+    #? Only chromosomes whose source-key changed are hashed
+    hash_jobs = {
+        key: dict(
+            cooler_uri=jobs[key]['cooler_uri'], 
+            chr_name=jobs[key]['chr_name'], 
+            boundary_mask=jobs[key]['boundary_mask'], 
+            balancing_name=balancing_name
+        ) for key, _candidates in candidates.items() 
+        if _candidates and key not in sources
+    }
+    if hash_jobs:
+        log.info(f'Hashing input of {len(hash_jobs)} chromosomes...')
+    input_hashes = utils.run_jobs(hash_chromosome_job, hash_jobs, args.jobs) if hash_jobs else {}
+
+    for key, input_hash in input_hashes.items():
+        res, _ = job_ids[key]
+        for fpath, manifest in candidates[key]:
+            if manifest.get('input_hash') == input_hash:
+                sources[key] = fpath
+                manifests[key] = dict(source=source_keys[key], input_hash=input_hash, params=params[res])
+                break
+
+    stale_jobs = {key: job for key, job in jobs.items() if key not in sources}
+    if sources:
+        log.info(f'{len(sources)} of {len(jobs)} chromosome(s) are up-to-date')
+
+    log.info(f'Encoding {len(stale_jobs)} chromosomes at {len(resolutions)} resolution(s) using {args.jobs} job(s)')
+    #? Jobs return their spans with the streams, as worker processes do not have the hooks
+    recorded = profiling.enabled()
+    job_f = functools.partial(profiling.run_recorded, encode_chromosome_job) if recorded else encode_chromosome_job
+    for key, result in utils.iter_jobs(job_f, stale_jobs, args.jobs):
+        res, chr_name = job_ids[key]
+        if recorded:
+            result, spans = result
+            profiling.replay(spans, res=res)
+
+        streams, input_hash, source_key = result
+        manifests[key] = dict(source=source_key, input_hash=input_hash, params=params[res])
+
+        #? Keep every chromosome as soon as it is encoded (written atomically)
+        with ContainerWriter(part_fpaths[key]) as writer:
+            writer.add_resolution(meta_dicts[res])
+            writer.write_chromosome(res, chr_name, streams, manifests[key])
+
+        sources[key] = part_fpaths[key]
+
+    #? Write all streams into a single container
+    readers = {}
+    with ContainerWriter(output_fpath) as writer, profiling.span('write_container'):
+        for res, meta_dict in meta_dicts.items():
+            writer.add_resolution(meta_dict)
+            for chr_name in meta_dict['chr_names']:
+                key = f'{res}/{chr_name}'
+                if (sources[key], res) not in readers:
+                    readers[sources[key], res] = ContainerReader(sources[key], res)
+
+                streams = readers[sources[key], res].read_chromosome(chr_name)
+                writer.write_chromosome(res, chr_name, streams, manifests[key])
+
+    shutil.rmtree(parts_dpath)
@@ -6,6 +6,7 @@
 import numpy as np
 from . import typing as t
 from . import constants as consts
+from .sparse import SparseContactMatrix
 
 def mask_axis(
     mat:t.NDArray,
@@ -42,4 +43,12 @@ def unmask_axis(
 	else:
 		raise ValueError("Invalid axis:{axis}")
 
-	return out_mat
\ No newline at end of file
+	return out_mat
+
+def mask_sparse(
+    mat:SparseContactMatrix
+) -> t.Tuple[SparseContactMatrix, t.NDArray[np.bool_]]:
+
+	#? Row- and col-mask are identical, because contact-matrix is symmetric
+	mask = mat.empty_bins()
+	return mat.compress(mask), mask
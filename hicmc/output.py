@@ -0,0 +1,283 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import queue
+import itertools
+import threading
+import numpy as np
+from . import typing as t
+from . import constants as consts
+
+class ContactPixels(t.NamedTuple):
+    #? Chunk of the upper-triangle entries (row <= col) of a decoded n x n contact-matrix, ordered by row, then col
+    n: int
+    row_ids: t.NDArray[np.integer]
+    col_ids: t.NDArray[np.integer]
+    counts: t.NDArray[np.integer]
+
+#? Writers consume the chunks of one chromosome (at least one, possibly empty) one at a time
+
+def write_csv(
+    fpath:str,
+    chunks:t.Iterator[ContactPixels]
+):
+    import pandas as pd
+
+    with open(fpath, 'w', newline='') as file:
+        for chunk_idx, pixels in enumerate(chunks):
+            pd.DataFrame(
+                data={
+                    'row_ids':pixels.row_ids,
+                    'col_ids':pixels.col_ids,
+                    'counts':pixels.counts
+                }
+            ).to_csv(
+                file,
+                index=False,
+                header=chunk_idx == 0
+            )
+
+def write_parquet(
+    fpath:str,
+    chunks:t.Iterator[ContactPixels]
+):
+    #? Optional dependency, only required for this output-format
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('Output-format parquet requires pyarrow: pip install pyarrow')
+
+    writer = None
+    try:
+        for pixels in chunks:
+            table = pa.table({
+                'row_ids':pixels.row_ids,
+                'col_ids':pixels.col_ids,
+                'counts':pixels.counts
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(fpath, table.schema)
+
+            writer.write_table(table, row_group_size=consts.OUTPUT_CHUNKSIZE)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_npz(
+    fpath:str,
+    chunks:t.Iterator[ContactPixels]
+):
+    #? The arrays of a .npz file are written as a whole, so the chunks of the chromosome are collected
+    chunks = list(chunks)
+    np.savez(
+        fpath,
+        n=chunks[0].n,
+        row_ids=np.concatenate([pixels.row_ids for pixels in chunks]),
+        col_ids=np.concatenate([pixels.col_ids for pixels in chunks]),
+        counts=np.concatenate([pixels.counts for pixels in chunks])
+    )
+
+def write_npy(
+    fpath:str,
+    chunks:t.Iterator[ContactPixels]
+):
+    #? Dense symmetric matrix, filled in place
+    contact_mat = None
+    for pixels in chunks:
+        if contact_mat is None:
+            contact_mat = np.lib.format.open_memmap(fpath, mode='w+', dtype=pixels.counts.dtype, shape=(pixels.n, pixels.n))
+
+        contact_mat[pixels.row_ids, pixels.col_ids] = pixels.counts
+        contact_mat[pixels.col_ids, pixels.row_ids] = pixels.counts
+
+    contact_mat.flush()
+    del contact_mat
+
+#? Writers of one file per chromosome and their file-extension
+FILE_WRITERS = {
+    'csv': (write_csv, 'csv'),
+    'parquet': (write_parquet, 'parquet'),
+    'npz': (write_npz, 'npz'),
+    'npy': (write_npy, 'npy'),
+}
+
+OUTPUT_FORMATS = list(FILE_WRITERS) + ['cool']
+
+_DONE = object()
+
+class BackgroundWriter:
+    #? Passes queued items to consume(items) in a background thread, so output I/O overlaps with decoding.
+    #? The queue is bounded, errors of the thread are raised by put and close.
+
+    def __init__(
+        self,
+        consume:t.Callable[[t.Iterator[t.Any]], None],
+        maxsize:int=consts.OUTPUT_QUEUE_SIZE
+    ):
+        self._queue = queue.Queue(maxsize)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, args=(consume,), daemon=True)
+        self._thread.start()
+
+    def _items(self) -> t.Iterator[t.Any]:
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                self._closed = True
+                return
+
+            yield item
+
+    def _run(self, consume):
+        try:
+            consume(self._items())
+        except BaseException as err:
+            self._error = err
+
+            #? Keep draining until closed, so put never blocks (consume may fail after the last item)
+            if not self._closed:
+                for _ in self._items():
+                    pass
+
+    def put(self, item):
+        if self._error is not None:
+            raise self._error
+
+        self._queue.put(item)
+
+    def close(self):
+        self._queue.put(_DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> 'BackgroundWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            #? Finish the queued items, but do not hide the original error
+            self._queue.put(_DONE)
+            self._thread.join()
+
+class FileWriter(BackgroundWriter):
+    #? One file per chromosome, named after the chromosome-index
+
+    def __init__(
+        self,
+        output_dpath:str,
+        output_format:str,
+        chr_names:t.List[str]
+    ):
+        self.output_dpath = output_dpath
+        self.chr_names = chr_names
+        self.write_f, self.ext = FILE_WRITERS[output_format]
+        super().__init__(self._consume)
+
+    def _consume(self, items):
+        #? Chunks of one chromosome are consecutive
+        for chr_name, _items in itertools.groupby(items, key=lambda item: item[0]):
+            chr_idx = self.chr_names.index(chr_name)
+            fpath = os.path.join(self.output_dpath, f'{chr_idx:02}-{chr_idx:02}.{self.ext}')
+            self.write_f(fpath, (pixels for _, pixels in _items))
+
+    def write_chromosome(
+        self,
+        chr_name:str,
+        chunks:t.Iterable[ContactPixels],
+        weights:t.Optional[t.NDArray]=None
+    ):
+        #? The balancing-weights are not stored by these formats
+        for pixels in chunks:
+            self.put((chr_name, pixels))
+
+class CoolerWriter(BackgroundWriter):
+    #? All chromosomes in one cooler file, .mcool files store it as the only resolution.
+    #? Chromosomes must be written in the order of chr_names. The balancing-weights are stored as the (multiplicative)
+    #? weight column of the bins, i.e. inverted if the encoded weights are divisive.
+
+    def __init__(
+        self,
+        output_fpath:str,
+        chr_names:t.List[str],
+        chr_lengths:t.List[int],
+        res:int,
+        divisive_weights:bool=True
+    ):
+        self.output_fpath = output_fpath
+        self.chr_names = chr_names
+        self.divisive_weights = divisive_weights
+        self.weights = {}
+        self.cool_uri = output_fpath
+        if output_fpath.endswith('.mcool'):
+            self.cool_uri += f'::/resolutions/{res}'
+
+        #? cooler (and pandas) are only imported for this output-format
+        import cooler
+        import pandas as pd
+
+        self.bins = cooler.binnify(pd.Series(chr_lengths, index=chr_names), res)
+        nbins = [-(-length // res) for length in chr_lengths]
+        self.bin_offsets = dict(zip(chr_names, np.cumsum([0] + nbins[:-1]).tolist()))
+        super().__init__(self._consume)
+
+    def _pixels(self, items) -> t.Iterator['pd.DataFrame']:
+        import pandas as pd
+
+        for chr_name, pixels in items:
+            offset = self.bin_offsets[chr_name]
+            yield pd.DataFrame({
+                'bin1_id': pixels.row_ids + offset,
+                'bin2_id': pixels.col_ids + offset,
+                'count': pixels.counts,
+            })
+
+    def _consume(self, items):
+        import cooler
+
+        cooler.create_cooler(
+            self.cool_uri,
+            self.bins,
+            self._pixels(items),
+            dtypes={'count': np.int32},
+            ordered=True
+        )
+
+        #? All chromosomes are written, NaN marks bins without weight (as cooler balance does)
+        weights = np.concatenate([self.weights[chr_name] for chr_name in self.chr_names])
+        if self.divisive_weights:
+            with np.errstate(divide='ignore'):
+                weights = 1 / weights
+
+        with cooler.Cooler(self.cool_uri).open('r+') as grp:
+            grp['bins'].create_dataset('weight', data=weights, compression='gzip', compression_opts=6)
+
+    def write_chromosome(
+        self,
+        chr_name:str,
+        chunks:t.Iterable[ContactPixels],
+        weights:t.NDArray
+    ):
+        #? Weights of all bins of the chromosome, kept until the pixels of all chromosomes are written
+        self.weights[chr_name] = np.asarray(weights, dtype=np.float64)
+        for pixels in chunks:
+            self.put((chr_name, pixels))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        failed = exc_type is not None
+        try:
+            super().__exit__(exc_type, exc_value, traceback)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            #? Do not leave a cooler with missing chromosomes behind
+            if failed and os.path.exists(self.output_fpath):
+                os.remove(self.output_fpath)
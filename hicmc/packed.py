@@ -0,0 +1,219 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import numpy as np
+from . import typing as t
+from .sparse import _block_bounds
+
+def diagonal_starts(n:int) -> t.NDArray[np.intp]:
+    #? Offset of the diagonals 0, 1, ..., n-1 (and the end) within the packed upper-triangle
+    dists = np.arange(n + 1, dtype=np.intp)
+    return dists * n - dists * (dists - 1) // 2
+
+def upper_positions(
+    n:int,
+    row_ids:t.NDArray[np.intp],
+    col_ids:t.NDArray[np.intp]
+) -> t.NDArray[np.intp]:
+
+    #? Position of upper-triangle cells (row <= col) within the concatenation of diagonals 0, 1, ..., n-1
+    dists = col_ids - row_ids
+    return dists * n - dists * (dists - 1) // 2 + row_ids
+
+def _mirror_upper(
+    row_start:int,
+    row_end:int,
+    col_start:int,
+    col_end:int
+) -> t.Tuple[t.NDArray[np.intp], t.NDArray[np.intp]]:
+
+    #? Row- and col-index of every cell of the block, mirrored into the upper-triangle
+    rows = np.arange(row_start, row_end, dtype=np.intp)[:, None]
+    cols = np.arange(col_start, col_end, dtype=np.intp)[None, :]
+    return np.minimum(rows, cols), np.maximum(rows, cols)
+
+class PackedMatrix:
+    #? Symmetric matrix stored as its upper-triangle diagonals 0, 1, ..., n-1 (the order of transform.transform_diagonal_mode0),
+    #? i.e. n(n+1)/2 instead of n^2 entries. Blocks are materialized on access, including the mirrored lower-triangle.
+
+    def __init__(
+        self,
+        n:int,
+        data:t.NDArray
+    ):
+        if len(data) != n * (n + 1) // 2:
+            raise ValueError(f'Invalid packed matrix, expected {n * (n + 1) // 2} entries, got {len(data)}')
+
+        self.n = n
+        self.data = data
+        self._starts = diagonal_starts(n)
+
+    @classmethod
+    def zeros(
+        cls,
+        n:int,
+        dtype
+    ) -> 'PackedMatrix':
+
+        return cls(n, np.zeros(n * (n + 1) // 2, dtype=dtype))
+
+    @classmethod
+    def from_dense(
+        cls,
+        mat:t.NDArray
+    ) -> 'PackedMatrix':
+
+        #? Only the upper-triangle is kept
+        nrows, ncols = mat.shape
+        if not nrows == ncols:
+            raise RuntimeError(f'Matrix is not square, Shape: {mat.shape}')
+
+        if not nrows:
+            return cls.zeros(0, mat.dtype)
+
+        return cls(nrows, np.concatenate([np.diagonal(mat, dist) for dist in range(nrows)]))
+
+    @property
+    def shape(self) -> t.Tuple[int, int]:
+        return self.n, self.n
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def diagonal(
+        self,
+        dist:int
+    ) -> t.NDArray:
+
+        #? View of the diagonal at the given distance, empty for dist >= n
+        dist = min(dist, self.n)
+        return self.data[self._starts[dist]:self._starts[dist] + self.n - dist]
+
+    def set_upper_rows(
+        self,
+        row_start:int,
+        block:t.NDArray
+    ):
+
+        #? Write the upper-triangle cells of the block [row_start, row_start + nrows) x [row_start, row_start + ncols)
+        #? Cells (row, row + dist) of one row are at _starts[dist] + row
+        nrows, ncols = block.shape
+        for row_idx in range(min(nrows, ncols)):
+            row = row_start + row_idx
+            self.data[self._starts[:ncols - row_idx] + row] = block[row_idx, row_idx:]
+
+    def __getitem__(self, key) -> t.NDArray:
+        row_start, row_end, col_start, col_end = _block_bounds(key, self.n)
+        rows, cols = _mirror_upper(row_start, row_end, col_start, col_end)
+        return self.data[upper_positions(self.n, rows, cols)]
+
+    def to_dense(self) -> t.NDArray:
+        return self[:, :]
+
+    def cumshift(
+        self,
+        nrows:int
+    ) -> t.NDArray:
+
+        #? Equals statistics.cumshift_cols(self.to_dense(), -1, nrows): row i holds the diagonal i (lower-triangle cells)
+        #? followed by the first i entries of the diagonal n - i (upper-triangle cells)
+        out = np.empty((nrows, self.n), dtype=self.dtype)
+        for dist in range(nrows):
+            out[dist, :self.n - dist] = self.diagonal(dist)
+            out[dist, self.n - dist:] = self.diagonal(self.n - dist)[:dist]
+
+        return out
+
+    def balance(
+        self,
+        weights:t.NDArray,
+        mult_op:bool=False
+    ) -> 'BalancedPackedMatrix':
+
+        return BalancedPackedMatrix(self, weights, mult_op)
+
+class BalancedPackedMatrix:
+    #? Balanced view of a PackedMatrix, bit-identical to transform.balance_matrix of the dense matrix.
+    #? The lower-triangle cells are balanced in their own operand order, so the view is not necessarily symmetric.
+
+    def __init__(
+        self,
+        mat:PackedMatrix,
+        weights:t.NDArray,
+        mult_op:bool=False
+    ):
+        self.mat = mat
+        self.weights = weights
+        self.mult_op = mult_op
+        self.dtype = weights.dtype
+
+        #? balance_matrix only copies the upper- to the lower-triangle if the first sub-diagonal is empty
+        #? (the sub-diagonal of the lower-triangle before copying, cells (i + 1, i))
+        ids = np.arange(max(mat.n - 1, 0), dtype=np.intp)
+        self.symmetrize = not self._balance(mat.diagonal(1), ids + 1, ids).any()
+
+    @property
+    def shape(self) -> t.Tuple[int, int]:
+        return self.mat.shape
+
+    def _balance(
+        self,
+        values:t.NDArray,
+        row_ids:t.NDArray[np.intp],
+        col_ids:t.NDArray[np.intp]
+    ) -> t.NDArray:
+
+        #? Same operations as transform.balance_block, for the given cells
+        values = values.astype(self.dtype)
+        if self.mult_op:
+            values *= self.weights[row_ids]
+            values *= self.weights[col_ids]
+
+        else:
+            values /= self.weights[row_ids]
+            values /= self.weights[col_ids]
+
+        return values
+
+    def diagonal(
+        self,
+        dist:int,
+        lower:bool=False
+    ) -> t.NDArray:
+
+        #? Cells (i, i + dist) of the upper-triangle or (i + dist, i) of the lower-triangle
+        ids = np.arange(self.mat.n - min(dist, self.mat.n), dtype=np.intp)
+        if lower and not self.symmetrize:
+            return self._balance(self.mat.diagonal(dist), ids + dist, ids)
+
+        return self._balance(self.mat.diagonal(dist), ids, ids + dist)
+
+    def __getitem__(self, key) -> t.NDArray:
+        row_start, row_end, col_start, col_end = _block_bounds(key, self.mat.n)
+        row_ids, col_ids = _mirror_upper(row_start, row_end, col_start, col_end)
+        values = self.mat.data[upper_positions(self.mat.n, row_ids, col_ids)]
+        if self.symmetrize:
+            return self._balance(values, row_ids, col_ids)
+
+        rows, cols = np.indices((row_end - row_start, col_end - col_start), dtype=np.intp)
+        return self._balance(values, rows + row_start, cols + col_start)
+
+    def to_dense(self) -> t.NDArray:
+        return self[:, :]
+
+    def cumshift(
+        self,
+        nrows:int
+    ) -> t.NDArray:
+
+        #? See PackedMatrix.cumshift
+        n = self.mat.n
+        out = np.empty((nrows, n), dtype=self.dtype)
+        for dist in range(nrows):
+            out[dist, :n - dist] = self.diagonal(dist, lower=True)
+            out[dist, n - dist:] = self.diagonal(n - dist)[:dist]
+
+        return out
@@ -0,0 +1,178 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import sys
+import json
+import time
+import resource
+import contextlib
+from . import typing as t
+
+class Span(t.NamedTuple):
+    name: str
+    #? Job the span belongs to, e.g. res and chr_name
+    context: t.Dict[str, t.Any]
+    wall_time: float
+    #? User and system time of the process and of its finished sub-processes (e.g. the JBIG tools)
+    cpu_time: float
+    #? Peak RSS within the span (process high-water mark if it cannot be reset)
+    peak_rss_mb: float
+    #? Values set by the instrumented code, e.g. stream-sizes
+    attrs: t.Dict[str, t.Any]
+
+Hook = t.Callable[[Span], None]
+
+#? Hooks receive every finished span, spans are only measured if at least one hook is registered
+_hooks: t.List[Hook] = []
+_context: t.Dict[str, t.Any] = {}
+#? Spans of a job are recorded instead of passed to the hooks, see run_recorded
+_recorder: t.Optional[t.List[Span]] = None
+#? Peak RSS of the enclosing spans
+_peaks: t.List[float] = []
+
+def add_hook(hook:Hook):
+    _hooks.append(hook)
+
+def remove_hook(hook:Hook):
+    _hooks.remove(hook)
+
+def enabled() -> bool:
+    return bool(_hooks) or _recorder is not None
+
+def _reset_peak_rss():
+    #? Linux: reset the high-water mark of the RSS (VmHWM), so the peak of each span can be measured
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb() -> float:
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    #? ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss /= 1024
+
+    return peak_rss / 1024
+
+def _cpu_time() -> float:
+    _times = os.times()
+    return _times.user + _times.system + _times.children_user + _times.children_system
+
+def _emit(span:Span):
+    if _recorder is not None:
+        _recorder.append(span)
+        return
+
+    for hook in list(_hooks):
+        hook(span)
+
+@contextlib.contextmanager
+def span(
+    name:str,
+    **attrs
+) -> t.Iterator[t.Dict[str, t.Any]]:
+
+    #? Measures the enclosed code, the yielded attrs can be extended until the span ends
+    if not enabled():
+        yield attrs
+        return
+
+    #? The peak of the enclosing span so far is kept before resetting the high-water mark
+    if _peaks:
+        _peaks[-1] = max(_peaks[-1], _peak_rss_mb())
+
+    _reset_peak_rss()
+    _peaks.append(0.0)
+    wall_start = time.perf_counter()
+    cpu_start = _cpu_time()
+    try:
+        yield attrs
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = _cpu_time() - cpu_start
+    finally:
+        peak_rss_mb = max(_peaks.pop(), _peak_rss_mb())
+        if _peaks:
+            _peaks[-1] = max(_peaks[-1], peak_rss_mb)
+
+    _emit(Span(name, dict(_context), wall_time, cpu_time, peak_rss_mb, attrs))
+
+@contextlib.contextmanager
+def scope(**context):
+    #? Adds context (e.g. chr_name) to all spans within
+    global _context
+    outer = _context
+    _context = {**outer, **context}
+    try:
+        yield
+    finally:
+        _context = outer
+
+def iter_scope(
+    iterator:t.Iterable[t.Any],
+    **context
+) -> t.Iterator[t.Any]:
+
+    #? Adds context to the spans of a generator, only while it runs (not while its consumer holds an item)
+    iterator = iter(iterator)
+    while True:
+        with scope(**context):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+
+        yield item
+
+@contextlib.contextmanager
+def record() -> t.Iterator[t.List[Span]]:
+    global _recorder
+    outer = _recorder
+    _recorder = []
+    try:
+        yield _recorder
+    finally:
+        _recorder = outer
+
+def run_recorded(
+    func:t.Callable[..., t.Any],
+    **kwargs
+) -> t.Tuple[t.Any, t.List[Span]]:
+
+    #? Runs a job (possibly in a worker process without hooks) and returns its spans together with the result
+    with record() as spans:
+        result = func(**kwargs)
+
+    return result, spans
+
+def replay(
+    spans:t.List[Span],
+    **context
+):
+    #? Passes the spans of a job to the hooks, with additional context
+    for _span in spans:
+        _emit(_span._replace(context={**context, **_span.context}))
+
+class ProfileReport:
+    #? Hook collecting all spans, written as JSON (--profile-report)
+
+    def __init__(self):
+        self.spans = []
+
+    def __call__(self, span:Span):
+        self.spans.append(span)
+
+    def save(self, fpath:str):
+        with open(fpath, 'w') as f:
+            json.dump(dict(spans=[_span._asdict() for _span in self.spans]), f, indent=2)
@@ -3,74 +3,38 @@
 # @file Description
 # @copyright Institute fuer Informationsverarbeitung
 
-import bitstream
 import numpy
-from bitstream import BitStream
 from numpy.typing import NDArray
 import math
 from . import transform
 
-class uint(object):
-    def __init__(self, bits):
-        self._bits = bits
-
-
-def encode_uint_factory(instance):
-    _bits = instance._bits
-
-    def write_uint(stream, data):
-        if isinstance(data, list) or isinstance(data, numpy.ndarray):
-            for integer in data:
-                write_uint(stream, integer)
-
-        else:
-            integer = int(data)
-            if integer < 0:
-                raise ValueError(f"Number is negative, Number: {integer}")
-
-            booleans = []
-            for _ in range(_bits):
-                booleans.append(integer & 1)
-                integer = integer >> 1
-
-            booleans.reverse()
-            stream.write(booleans, bool)
-
-    return write_uint
-
+_padding_bits = 4
+_counts_size_bits = 8
 
-def decode_uint_factory(instance):
-    _bits = instance._bits
 
-    def read_uint(stream, n=None):
-        if n is None:
-            integer = 0
-            for _ in range(_bits):
-                integer = integer << 1
-                if stream.read(bool):
-                    integer += 1
-                    
-            return integer
+def _uint_bits(data, bits: int) -> NDArray[numpy.uint8]:
+    #? Unsigned integers as MSB-first bits
+    data = numpy.asarray(data, dtype=numpy.uint64).reshape(-1, 1)
+    shifts = numpy.arange(bits - 1, -1, -1, dtype=numpy.uint64)
+    return ((data >> shifts) & 1).astype(numpy.uint8).reshape(-1)
 
-        else:
-            return [read_uint(stream) for _ in range(n)]
 
-    return read_uint
+def _bits_uint(bits: NDArray[numpy.uint8], nbits: int) -> NDArray[numpy.uint64]:
+    #? MSB-first bits as unsigned integers, trailing bits are ignored
+    bits = bits[:len(bits) // nbits * nbits].reshape(-1, nbits).astype(numpy.uint64)
+    shifts = numpy.arange(nbits - 1, -1, -1, dtype=numpy.uint64)
+    return numpy.bitwise_or.reduce(bits << shifts, axis=1)
 
 
-bitstream.register(uint, reader=decode_uint_factory, writer=encode_uint_factory)
-
-
-_padding_bits = 4
-_counts_size_bits = 8
+def _header_size(nbits: int) -> int:
+    #? The header is always padded with 1 to 8 bits
+    return nbits + 8 - nbits % 8
 
 
 def encode_binary_array(array: NDArray[numpy.bool_], _transform: bool) -> bytes:
 
-    _head = BitStream()
-
     #? Write transform-lag
-    _head.write(_transform, bool)
+    _head = [numpy.array([_transform], dtype=numpy.uint8)]
     if _transform:
         
         #? Transform using binary run-length encoding
@@ -79,54 +43,55 @@ def encode_binary_array(array: NDArray[numpy.bool_], _transform: bool) -> bytes:
         counts_size = math.ceil(math.log2(counts.max() + 1))
         
         #? Write first-value
-        _head.write(val, bool)
+        _head.append(numpy.array([val], dtype=numpy.uint8))
 
         #? Write integer-size
-        _head.write(counts_size, uint(_counts_size_bits))
+        _head.append(_uint_bits(counts_size, _counts_size_bits))
         
         #? Write data
-        _data = BitStream(counts, uint(counts_size))
+        _data = _uint_bits(counts, counts_size)
 
     else:
-        _data = BitStream(array, bool)
+        _data = numpy.asarray(array, dtype=bool).reshape(-1).astype(numpy.uint8)
 
-    #? Add padding to payload
+    #? Add padding to payload (packbits pads with zeros)
     padding = (8 - len(_data)) % 8
-    _head.write(padding, uint(_padding_bits))
-    _data.write([0] * padding, bool)
+    _head.append(_uint_bits(padding, _padding_bits))
     
     #? Add padding to header
-    _head.write([0] * (8 - len(_head) % 8), bool)
-    return _head.read(bytes) + _data.read(bytes)
+    _head = numpy.concatenate(_head)
+    _head = numpy.concatenate([_head, numpy.zeros(8 - len(_head) % 8, dtype=numpy.uint8)])
+    return numpy.packbits(_head).tobytes() + numpy.packbits(_data).tobytes()
 
 
 def decode_binary_array(payload: bytes) -> NDArray[numpy.bool_]:
 
-    _stream = BitStream(payload)
+    _bits = numpy.unpackbits(numpy.frombuffer(payload, dtype=numpy.uint8))
     
     #? Read transform-flag
-    _transform = _stream.read(bool)
+    _transform = bool(_bits[0])
     if _transform:
         
         #? Read first-value
-        first_value = _stream.read(bool)
+        first_value = bool(_bits[1])
 
         #? Read integer-size
-        counts_size = _stream.read(uint(_counts_size_bits))
+        counts_size = int(_bits_uint(_bits[2:2 + _counts_size_bits], _counts_size_bits)[0])
         
         #? Read padding
-        padding = _stream.read(uint(_padding_bits))        
-        _stream.read(bool, len(_stream) % 8)
+        _offset = 2 + _counts_size_bits
+        padding = int(_bits_uint(_bits[_offset:_offset + _padding_bits], _padding_bits)[0])
+        _offset = _header_size(_offset + _padding_bits)
 
         #? Read data
-        counts = numpy.array(_stream.read(uint(counts_size), (len(_stream) - padding) // counts_size), dtype=numpy.integer)
+        counts = _bits_uint(_bits[_offset:len(_bits) - padding], counts_size).astype(numpy.int64)
         return transform.decode_binary_run_length(first_value, counts)
 
     else:
 
         #? Read padding
-        padding = _stream.read(uint(_padding_bits))
-        _stream.read(bool, len(_stream) % 8)
+        padding = int(_bits_uint(_bits[1:1 + _padding_bits], _padding_bits)[0])
+        _offset = _header_size(1 + _padding_bits)
 
         #? Read data
-        return _stream.read(bool, len(_stream) - padding)
+        return _bits[_offset:len(_bits) - padding].astype(bool)
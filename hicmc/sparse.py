@@ -0,0 +1,266 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import numpy as np
+from . import typing as t
+from . import constants as consts
+
+def _block_bounds(key, n:int) -> t.Tuple[int, int, int, int]:
+    row_key, col_key = key
+    row_start, row_end, row_step = row_key.indices(n)
+    col_start, col_end, col_step = col_key.indices(n)
+    if row_step != 1 or col_step != 1:
+        raise IndexError('Only contiguous blocks are supported!')
+
+    return row_start, max(row_start, row_end), col_start, max(col_start, col_end)
+
+class SparseContactMatrix:
+    #? Symmetric contact-matrix stored as upper-triangle (row <= col) coordinates sorted by row, then col.
+    #? Blocks are materialized on access, including the mirrored lower-triangle entries.
+
+    def __init__(
+        self,
+        n:int,
+        row_ids:t.NDArray[np.integer],
+        col_ids:t.NDArray[np.integer],
+        data:t.NDArray[np.integer]
+    ):
+        self.n = n
+        self.row_ids = row_ids
+        self.col_ids = col_ids
+        self.data = data
+        self._col_order = None
+
+    @classmethod
+    def from_dense(
+        cls,
+        mat:t.NDArray[np.integer]
+    ) -> 'SparseContactMatrix':
+
+        nrows, ncols = mat.shape
+        if not nrows == ncols:
+            raise RuntimeError(f'Matrix is not square, Shape: {mat.shape}')
+
+        row_ids, col_ids = np.nonzero(mat)
+        upper = row_ids <= col_ids
+        row_ids, col_ids = row_ids[upper], col_ids[upper]
+        return cls(nrows, row_ids, col_ids, mat[row_ids, col_ids])
+
+    @classmethod
+    def from_coo(
+        cls,
+        n:int,
+        row_ids:t.NDArray[np.integer],
+        col_ids:t.NDArray[np.integer],
+        data:t.NDArray[np.integer]
+    ) -> 'SparseContactMatrix':
+
+        #? Upper-triangle entries in any order, zero entries are removed
+        keep = data != 0
+        row_ids, col_ids, data = row_ids[keep], col_ids[keep], data[keep]
+        order = np.lexsort((col_ids, row_ids))
+        return cls(n, row_ids[order], col_ids[order], data[order])
+
+    @classmethod
+    def from_cooler(
+        cls,
+        store,
+        chr_name:str,
+        chunksize:int = consts.PIXELS_CHUNKSIZE
+    ) -> 'SparseContactMatrix':
+
+        #? Stream the pixel-table (bin1_id, bin2_id, count) of one chromosome in chunks
+        bin_start, bin_end = store.extent(chr_name)
+        row_ids, col_ids, data = [], [], []
+        with store.open('r') as grp:
+            pixel_start, pixel_end = grp['indexes']['bin1_offset'][[bin_start, bin_end]]
+            for chunk_start in range(pixel_start, pixel_end, chunksize):
+                chunk_end = min(chunk_start + chunksize, pixel_end)
+                bin1_ids = grp['pixels']['bin1_id'][chunk_start:chunk_end]
+                bin2_ids = grp['pixels']['bin2_id'][chunk_start:chunk_end]
+                counts = grp['pixels']['count'][chunk_start:chunk_end]
+
+                #? Only keep non-zero intra-chromosomal pixels
+                keep = (bin2_ids < bin_end) & (counts != 0)
+                row_ids.append((bin1_ids[keep] - bin_start).astype(np.int64))
+                col_ids.append((bin2_ids[keep] - bin_start).astype(np.int64))
+                data.append(counts[keep])
+
+        n = bin_end - bin_start
+        if not row_ids:
+            return cls(n, np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.uint8))
+
+        data = np.concatenate(data)
+        data = data.astype(np.min_scalar_type(data.max(initial=0)))
+        return cls(n, np.concatenate(row_ids), np.concatenate(col_ids), data)
+
+    @property
+    def shape(self) -> t.Tuple[int, int]:
+        return self.n, self.n
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def max(self):
+        return self.data.max(initial=0)
+
+    def astype(self, dtype) -> 'SparseContactMatrix':
+        return SparseContactMatrix(self.n, self.row_ids, self.col_ids, self.data.astype(dtype))
+
+    def empty_bins(self) -> t.NDArray[np.bool_]:
+        #? Bins without any contact (the same rows and columns, because contact-matrix is symmetric)
+        mask = np.ones(self.n, dtype=bool)
+        mask[self.row_ids] = False
+        mask[self.col_ids] = False
+        return mask
+
+    def compress(
+        self,
+        mask:t.NDArray[np.bool_]
+    ) -> 'SparseContactMatrix':
+
+        #? Remove masked bins, entries of masked bins must be zero
+        new_ids = np.cumsum(~mask) - 1
+        return SparseContactMatrix(
+            int(np.sum(~mask)),
+            new_ids[self.row_ids],
+            new_ids[self.col_ids],
+            self.data
+        )
+
+    def equals(
+        self,
+        other:'SparseContactMatrix'
+    ) -> bool:
+
+        return (
+            self.n == other.n
+            and np.array_equal(self.row_ids, other.row_ids)
+            and np.array_equal(self.col_ids, other.col_ids)
+            and np.array_equal(self.data, other.data)
+        )
+
+    def select(
+        self,
+        row_start:int,
+        row_end:int,
+        col_start:int,
+        col_end:int
+    ) -> t.Tuple[t.NDArray[np.integer], t.NDArray[np.integer], t.NDArray[np.integer], t.NDArray[np.bool_]]:
+
+        #? Returns row-/col-index, entry-index and mirror-flag of all entries within the block
+
+        #? Entries of the upper-triangle
+        lo, hi = np.searchsorted(self.row_ids, [row_start, row_end])
+        entry_ids = np.arange(lo, hi)
+        entry_ids = entry_ids[(self.col_ids[lo:hi] >= col_start) & (self.col_ids[lo:hi] < col_end)]
+        upper_rows = self.row_ids[entry_ids]
+        upper_cols = self.col_ids[entry_ids]
+
+        #? Entries of the lower-triangle (mirrored, without the main diagonal)
+        if self._col_order is None:
+            self._col_order = np.lexsort((self.row_ids, self.col_ids))
+            self._sorted_col_ids = self.col_ids[self._col_order]
+
+        lo, hi = np.searchsorted(self._sorted_col_ids, [row_start, row_end])
+        mirror_ids = self._col_order[lo:hi]
+        mirror_ids = mirror_ids[
+            (self.row_ids[mirror_ids] >= col_start)
+            & (self.row_ids[mirror_ids] < col_end)
+            & (self.row_ids[mirror_ids] != self.col_ids[mirror_ids])
+        ]
+        lower_rows = self.col_ids[mirror_ids]
+        lower_cols = self.row_ids[mirror_ids]
+
+        return (
+            np.concatenate([upper_rows, lower_rows]),
+            np.concatenate([upper_cols, lower_cols]),
+            np.concatenate([entry_ids, mirror_ids]),
+            np.repeat([False, True], [len(entry_ids), len(mirror_ids)])
+        )
+
+    def __getitem__(self, key) -> t.NDArray[np.integer]:
+        row_start, row_end, col_start, col_end = _block_bounds(key, self.n)
+        rows, cols, entry_ids, _ = self.select(row_start, row_end, col_start, col_end)
+
+        block = np.zeros((row_end - row_start, col_end - col_start), dtype=self.dtype)
+        block[rows - row_start, cols - col_start] = self.data[entry_ids]
+        return block
+
+    def to_dense(self) -> t.NDArray[np.integer]:
+        return self[:, :]
+
+    def balance(
+        self,
+        weights:t.NDArray
+    ) -> 'BalancedContactMatrix':
+
+        return BalancedContactMatrix(self, weights)
+
+class BalancedContactMatrix:
+    #? Balanced view of a SparseContactMatrix, bit-identical to transform.balance_matrix of the dense matrix.
+    #? Blocks are computed on access.
+
+    def __init__(
+        self,
+        mat:SparseContactMatrix,
+        weights:t.NDArray
+    ):
+        self.mat = mat
+        self.weights = weights
+        self.dtype = weights.dtype
+
+        #? balance_matrix only copies the upper- to the lower-triangle if the first sub-diagonal is empty
+        subdiag = (mat.col_ids - mat.row_ids) == 1
+        subdiag_values = np.zeros(max(mat.n - 1, 0), dtype=mat.dtype)
+        subdiag_values[mat.row_ids[subdiag]] = mat.data[subdiag]
+        subdiag_values = subdiag_values.astype(self.dtype)
+        subdiag_values /= weights[1:]
+        subdiag_values /= weights[:-1]
+        self.symmetrize = not subdiag_values.any()
+
+    @property
+    def shape(self) -> t.Tuple[int, int]:
+        return self.mat.shape
+
+    @property
+    def row_ids(self) -> t.NDArray[np.integer]:
+        return self.mat.row_ids
+
+    @property
+    def col_ids(self) -> t.NDArray[np.integer]:
+        return self.mat.col_ids
+
+    @property
+    def data(self) -> t.NDArray:
+        #? Balanced values of the upper-triangle entries, as in the blocks
+        data = self.mat.data.astype(self.dtype)
+        data /= self.weights[self.mat.row_ids]
+        data /= self.weights[self.mat.col_ids]
+        return data
+
+    def __getitem__(self, key) -> t.NDArray:
+        row_start, row_end, col_start, col_end = _block_bounds(key, self.mat.n)
+        rows, cols, entry_ids, mirrored = self.mat.select(row_start, row_end, col_start, col_end)
+
+        #? Same operations as the dense balance_matrix, applied to the block only
+        block = np.zeros((row_end - row_start, col_end - col_start), dtype=self.dtype)
+        block[rows - row_start, cols - col_start] = self.mat.data[entry_ids]
+        block /= self.weights[row_start:row_end].reshape(-1, 1)
+        block /= self.weights[col_start:col_end].reshape(1, -1)
+
+        if self.symmetrize:
+            #? Lower-triangle entries are copies of the upper-triangle
+            rows, cols, entry_ids = rows[mirrored], cols[mirrored], entry_ids[mirrored]
+            block[rows - row_start, cols - col_start] = (
+                self.mat.data[entry_ids].astype(self.dtype) / self.weights[cols] / self.weights[rows]
+            )
+
+        return block
@@ -3,20 +3,197 @@
 # @file Description
 # @copyright Institute fuer Informationsverarbeitung
 
-import math
+import functools
 import numpy as np
 from . import typing as t
+from . import constants as consts
+from .sparse import SparseContactMatrix, BalancedContactMatrix
 
-def sparsity(array: t.NDArray) -> float:
-    density = np.count_nonzero(array) / math.prod(array.shape)
-    return 1 - density(array)
+class Moments(t.NamedTuple):
+    #? Moments of blocks (or groups) of values, statistics are reduced from them without visiting the values again
+    size: t.NDArray[np.integer]
+    sum: t.NDArray[np.float64]
+    #? Sum of squared deviations from the mean (centered, no cancellation for large means)
+    m2: t.NDArray[np.float64]
+    nnz: t.NDArray[np.integer]
+
+#? Reducers: statistic of every block from its moments, empty blocks yield NaN
+def average(moments:Moments) -> t.NDArray[np.float64]:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return moments.sum / moments.size
+
+def deviation(moments:Moments) -> t.NDArray[np.float64]:
+    #? Population standard deviation (as np.std)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sqrt(moments.m2 / moments.size)
+
+def sparsity(moments:Moments) -> t.NDArray[np.float64]:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - moments.nnz / moments.size
 
 STATISTIC_FUNCS = {
-    'average': np.average,
+    'average': average,
     'sparsity': sparsity,
-    'deviation': np.std,
+    'deviation': deviation,
 }
 
+def grouped_moments(
+    values:t.NDArray,
+    sizes:t.NDArray[np.integer]
+) -> Moments:
+
+    #? Moments of consecutive, non-empty groups of values, accumulated in double precision.
+    #? The squared deviations are summed in a second pass over the values.
+    sizes = np.asarray(sizes, dtype=np.int64)
+    if not len(sizes):
+        return Moments(sizes, np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+
+    starts = np.zeros(len(sizes), dtype=np.int64)
+    np.cumsum(sizes[:-1], out=starts[1:])
+
+    values = values.astype(np.float64)
+    sums = np.add.reduceat(values, starts)
+    deviations = values - np.repeat(sums / sizes, sizes)
+    return Moments(
+        sizes,
+        sums,
+        np.add.reduceat(deviations * deviations, starts),
+        np.add.reduceat((values != 0).astype(np.int64), starts)
+    )
+
+#? Constants of numpy's pairwise summation (see pairwise_sum in numpy/core/src/umath/loops_utils.h.src)
+_PAIRWISE_BLOCKSIZE = 128
+_PAIRWISE_UNROLL = 8
+
+def _pairwise_leaf_sums(
+    values:t.NDArray,
+    starts:t.NDArray[np.integer],
+    sizes:t.NDArray[np.integer]
+) -> t.NDArray:
+
+    sums = np.zeros(len(starts), dtype=values.dtype)
+
+    #? Leaves with less than 8 entries are summed sequentially
+    small = sizes < _PAIRWISE_UNROLL
+    _starts, _sizes = starts[small], sizes[small]
+    _sums = np.zeros(len(_starts), dtype=values.dtype)
+    for offset in range(_PAIRWISE_UNROLL - 1):
+        valid = offset < _sizes
+        _sums[valid] += values[_starts[valid] + offset]
+    sums[small] = _sums
+
+    #? Larger leaves are summed using 8 interleaved accumulators, the remainder sequentially
+    _starts, _sizes = starts[~small], sizes[~small]
+    lanes = np.arange(_PAIRWISE_UNROLL)
+    nblocks = _sizes // _PAIRWISE_UNROLL
+    acc = values[_starts[:, None] + lanes]
+    for block in range(1, _PAIRWISE_BLOCKSIZE // _PAIRWISE_UNROLL):
+        valid = block < nblocks
+        acc[valid] += values[_starts[valid, None] + block * _PAIRWISE_UNROLL + lanes]
+
+    _sums = ((acc[:, 0] + acc[:, 1]) + (acc[:, 2] + acc[:, 3])) + ((acc[:, 4] + acc[:, 5]) + (acc[:, 6] + acc[:, 7]))
+    for offset in range(_PAIRWISE_UNROLL - 1):
+        valid = offset < _sizes % _PAIRWISE_UNROLL
+        _sums[valid] += values[_starts[valid] + nblocks[valid] * _PAIRWISE_UNROLL + offset]
+    sums[~small] = _sums
+
+    return sums
+
+def _pairwise_sums(
+    values:t.NDArray,
+    starts:t.NDArray[np.integer],
+    sizes:t.NDArray[np.integer]
+) -> t.NDArray:
+
+    #? Split segments top-down (like numpy) until every segment is a leaf
+    levels = []
+    while True:
+        split = sizes > _PAIRWISE_BLOCKSIZE
+        levels.append((starts, sizes, split))
+        if not split.any():
+            break
+
+        left_sizes = sizes[split] // 2
+        left_sizes -= left_sizes % _PAIRWISE_UNROLL
+        starts = np.stack([starts[split], starts[split] + left_sizes], axis=1).reshape(-1)
+        sizes = np.stack([left_sizes, sizes[split] - left_sizes], axis=1).reshape(-1)
+
+    #? Combine the sums of the left and right child bottom-up
+    child_sums = None
+    for starts, sizes, split in reversed(levels):
+        sums = np.empty(len(starts), dtype=values.dtype)
+        sums[~split] = _pairwise_leaf_sums(values, starts[~split], sizes[~split])
+        if child_sums is not None:
+            sums[split] = child_sums[0::2] + child_sums[1::2]
+        child_sums = sums
+
+    return child_sums
+
+def grouped_sum(
+    values:t.NDArray,
+    sizes:t.NDArray[np.integer]
+) -> t.NDArray:
+
+    #? Sum consecutive groups of values, bit-identical to np.sum of each group.
+    #? numpy (1.x) reduces buffer-sized chunks pairwise and accumulates the chunk sums sequentially.
+    sizes = np.asarray(sizes, dtype=np.int64)
+    starts = np.zeros(len(sizes), dtype=np.int64)
+    np.cumsum(sizes[:-1], out=starts[1:])
+
+    bufsize = np.getbufsize()
+    nchunks = -(-sizes // bufsize)
+    first_chunk = np.zeros(len(sizes), dtype=np.int64)
+    np.cumsum(nchunks[:-1], out=first_chunk[1:])
+    chunk_ids = np.arange(nchunks.sum()) - np.repeat(first_chunk, nchunks)
+    chunk_starts = np.repeat(starts, nchunks) + chunk_ids * bufsize
+    chunk_sizes = np.minimum(np.repeat(sizes, nchunks) - chunk_ids * bufsize, bufsize)
+    chunk_sums = _pairwise_sums(values, chunk_starts, chunk_sizes)
+
+    sums = chunk_sums[first_chunk]
+    for chunk_id in range(1, nchunks.max(initial=1)):
+        valid = chunk_id < nchunks
+        sums[valid] += chunk_sums[first_chunk[valid] + chunk_id]
+
+    return sums
+
+def grouped_average(
+    values:t.NDArray,
+    sizes:t.NDArray[np.integer]
+) -> t.NDArray:
+
+    #? Divide in double precision and round once, like np.average does for scalar results
+    sums = grouped_sum(values, sizes)
+    return (sums.astype(np.float64) / sizes).astype(values.dtype)
+
+def grouped_deviation(
+    values:t.NDArray,
+    sizes:t.NDArray[np.integer]
+) -> t.NDArray:
+
+    #? Same operations as np.std: squared deviations from the rounded mean, summed in the dtype of the values
+    deviations = values - np.repeat(grouped_average(values, sizes), sizes)
+    deviations *= deviations
+    return np.sqrt((grouped_sum(deviations, sizes).astype(np.float64) / sizes).astype(values.dtype))
+
+#? Statistics of groups that are stored in the model (distance-table), bit-identical to np.average and np.std of each group
+GROUPED_STATISTIC_FUNCS = {
+    average: grouped_average,
+    deviation: grouped_deviation,
+}
+
+def grouped_statistic(
+    stat_f:t.Statistic,
+    values:t.NDArray,
+    sizes:t.NDArray[np.integer]
+) -> t.NDArray:
+
+    #? Statistic of consecutive, non-empty groups of values, other statistics are reduced from the moments
+    grouped_f = GROUPED_STATISTIC_FUNCS.get(stat_f)
+    if grouped_f is not None and len(sizes):
+        return grouped_f(values, np.asarray(sizes, dtype=np.int64))
+
+    return stat_f(grouped_moments(values, sizes))
+
 def assert_square(matrix: t.NDArray, return_n=False) -> int:
     nrows, ncols = matrix.shape
     if not nrows == ncols:
@@ -25,45 +202,85 @@ def assert_square(matrix: t.NDArray, return_n=False) -> int:
     if return_n:
         return nrows
     
-def cumshift_cols(mat: t.NDArray, k: int) -> t.NDArray:
+@functools.lru_cache(maxsize=consts.INDEX_CACHE_SIZE)
+def _cumshift_index(n: int, k: int, nrows: int) -> t.NDArray[np.intp]:
+    #? Flat gather-index of the first nrows rows of the shifted matrix: out[i, j] = mat[(i - k*j) % n, j]
+    cols = np.arange(n, dtype=np.intp)
+    index = np.empty((nrows, n), dtype=np.intp)
+    np.add(np.arange(nrows, dtype=np.intp)[:, None], (-k * cols) % n, out=index)
+    np.subtract(index, n, out=index, where=index >= n)
+    index *= n
+    index += cols
+    index.flags.writeable = False
+    return index
+
+def cumshift_cols(mat: t.NDArray, k: int, nrows: t.Optional[int] = None) -> t.NDArray:
     n = assert_square(mat, return_n=True)
+    if nrows is None:
+        nrows = n
+
+    #? Roll column j by k*j using a single gather, only the first nrows rows are computed
+    return mat.reshape(-1)[_cumshift_index(n, k, nrows)]
 
-    #? Compute output-matrix
-    out_mat = np.empty_like(mat)
-    for index in range(n):
-        out_mat[:, index] = np.roll(mat[:, index], k * index)
+def inverse_cumshift_cols(mat: t.NDArray, k: int) -> t.NDArray:
+    nrows, n = mat.shape
 
+    #? Scatter the first nrows rows of cumshift_cols(out_mat, k) back, remaining entries are zero
+    out_mat = np.zeros((n, n), dtype=mat.dtype)
+    out_mat.reshape(-1)[_cumshift_index(n, k, nrows)] = mat
     return out_mat
 
+def domain_moments(
+    contact_mat:t.Union[SparseContactMatrix, BalancedContactMatrix, t.NDArray],
+    boundaries:t.NDArray
+) -> Moments:
+
+    #? Moments of every domain-matrix (ndomains x ndomains, symmetric) from the upper-triangle entries: sums in a first pass,
+    #? squared deviations from the domain-mean in a second one. Zero entries are not visited, they only contribute
+    #? size and their squared mean, so the dense matrix is never materialized.
+    if isinstance(contact_mat, np.ndarray):
+        contact_mat = SparseContactMatrix.from_dense(contact_mat)
+
+    n = contact_mat.shape[0]
+    ndomains = len(boundaries) + 1
+
+    #? Domain-index of every bin
+    domain_ids = np.searchsorted(boundaries, np.arange(n), side='right')
+    row_domain_ids = domain_ids[contact_mat.row_ids]
+    col_domain_ids = domain_ids[contact_mat.col_ids]
+    keys = row_domain_ids * ndomains + col_domain_ids
+
+    #? Off-diagonal entries within a diagonal domain-matrix are also counted for the mirrored lower-triangle
+    counts = np.where((row_domain_ids == col_domain_ids) & (contact_mat.row_ids != contact_mat.col_ids), 2, 1)
+    values = contact_mat.data.astype(np.float64)
+
+    def _bincount(weights:t.NDArray) -> t.NDArray:
+        domain_mat = np.bincount(keys, weights=weights, minlength=ndomains * ndomains).reshape(ndomains, ndomains)
+
+        #? Enforce symmetrical property (entries of the upper-triangle only hit domain-pairs of the upper-triangle)
+        return domain_mat + np.triu(domain_mat, 1).T
+
+    lengths = np.diff(boundaries, prepend=0, append=n)
+    sizes = np.multiply.outer(lengths, lengths)
+    sums = _bincount(values * counts)
+    nentries = _bincount(counts)
+    means = np.divide(sums, sizes, out=np.zeros(sums.shape), where=sizes > 0)
+
+    deviations = values - means.reshape(-1)[keys]
+    m2 = _bincount(deviations * deviations * counts) + (sizes - nentries) * means * means
+
+    return Moments(
+        sizes,
+        sums,
+        m2,
+        _bincount((values != 0) * counts).astype(np.int64)
+    )
+
 def map_domains(
-    contact_mat:t.NDArray[np.integer],
+    contact_mat:t.Union[SparseContactMatrix, BalancedContactMatrix, t.NDArray],
     boundaries:t.NDArray,
     stat_f:t.Statistic
-) -> t.NDArray:
-
-    #? Check input-type
-    n = assert_square(contact_mat, return_n=True)
+) -> t.NDArray[np.float64]:
 
-    ndomains = len(boundaries) + 1
-    domain_mat_shape = (ndomains, ndomains)
-    domain_mat = np.zeros(domain_mat_shape, dtype=np.floating)
-
-    #? Iterate over all domain-indices in the upper-triangle (because contact-matrix is symmetric)
-    for row_index, col_index in np.ndindex(domain_mat_shape):
-        if col_index < row_index:
-            continue
-        
-        #? Calculate row-/col-indices of domain-matrix
-        row_start = boundaries[row_index - 1] if not row_index == 0 else 0
-        row_end = boundaries[row_index] if not row_index == len(boundaries) else n
-        col_start = boundaries[col_index - 1] if not col_index == 0 else 0
-        col_end = boundaries[col_index] if not col_index == len(boundaries) else n
-
-        #? Calculate statistic and write 
-        domain_mat[row_index, col_index] = stat_f(contact_mat[row_start:row_end, col_start:col_end])
-
-    #? Enforce symmetrical property
-    if not np.diag(domain_mat, -1).any():
-        domain_mat = np.triu(domain_mat) + np.triu(domain_mat, 1).T
-        
-    return domain_mat
\ No newline at end of file
+    #? Statistic of every domain-matrix, use domain_moments to share the moments between statistics
+    return stat_f(domain_moments(contact_mat, boundaries))
@@ -0,0 +1,201 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import json
+import itertools
+import functools
+import logging as log
+import cooler
+from . import typing as t
+from . import statistics as stats
+from . import utils
+from . import profiling
+from .encode import (
+    MaskedContacts,
+    fetch_chromosome,
+    mask_contacts,
+    balance_chromosome,
+    encode_domain_mask,
+    build_domain_model,
+    encode_model,
+    encode_contacts,
+    insulation_window,
+    load_insulation_table,
+    list_resolutions
+)
+
+#? Parameters of the grid, named as the ENCODE arguments
+GRID_PARAMS = [
+    'weights_precision',
+    'domain_mask_statistic',
+    'domain_mask_threshold',
+    'domain_values_precision',
+    'distance_table_precision',
+]
+
+def _payload_size(streams) -> int:
+    return sum(len(stream.payload) for stream in streams.values())
+
+def sweep_chromosome_job(
+    cooler_uri:str,
+    chr_name:str,
+    boundary_mask:t.NDArray,
+    balancing_name:str,
+    grid:t.Dict[str, t.List[t.Any]],
+    contact_data_codec:str,
+    tile_size:t.Optional[int]
+) -> t.List[t.Dict[str, t.Any]]:
+
+    #? Output-size of every setting of the grid. Each stage is computed once and shared by all settings depending on it:
+    #? fetching and masking, balancing and the domain-moments per weights-precision, the domain-statistics per statistic,
+    #? the domain-mask and domain-model per threshold.
+    log.info(f'Sweeping chromosome {chr_name}')
+    results = []
+    with profiling.scope(chr_name=chr_name), profiling.span('sweep_chromosome'):
+        contact_mat, weights = fetch_chromosome(cooler_uri, chr_name, balancing_name)
+        masked = mask_contacts(contact_mat, weights, boundary_mask)
+        del contact_mat, weights
+
+        for weights_precision in grid['weights_precision']:
+            with profiling.scope(weights_precision=weights_precision):
+                results.extend(_sweep_balanced(masked, weights_precision, grid, contact_data_codec, tile_size))
+
+    return results
+
+def _sweep_balanced(
+    masked:MaskedContacts,
+    weights_precision:int,
+    grid:t.Dict[str, t.List[t.Any]],
+    contact_data_codec:str,
+    tile_size:t.Optional[int]
+) -> t.List[t.Dict[str, t.Any]]:
+
+    #? Settings of the grid with the given weights-precision (the balanced contact-matrix depends on it)
+    results = []
+    chrom = balance_chromosome(masked, weights_precision)
+    chrom_size = _payload_size(chrom.streams)
+
+    for stat_name in grid['domain_mask_statistic']:
+        with profiling.span('map_domains', statistic=stat_name):
+            domain_stats = stats.STATISTIC_FUNCS[stat_name](chrom.moments)
+
+        for domain_mask_threshold in grid['domain_mask_threshold']:
+            domain_mask = domain_stats > domain_mask_threshold
+            domain_mask_size = _payload_size(encode_domain_mask(domain_mask))
+            domain_index, domain_values, dist_table = build_domain_model(chrom, domain_mask)
+
+            for domain_values_precision, distance_table_precision in itertools.product(
+                grid['domain_values_precision'],
+                grid['distance_table_precision']
+            ):
+                model_streams, model = encode_model(
+                    chrom,
+                    domain_index,
+                    domain_values,
+                    dist_table,
+                    domain_values_precision,
+                    distance_table_precision
+                )
+                contact_streams = encode_contacts(chrom.contact_mat, model, contact_data_codec, tile_size)
+                del model
+
+                results.append(dict(
+                    weights_precision=weights_precision,
+                    domain_mask_statistic=stat_name,
+                    domain_mask_threshold=domain_mask_threshold,
+                    domain_values_precision=domain_values_precision,
+                    distance_table_precision=distance_table_precision,
+                    size=chrom_size + domain_mask_size + _payload_size(model_streams) + _payload_size(contact_streams),
+                ))
+
+    return results
+
+def _setting(result:t.Dict[str, t.Any]) -> t.Tuple:
+    return tuple(result[name] for name in GRID_PARAMS)
+
+def _best(results:t.List[t.Dict[str, t.Any]]) -> t.Dict[str, t.Any]:
+    #? Smallest output, ties are resolved by the order of the grid (results are in grid-order)
+    return min(results, key=lambda result: result['size'])
+
+def sweep(args):
+    resolutions = args.resolution
+    input_file = args.input_file
+    balancing_name = args.balancing
+    output_fpath = args.output
+
+    if os.path.exists(output_fpath) and not args.overwrite:
+        raise FileExistsError(f'Output already exists: {output_fpath}, use --overwrite')
+
+    #? Duplicates are removed, the order of the grid is kept
+    grid = {name: list(dict.fromkeys(getattr(args, name))) for name in GRID_PARAMS}
+    for stat_name in grid['domain_mask_statistic']:
+        if stat_name not in stats.STATISTIC_FUNCS:
+            raise ValueError(f'Invalid statistic: {stat_name}. Available: {list(stats.STATISTIC_FUNCS)}')
+
+    nsettings = 1
+    for values in grid.values():
+        nsettings *= len(values)
+
+    log.info(f'Sweeping {nsettings} settings of {input_file}')
+
+    #? All resolutions of the input file
+    if resolutions is None:
+        resolutions = list_resolutions(input_file)
+        if not resolutions:
+            raise ValueError(f'No resolutions found: {input_file}')
+
+    #? One job per resolution and chromosome
+    jobs = {}
+    job_res = {}
+    for res in resolutions:
+        cooler_uri = os.path.normpath(input_file) + f'::/resolutions/{res}'
+        store = cooler.Cooler(cooler_uri)
+
+        ins_win = insulation_window(args, res)
+        with profiling.scope(res=res):
+            insulation_table = load_insulation_table(args.insulation_file, res, ins_win)
+
+        for chr_name in store.chromnames:
+            jobs[f'{res}/{chr_name}'] = dict(
+                cooler_uri=cooler_uri,
+                chr_name=chr_name,
+                boundary_mask=insulation_table.select(chr_name, ins_win),
+                balancing_name=balancing_name,
+                grid=grid,
+                contact_data_codec=args.contact_data_codec,
+                tile_size=args.tile_size,
+            )
+            job_res[f'{res}/{chr_name}'] = res
+
+    log.info(f'Sweeping {len(jobs)} job(s) at {len(resolutions)} resolution(s) using {args.jobs} job(s)')
+    recorded = profiling.enabled()
+    job_f = functools.partial(profiling.run_recorded, sweep_chromosome_job) if recorded else sweep_chromosome_job
+
+    chromosomes = {}
+    for chr_key, results in utils.iter_jobs(job_f, jobs, args.jobs):
+        if recorded:
+            results, spans = results
+            profiling.replay(spans, res=job_res[chr_key])
+
+        chromosomes[chr_key] = dict(results=results)
+
+    #? Smallest setting per chromosome and for the whole dataset (sum over all resolutions and chromosomes)
+    totals = {}
+    for chr_key, entry in chromosomes.items():
+        entry['best'] = _best(entry['results'])
+        log.info(f'Best setting of {chr_key}: ' + ', '.join(f'{name}={entry["best"][name]}' for name in GRID_PARAMS + ['size']))
+
+        for result in entry['results']:
+            totals[_setting(result)] = totals.get(_setting(result), 0) + result['size']
+
+    dataset = [dict(zip(GRID_PARAMS, setting), size=size) for setting, size in totals.items()]
+    best = _best(dataset)
+    log.info(f'Best setting of the dataset: ' + ', '.join(f'{name}={best[name]}' for name in GRID_PARAMS + ['size']))
+
+    with open(output_fpath, 'w') as f:
+        json.dump(dict(grid=grid, best=best, dataset=dataset, chromosomes=chromosomes), f, indent=2)
+
+    log.info(f'Sweep report written to {output_fpath}')
@@ -3,28 +3,50 @@
 # @file Description
 # @copyright Institute fuer Informationsverarbeitung
 
+import functools
 import numpy as np
 from . import typing as t
+from . import constants as consts
 from . import statistics as stats
+from .packed import PackedMatrix, BalancedPackedMatrix, upper_positions
+
+class DistanceMatrix:
+    #? Implicit distance-matrix: the distance |i - j| between the (original) bin-indices of rows and columns.
+    #? Blocks are computed on access, so the full matrix is never materialized.
+
+    def __init__(
+        self,
+        row_ids:t.NDArray[np.integer],
+        col_ids:t.Optional[t.NDArray[np.integer]] = None
+    ):
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.col_ids = self.row_ids if col_ids is None else np.asarray(col_ids, dtype=np.int64)
+        self.dtype = np.min_scalar_type(self.max())
+
+    @property
+    def shape(self) -> t.Tuple[int, int]:
+        return len(self.row_ids), len(self.col_ids)
+
+    def max(self) -> int:
+        if not len(self.row_ids) or not len(self.col_ids):
+            return 0
+
+        return int(max(
+            self.row_ids.max() - self.col_ids.min(), 
+            self.col_ids.max() - self.row_ids.min()
+        ))
+
+    def __getitem__(self, key) -> t.NDArray[np.integer]:
+        row_key, col_key = key
+        rows = self.row_ids[row_key]
+        cols = self.col_ids[col_key]
+        return np.abs(rows[..., None] - cols).astype(self.dtype)
 
 def gen_dist_mat(
     n:int
 ) -> t.NDArray[np.integer]:
 
-    dist_mat_shape = (n, n)
-    dist_mat_dtype = np.min_scalar_type(n - 1)
-    dist_mat:t.NDArray[np.integer] = np.zeros(
-        dist_mat_shape,
-        dtype=dist_mat_dtype
-    )
-
-    for index in range(n):
-        dist_mat[index, :] = index
-
-    dist_mat = stats.cumshift_cols(dist_mat, 1)
-    dist_mat = np.tril(dist_mat) + np.transpose(np.tril(dist_mat, -1))
-
-    return dist_mat
+    return DistanceMatrix(np.arange(n))[:, :]
 
 def make_mat_symmetrical(mat, check=False):
     if not check or not np.diag(mat, -1).any():
@@ -52,81 +74,181 @@ def decode_binary_run_length(
     rl_vect:t.NDArray[np.integer]
 ) -> t.NDArray[np.bool_]:
     
-    nentries = rl_vect.sum()
-    mask = np.empty(nentries, dtype=np.bool_)
-
-    start_idx = 0
-    curr_val = first_val
-    for rl in rl_vect:
-        end_idx = start_idx+rl
-        mask[start_idx:end_idx] = curr_val
-        start_idx += rl
-        curr_val = not curr_val
-
-    mask[start_idx:] = curr_val
-    return mask
-
-def balance_matrix(
-    mat:t.NDArray, 
-    weights:t.NDArray, 
+    #? Runs alternate between first_val and its negation
+    values = np.arange(len(rl_vect)) % 2 == (0 if first_val else 1)
+    return np.repeat(values, rl_vect)
+
+def balance_block(
+    block:t.NDArray, 
+    row_weights:t.NDArray, 
+    col_weights:t.NDArray, 
     mult_op:bool=False
 ) -> t.NDArray:
     
-    balanced_mat = mat.astype(weights.dtype)
-    weights = weights.reshape(-1, 1)
+    #? Same operations as balance_matrix for a block of the matrix, without symmetrization
+    balanced_mat = block.astype(row_weights.dtype)
     
     if mult_op:
-        balanced_mat *= weights
-        balanced_mat *= weights.T
+        balanced_mat *= row_weights.reshape(-1, 1)
+        balanced_mat *= col_weights.reshape(1, -1)
 
     else:
-        balanced_mat /= weights
-        balanced_mat /= weights.T
+        balanced_mat /= row_weights.reshape(-1, 1)
+        balanced_mat /= col_weights.reshape(1, -1)
+
+    return balanced_mat
 
+def balance_matrix(
+    mat:t.Union[t.NDArray, PackedMatrix], 
+    weights:t.NDArray, 
+    mult_op:bool=False
+) -> t.Union[t.NDArray, BalancedPackedMatrix]:
+    
+    #? Packed matrices are balanced on access
+    if isinstance(mat, PackedMatrix):
+        return mat.balance(weights, mult_op)
+
+    balanced_mat = balance_block(mat, weights, weights, mult_op)
     return make_mat_symmetrical(balanced_mat, check=True)
 
 def revert_balanced_matrix(
-    matrix:t.NDArray,
+    matrix:t.Union[t.NDArray, PackedMatrix],
     weights:t.NDArray,
     mult_op:bool = False
-) -> t.NDArray:
+) -> t.Union[t.NDArray, BalancedPackedMatrix]:
     
     return balance_matrix(matrix, weights, not mult_op)
 
+@functools.lru_cache(maxsize=consts.INDEX_CACHE_SIZE)
+def _diagonal_mode0_index(n: int) -> t.NDArray[np.intp]:
+    #? Flat gather-index of the transformed matrix: diagonals 0, 1, ..., n-1, then -1, -2, ..., -(n-1),
+    #? concatenated and cut to the first n//2 + 1 rows
+    row_ids, col_ids = np.indices((n, n), dtype=np.intp)
+    upper = row_ids <= col_ids
+
+    positions = np.empty((n, n), dtype=np.intp)
+    positions[upper] = upper_positions(n, row_ids[upper], col_ids[upper])
+
+    #? Lower-triangle cells follow all n(n+1)/2 upper-triangle cells
+    dists = row_ids[~upper] - col_ids[~upper]
+    positions[~upper] = n * (n + 1) // 2 + (dists - 1) * n - (dists - 1) * dists // 2 + col_ids[~upper]
+
+    index = np.empty(n * n, dtype=np.intp)
+    index[positions.reshape(-1)] = np.arange(n * n, dtype=np.intp)
+    index = index[:(n//2 + 1) * n].reshape((n//2 + 1, n))
+    index.flags.writeable = False
+    return index
+
+@functools.lru_cache(maxsize=consts.INDEX_CACHE_SIZE)
+def _inverse_diagonal_mode0_index(n: int) -> t.NDArray[np.intp]:
+    #? Flat gather-index of the symmetric matrix, both triangles read the upper-triangle diagonals
+    row_ids, col_ids = np.indices((n, n), dtype=np.intp)
+    index = upper_positions(n, np.minimum(row_ids, col_ids), np.maximum(row_ids, col_ids))
+    index.flags.writeable = False
+    return index
+
+@functools.lru_cache(maxsize=consts.INDEX_CACHE_SIZE)
+def _inverse_argsort_index(n: int, nrows: int) -> t.NDArray[np.intp]:
+    #? Flat gather-index of the symmetric matrix from the first nrows rows of cumshift_cols(mat, -1).
+    #? Distance d < nrows is read from row d (lower-triangle entry), otherwise from row n - d (upper-triangle entry)
+    row_ids, col_ids = np.indices((n, n), dtype=np.intp)
+    lo = np.minimum(row_ids, col_ids)
+    hi = np.maximum(row_ids, col_ids)
+    dists = hi - lo
+    index = np.where(dists < nrows, dists * n + lo, (n - dists) * n + hi)
+    index.flags.writeable = False
+    return index
+
 def transform_diagonal_mode0(
     mat:t.NDArray
 ):
     n = stats.assert_square(mat, return_n=True)
-    offsets = np.concatenate([np.arange(n), -np.arange(1, n)])
-    
-    concatenated = np.concatenate([np.diagonal(mat, offset) for offset in offsets])
-    transformed_mat = concatenated.reshape(mat.shape)
-    
-    target_nrows = n//2 + 1
-    return transformed_mat[: target_nrows]
+    return mat.reshape(-1)[_diagonal_mode0_index(n)]
 
 def inverse_tranform_diagonal_mode0(
     mat:t.NDArray
 ) -> t.NDArray:
     
+    #? Only the first n(n+1)/2 entries (the upper-triangle diagonals) are used
     ncols = mat.shape[1]
-    mat = mat.flatten()
-    
-    trans_idx = 0
-    out_mat = np.zeros((ncols, ncols), dtype=mat.dtype)
-    for idx in range(ncols):
-        _entries = ncols - idx
-        out_mat[ncols-idx-1,idx:] = mat[trans_idx:trans_idx+_entries]
-        trans_idx += _entries
+    return mat.reshape(-1)[_inverse_diagonal_mode0_index(ncols)]
+
+def _sort_keys(
+    values:t.NDArray[np.float32]
+) -> t.NDArray[np.uint32]:
+
+    #? Map float32 onto uint32 preserving the order, -0.0 equals 0.0 and NaNs are last (as in np.sort)
+    values = values + np.float32(0)
+    values[np.isnan(values)] = np.nan
+    bits = values.view(np.uint32)
+
+    #? Negative values are inverted, the sign-bit is set for the others (in-place)
+    negative = bits >= np.uint32(1 << 31)
+    np.invert(bits, out=bits, where=negative)
+    np.bitwise_or(bits, np.uint32(1 << 31), out=bits, where=~negative)
+    return bits
+
+def _iter_ranges(
+    n:int,
+    dtype
+) -> t.Iterator[t.Tuple[slice, t.NDArray[np.integer]]]:
+
+    #? np.arange(n) in chunks, to bound the temporary arrays
+    for start in range(0, n, consts.SORT_CHUNKSIZE):
+        end = min(start + consts.SORT_CHUNKSIZE, n)
+        yield slice(start, end), np.arange(start, end, dtype=dtype)
+
+def argsort_model(
+    values:t.NDArray,
+    stable:bool=True
+) -> t.NDArray[np.intp]:
+
+    #? Order of the model-values. Ties are kept in position-order, so the order does not depend on the 
+    #? sorting algorithm. Legacy payloads (stable=False) were ordered by the default np.argsort
+    if not stable:
+        return np.argsort(values)
+
+    if values.dtype != np.float32 or len(values) > np.iinfo(np.uint32).max:
+        return np.argsort(values, kind='stable')
+
+    #? Sort (key, position)-pairs packed into uint64, all pairs are unique and sorting is faster than a stable argsort
+    packed = _sort_keys(values).astype(np.uint64)
+    packed <<= np.uint64(32)
+    for chunk, positions in _iter_ranges(len(packed), np.uint64):
+        packed[chunk] |= positions
+    packed.sort()
+
+    #? Positions are below 2^32, so the pairs are reused as index-array
+    packed &= np.uint64(0xFFFFFFFF)
+    return packed.view(np.intp)
+
+def _scatter_by_position(
+    positions:t.NDArray[np.intp],
+    values:t.NDArray,
+    mask:t.NDArray[np.bool_]
+) -> t.NDArray:
 
-    out_mat = stats.cumshift_cols(out_mat, 1)
-    out_mat = np.roll(out_mat, 1, axis=0)
+    #? Order values by their (unique) positions, mask marks all positions
+    ranks = np.cumsum(mask.reshape(-1), dtype=np.intp) - 1
+    out = np.empty_like(values)
+    out[ranks[positions]] = values
+    return out
+
+def _cumshift_model(
+    model:t.Union[t.NDArray, PackedMatrix, BalancedPackedMatrix],
+    nrows:int
+) -> t.NDArray:
 
-    return make_mat_symmetrical(out_mat, check=True)
+    #? First nrows rows of cumshift_cols(model, -1), packed models are shifted diagonal by diagonal
+    if isinstance(model, np.ndarray):
+        return stats.cumshift_cols(model, -1, nrows)
+
+    return model.cumshift(nrows)
 
 def transform_argsort(
     mat: t.NDArray, 
-    model: t.NDArray
+    model: t.NDArray,
+    stable:bool=True
 ) -> t.NDArray:    
 
     #? Type-check input
@@ -135,45 +257,160 @@ def transform_argsort(
     transformed_rows = int(np.ceil((n + 1) / 2))
 
     #? Transform matrix
-    mat = stats.cumshift_cols(mat, -1)
-    mat = mat[: transformed_rows, :].copy()
-    mat = mat.flatten()
+    mat = stats.cumshift_cols(mat, -1, transformed_rows)
+    mat = mat.reshape(-1)
 
     #? Transform model
-    model = stats.cumshift_cols(model, -1)
-    model = model[: transformed_rows, :].copy()
-    model = model.flatten()
+    model = _cumshift_model(model, transformed_rows)
+    model = model.reshape(-1)
 
     #? Sort matrix using model
     assert len(mat) == len(model)
-    mat = mat[np.argsort(model)]
+    mat = mat[argsort_model(model, stable)]
     return mat.reshape((transformed_rows, n))
 
 
 def inverse_transform_argsort(
     transformed: t.NDArray, 
-    model: t.NDArray
+    model: t.NDArray,
+    stable:bool=True
 ):
 
     nrows, ncols = transformed.shape
-    matrix_rows = ncols
-    matrix_cols = ncols
 
     #? Transform model
-    model = stats.cumshift_cols(model, -1)
-    model = model[:nrows, :]
+    model = _cumshift_model(model, nrows)
     
-    transformed = transformed.flatten()
-    transformed = transformed[np.argsort(np.argsort(model.flatten()))]
-    transformed = transformed.reshape((nrows, ncols))
+    #? Invert the sorting permutation by scattering
+    shifted = np.empty(nrows * ncols, dtype=transformed.dtype)
+    shifted[argsort_model(model.reshape(-1), stable)] = transformed.reshape(-1)
+
+    #? Revert cumshift_cols and mirror into both triangles at once
+    return shifted[_inverse_argsort_index(ncols, nrows)]
+
+
+def transform_argsort_coo(
+    row_ids: t.NDArray[np.integer],
+    col_ids: t.NDArray[np.integer],
+    data: t.NDArray,
+    model: t.Union[t.NDArray, PackedMatrix, BalancedPackedMatrix],
+    stable:bool=True
+) -> t.Tuple[t.NDArray[np.bool_], t.NDArray]:
 
-    out_mat = np.zeros((matrix_rows, matrix_cols), dtype=transformed.dtype)
-    out_mat[:nrows, :] = transformed
-    out_mat = stats.cumshift_cols(out_mat, 1)
-    out_mat = np.tril(out_mat) + np.transpose(np.triu(out_mat, nrows))
-    out_mat += np.triu(np.transpose(out_mat), 1)
-    return out_mat
+    #? Equivalent to transform_split(transform_argsort(mat, model)) for the upper-triangle 
+    #? coordinates (row_ids <= col_ids) of a symmetric matrix, without materializing the matrix
+
+    #? Type-check input
+    n = stats.assert_square(model, return_n=True)
+
+    transformed_rows = int(np.ceil((n + 1) / 2))
+
+    #? Transform model and invert the sorting permutation
+    model = _cumshift_model(model, transformed_rows).reshape(-1)
+    ncells = len(model)
+    order = argsort_model(model, stable)
+    del model
+
+    inverse_order = np.empty(ncells, dtype=np.intp)
+    for chunk, cell_ids in _iter_ranges(ncells, np.intp):
+        inverse_order[order[chunk]] = cell_ids
+    del order
+
+    #? Position of each entry after cumshift_cols(mat, -1): (distance, col) for the lower-triangle entry
+    #? and (n - distance, col) for the upper-triangle entry, if they are within the transformed rows
+    row_ids = np.asarray(row_ids, dtype=np.intp)
+    col_ids = np.asarray(col_ids, dtype=np.intp)
+    distances = col_ids - row_ids
+    lower = distances < transformed_rows
+    upper = (distances > 0) & (n - distances < transformed_rows)
+
+    positions = inverse_order[np.concatenate([
+        distances[lower] * n + row_ids[lower],
+        (n - distances[upper]) * n + col_ids[upper],
+    ])]
+    values = np.concatenate([data[lower], data[upper]])
+
+    #? Split into contact-mask and contact-data ordered by position
+    mask = np.zeros(ncells, dtype=bool)
+    mask[positions] = True
+    return mask.reshape((transformed_rows, n)), _scatter_by_position(positions, values, mask)
+
+def inverse_transform_argsort_coo(
+    mask: t.NDArray[np.bool_],
+    data: t.NDArray,
+    model: t.Union[t.NDArray, PackedMatrix, BalancedPackedMatrix],
+    stable:bool=True
+) -> t.Tuple[t.NDArray[np.integer], t.NDArray[np.integer], t.NDArray]:
+
+    #? Inverse of transform_argsort_coo, returns the upper-triangle coordinates and values ordered by position
+
+    #? Type-check input
+    n = stats.assert_square(model, return_n=True)
+    transformed_rows = mask.shape[0]
+
+    #? Position of each entry after cumshift_cols(mat, -1)
+    model = _cumshift_model(model, transformed_rows).reshape(-1)
+    cell_ids = argsort_model(model, stable)[np.flatnonzero(mask)]
+    distances, col_ids = np.divmod(cell_ids, n)
+
+    #? Row distances + col is the lower-triangle entry (col, distances + col), otherwise the upper-triangle
+    #? entry (distances + col - n, col), which is a duplicate if its distance is within the transformed rows
+    lower = distances + col_ids < n
+    keep = lower | (n - distances >= transformed_rows)
+    row_ids = np.where(lower, col_ids, distances + col_ids - n)[keep]
+    col_ids = np.where(lower, distances + col_ids, col_ids)[keep]
+    return row_ids, col_ids, data[keep]
+
+def _tile_cells(
+    row_start:int,
+    row_end:int,
+    col_start:int,
+    col_end:int
+) -> t.NDArray[np.bool_]:
 
+    #? Cells of a tile within the upper-triangle (only differs from the full tile for tiles on the main diagonal)
+    return np.arange(col_start, col_end)[None, :] >= np.arange(row_start, row_end)[:, None]
+
+def transform_argsort_tile(
+    row_ids: t.NDArray[np.integer],
+    col_ids: t.NDArray[np.integer],
+    data: t.NDArray,
+    model_tile: t.NDArray,
+    row_start:int,
+    col_start:int
+) -> t.Tuple[t.NDArray[np.bool_], t.NDArray]:
+
+    #? Sort the upper-triangle cells of one tile by the model, entries must be within the tile
+    nrows, ncols = model_tile.shape
+    cells = _tile_cells(row_start, row_start + nrows, col_start, col_start + ncols)
+    cell_ids = np.cumsum(cells.reshape(-1)) - 1
+
+    inverse_order = np.empty(np.count_nonzero(cells), dtype=np.intp)
+    inverse_order[argsort_model(model_tile[cells])] = np.arange(len(inverse_order))
+
+    positions = inverse_order[cell_ids[(row_ids - row_start) * ncols + (col_ids - col_start)]]
+
+    #? Split into contact-mask and contact-data ordered by position
+    mask = np.zeros(len(inverse_order), dtype=bool)
+    mask[positions] = True
+    return mask, _scatter_by_position(positions, data, mask)
+
+def inverse_transform_argsort_tile(
+    mask: t.NDArray[np.bool_],
+    data: t.NDArray,
+    model_tile: t.NDArray,
+    row_start:int,
+    col_start:int
+) -> t.Tuple[t.NDArray[np.integer], t.NDArray[np.integer], t.NDArray]:
+
+    #? Returns the upper-triangle coordinates and values of the entries of one tile
+    nrows, ncols = model_tile.shape
+    cells = _tile_cells(row_start, row_start + nrows, col_start, col_start + ncols)
+    row_ids, col_ids = np.nonzero(cells)
+
+    order = argsort_model(model_tile[cells])
+    cell_ids = order[mask[:len(order)]]
+    return row_ids[cell_ids] + row_start, col_ids[cell_ids] + col_start, data
 
 def transform_split(
     mat:t.NDArray
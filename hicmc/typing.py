@@ -1,8 +1,9 @@
 from enum import Enum
-from typing import Literal, Tuple, Union, Dict, Any, List, Callable
+from typing import Literal, Tuple, Union, Dict, Any, List, Callable, Iterator, Iterable, Optional, NamedTuple
 from numpy.typing import NDArray
 
-Statistic = Callable[[NDArray], float]
+#? Reducer of statistics.Moments to the statistic of every block
+Statistic = Callable[[Any], NDArray]
 Transform = Callable[[NDArray], NDArray]
 
 class Axis(Enum):
@@ -1,14 +1,83 @@
 import os
+import argparse
 import logging as log
+from concurrent.futures import ProcessPoolExecutor
+from . import typing as t
 from . import constants as consts
 
 def check_executable(file_path: str):
     if not os.path.isfile(file_path):
-        raise RuntimeError(f'File does not exist: {file_path}')
+        raise RuntimeError(f'File does not exist: {file_path}, set {consts.THIRD_PARTY_PATH_ENV} to the directory of the third-party tools')
 
     if not os.access(file_path, os.X_OK):
         raise RuntimeError(f'File is not executable: {file_path}')
 
+def parse_resolutions(value:str) -> t.Optional[t.List[int]]:
+    #? Comma-separated list of resolutions, None for all resolutions
+    if value == 'all':
+        return None
+
+    try:
+        return [int(res) for res in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid resolution: {value}')
+
+def parse_list(type_:t.Callable[[str], t.Any]) -> t.Callable[[str], t.List[t.Any]]:
+    #? Argument type of a comma-separated list of values of the given type, e.g. a parameter-grid
+    def _parse(value:str) -> t.List[t.Any]:
+        try:
+            return [type_(item) for item in value.split(',')]
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'Invalid list: {value}')
+
+    return _parse
+
+def iter_jobs(
+    func:t.Callable[..., t.Any],
+    jobs:t.Dict[str, t.Dict[str, t.Any]],
+    njobs:int=1
+) -> t.Iterator[t.Tuple[str, t.Any]]:
+    #? Run func(**kwargs) for each named job, using a process pool if njobs > 1, and yield the results in submission order.
+    #? All jobs are run even if one fails; failures are logged per job and raised together at the end.
+    if njobs < 1:
+        raise ValueError(f'Invalid number of jobs: {njobs}')
+
+    failed = {}
+    if njobs == 1 or len(jobs) <= 1:
+        for name, kwargs in jobs.items():
+            try:
+                result = func(**kwargs)
+            except Exception as err:
+                log.error(f'Job {name} failed: {err!r}', exc_info=err)
+                failed[name] = err
+                continue
+
+            yield name, result
+
+    else:
+        with ProcessPoolExecutor(max_workers=min(njobs, len(jobs))) as executor:
+            futures = {name: executor.submit(func, **kwargs) for name, kwargs in jobs.items()}
+            for name, future in futures.items():
+                try:
+                    result = future.result()
+                except Exception as err:
+                    log.error(f'Job {name} failed: {err!r}', exc_info=err)
+                    failed[name] = err
+                    continue
+
+                yield name, result
+
+    if failed:
+        raise RuntimeError(f'{len(failed)} of {len(jobs)} job(s) failed: {", ".join(failed)}')
+
+def run_jobs(
+    func:t.Callable[..., t.Any],
+    jobs:t.Dict[str, t.Dict[str, t.Any]],
+    njobs:int=1
+) -> t.Dict[str, t.Any]:
+    #? Results of all jobs, see iter_jobs
+    return dict(iter_jobs(func, jobs, njobs))
+
 def set_log_level(log_level):
     #? Log level
     try:
@@ -23,4 +92,4 @@ def print_banner():
     #? Print banner
     log.info(f"********************************************************************************")
     log.info(f"    {consts.PROGRAM_LONGNAME} ({consts.PROGRAM_NAME})")
-    log.info(f"********************************************************************************")
\ No newline at end of file
+    log.info(f"********************************************************************************")
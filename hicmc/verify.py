@@ -0,0 +1,52 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import logging as log
+from . import typing as t
+from . import utils
+from . import container
+
+def verify_chromosome_job(
+    input_path:str,
+    res:int,
+    chr_name:str
+) -> t.Dict[str, t.Optional[bool]]:
+
+    payload = container.open_payload(input_path, res)
+    status = payload.check_chromosome(chr_name)
+    for name, valid in status.items():
+        if valid is False:
+            log.error(f'Chromosome {chr_name} at resolution {res}: stream {name} is corrupted')
+
+    return status
+
+def verify(args):
+
+    input_path = args.input
+
+    #? Only the checksums are checked, no stream is decoded
+    jobs = {}
+    for res in container.list_resolutions(input_path):
+        payload = container.open_payload(input_path, res)
+        for chr_name in payload.chr_names:
+            jobs[f'{res}/{chr_name}'] = dict(
+                input_path=input_path,
+                res=res,
+                chr_name=chr_name,
+            )
+
+    log.info(f'Verifying {len(jobs)} chromosomes using {args.jobs} job(s)')
+    results = utils.run_jobs(verify_chromosome_job, jobs, args.jobs)
+
+    statuses = [valid for status in results.values() for valid in status.values()]
+    ncorrupted = statuses.count(False)
+    nunchecked = statuses.count(None)
+    if nunchecked:
+        log.warning(f'{nunchecked} of {len(statuses)} stream(s) have no checksum and were not verified')
+
+    if ncorrupted:
+        raise RuntimeError(f'{ncorrupted} of {len(statuses)} stream(s) are corrupted: {input_path}')
+
+    log.info(f'Verified {len(statuses) - nunchecked} stream(s) of {input_path}')
@@ -1,27 +1,29 @@
 import os
+import ctypes
+import functools
 import subprocess
 import tempfile
+import logging as log
 from enum import IntFlag
 
 import numpy
-from PIL import Image
 
 # from library import constants, utils
 from .. import utils
 from .. import constants as consts
 
 
-Image.MAX_IMAGE_PIXELS = numpy.inf
+#? Paths are resolved on first use, the third-party directory can be configured (see constants.get_third_party_path)
+def _jbigkit_path(*names) -> str:
+    return os.path.join(consts.get_third_party_path(), 'jbigkit-2.1', *names)
 
 
-_pbmtools_path = os.path.join(consts.THIRD_PARTY_PATH, 'jbigkit-2.1', 'pbmtools')
-
-
-_pbmtojbg_path = os.path.join(_pbmtools_path, "pbmtojbg85")
-utils.check_executable(_pbmtojbg_path)
-
-_jbgtopbm_path = os.path.join(_pbmtools_path, "jbgtopbm85")
-utils.check_executable(_jbgtopbm_path)
+@functools.lru_cache(maxsize=None)
+def _load_pil_image():
+    #? Pillow is only required by the command-line tools
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = numpy.inf
+    return Image
 
 
 class JBIGOptions(IntFlag):
@@ -38,8 +40,247 @@ PGM_TO_JBIG_DIRECTORY_PREFIX = 'PGM2JBIG_'
 
 PIL_PBM_FORMAT = 'ppm'
 
+JBIG_STRIPE_HEIGHT = (1 << 32) - 1
+
+JBG_EOK = 0
+JBG_EOK_INTR = 1 << 4
+JBG_EAGAIN = 2 << 4
+
+
+#? ctypes mirror of the structs in libjbig/jbig_ar.h and libjbig/jbig85.h (jbigkit 2.1)
+class _ArencState(ctypes.Structure):
+    _fields_ = [
+        ('st', ctypes.c_ubyte * 4096),
+        ('c', ctypes.c_ulong),
+        ('a', ctypes.c_ulong),
+        ('sc', ctypes.c_long),
+        ('ct', ctypes.c_int),
+        ('buffer', ctypes.c_int),
+        ('byte_out', ctypes.c_void_p),
+        ('file', ctypes.c_void_p),
+    ]
+
+
+class _ArdecState(ctypes.Structure):
+    _fields_ = [
+        ('st', ctypes.c_ubyte * 4096),
+        ('c', ctypes.c_ulong),
+        ('a', ctypes.c_ulong),
+        ('pscd_ptr', ctypes.c_void_p),
+        ('pscd_end', ctypes.c_void_p),
+        ('ct', ctypes.c_int),
+        ('startup', ctypes.c_int),
+        ('nopadding', ctypes.c_int),
+    ]
+
+
+_DATA_OUT_FUNC = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_size_t, ctypes.c_void_p)
+_LINE_OUT_FUNC = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_size_t, ctypes.c_ulong, ctypes.c_void_p)
+
+
+class _EncState(ctypes.Structure):
+    _fields_ = [
+        ('x0', ctypes.c_ulong),
+        ('y0', ctypes.c_ulong),
+        ('l0', ctypes.c_ulong),
+        ('options', ctypes.c_int),
+        ('newlen', ctypes.c_int),
+        ('mx', ctypes.c_uint),
+        ('y', ctypes.c_ulong),
+        ('i', ctypes.c_ulong),
+        ('tx', ctypes.c_int),
+        ('c_all', ctypes.c_ulong),
+        ('c', ctypes.c_ulong * 128),
+        ('new_tx', ctypes.c_int),
+        ('ltp_old', ctypes.c_int),
+        ('s', _ArencState),
+        ('data_out', _DATA_OUT_FUNC),
+        ('file', ctypes.c_void_p),
+        ('comment', ctypes.c_void_p),
+        ('comment_len', ctypes.c_ulong),
+    ]
+
+
+class _DecState(ctypes.Structure):
+    _fields_ = [
+        ('x0', ctypes.c_ulong),
+        ('y0', ctypes.c_ulong),
+        ('l0', ctypes.c_ulong),
+        ('options', ctypes.c_int),
+        ('mx', ctypes.c_int),
+        ('p', ctypes.c_int * 3),
+        ('linebuf', ctypes.c_void_p),
+        ('linebuf_len', ctypes.c_size_t),
+        ('bpl', ctypes.c_size_t),
+        ('tx', ctypes.c_int),
+        ('s', _ArdecState),
+        ('bie_len', ctypes.c_ulong),
+        ('buffer', ctypes.c_ubyte * 20),
+        ('buf_len', ctypes.c_int),
+        ('comment_skip', ctypes.c_ulong),
+        ('x', ctypes.c_ulong),
+        ('stripe', ctypes.c_ulong),
+        ('y', ctypes.c_ulong),
+        ('i', ctypes.c_ulong),
+        ('at_moves', ctypes.c_int),
+        ('at_line', ctypes.c_ulong * 1),
+        ('at_tx', ctypes.c_int * 1),
+        ('line_h1', ctypes.c_ulong),
+        ('line_h2', ctypes.c_ulong),
+        ('line_h3', ctypes.c_ulong),
+        ('pseudo', ctypes.c_int),
+        ('lntp', ctypes.c_int),
+        ('line_out', _LINE_OUT_FUNC),
+        ('file', ctypes.c_void_p),
+        ('intr', ctypes.c_int),
+        ('end_of_bie', ctypes.c_int),
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_libjbig85():
+    #? Returns None if the shared library is not built, the command-line tools are used instead
+    _libjbig85_path = _jbigkit_path('libjbig', 'libjbig85.so')
+    try:
+        lib = ctypes.CDLL(_libjbig85_path)
+    except OSError:
+        log.warning(f'Shared library not found: {_libjbig85_path}, falling back to command-line tools')
+        return None
+
+    lib.jbg85_enc_init.argtypes = [ctypes.POINTER(_EncState), ctypes.c_ulong, ctypes.c_ulong, _DATA_OUT_FUNC, ctypes.c_void_p]
+    lib.jbg85_enc_init.restype = None
+    lib.jbg85_enc_options.argtypes = [ctypes.POINTER(_EncState), ctypes.c_int, ctypes.c_ulong, ctypes.c_int]
+    lib.jbg85_enc_options.restype = None
+    lib.jbg85_enc_lineout.argtypes = [ctypes.POINTER(_EncState), ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    lib.jbg85_enc_lineout.restype = None
+    lib.jbg85_dec_init.argtypes = [ctypes.POINTER(_DecState), ctypes.c_void_p, ctypes.c_size_t, _LINE_OUT_FUNC, ctypes.c_void_p]
+    lib.jbg85_dec_init.restype = None
+    lib.jbg85_dec_in.argtypes = [ctypes.POINTER(_DecState), ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t)]
+    lib.jbg85_dec_in.restype = ctypes.c_int
+    lib.jbg85_dec_end.argtypes = [ctypes.POINTER(_DecState)]
+    lib.jbg85_dec_end.restype = ctypes.c_int
+    lib.jbg85_strerror.argtypes = [ctypes.c_int]
+    lib.jbg85_strerror.restype = ctypes.c_char_p
+    return lib
+
+
+@functools.lru_cache(maxsize=None)
+def _load_libc():
+    #? Returns None if the C library or one of its functions (e.g. open_memstream) is not available,
+    #? the command-line tools are used for encoding instead
+    try:
+        libc = ctypes.CDLL(None)
+        libc.open_memstream.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t)]
+        libc.open_memstream.restype = ctypes.c_void_p
+        libc.fwrite.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_size_t, ctypes.c_void_p]
+        libc.fwrite.restype = ctypes.c_size_t
+        libc.fclose.argtypes = [ctypes.c_void_p]
+        libc.fclose.restype = ctypes.c_int
+        libc.free.argtypes = [ctypes.c_void_p]
+        libc.free.restype = None
+        libc.fputc
+    except (OSError, AttributeError) as err:
+        log.warning(f'C library not usable for in-process JBIG encoding ({err}), falling back to command-line tools')
+        return None
+
+    return libc
+
+
+def _encode_binary_matrix_lib(lib, libc, binary_matrix) -> bytes:
+    rows, cols = binary_matrix.shape
+
+    #? PBM convention: 1 is black, i.e. the inverse of the matrix as stored by pillow
+    lines = numpy.ascontiguousarray(numpy.packbits(~binary_matrix.astype(bool), axis=1))
+
+    #? All output goes to an in-memory stream
+    buffer_ptr = ctypes.c_void_p()
+    buffer_size = ctypes.c_size_t()
+    stream = libc.open_memstream(ctypes.byref(buffer_ptr), ctypes.byref(buffer_size))
+    if not stream:
+        raise MemoryError('Unable to open memory stream')
+
+    def data_out(start, length, _file):
+        libc.fwrite(start, 1, length, stream)
+
+    #? Keep a reference to the callback for the lifetime of the encoder
+    _data_out = _DATA_OUT_FUNC(data_out)
+    state = _EncState()
+    lib.jbg85_enc_init(ctypes.byref(state), cols, rows, _data_out, None)
+    options = JBIGOptions.TPBON | JBIGOptions.TPDON
+    lib.jbg85_enc_options(ctypes.byref(state), options.value, JBIG_STRIPE_HEIGHT, -1)
+
+    #? The arithmetic coder emits single bytes, write them with fputc instead of calling back into python
+    state.s.byte_out = ctypes.cast(libc.fputc, ctypes.c_void_p)
+    state.s.file = stream
+
+    try:
+        #? The encoder requires the two previous lines, which all stay in memory
+        line_ptrs = [lines.ctypes.data + y * lines.strides[0] for y in range(rows)]
+        for y in range(rows):
+            lib.jbg85_enc_lineout(
+                ctypes.byref(state),
+                line_ptrs[y],
+                line_ptrs[y-1] if y > 0 else None,
+                line_ptrs[y-2] if y > 1 else None
+            )
+    finally:
+        libc.fclose(stream)
+        payload_data = ctypes.string_at(buffer_ptr, buffer_size.value)
+        libc.free(buffer_ptr)
+
+    return payload_data
+
+
+def _decode_binary_matrix_lib(lib, payload_data: bytes) -> numpy.ndarray:
+    rows, cols = _get_shape(payload_data)
+    bpl = (cols >> 3) + bool(cols & 7)
+    lines = numpy.zeros((rows, bpl), dtype=numpy.uint8)
+
+    def line_out(_state, start, length, y, _file):
+        ctypes.memmove(lines.ctypes.data + y * bpl, start, length)
+        return 0
+
+    #? Keep references to the callback and buffers for the lifetime of the decoder
+    _line_out = _LINE_OUT_FUNC(line_out)
+    linebuf = ctypes.create_string_buffer(bpl * 3)
+    inbuf = ctypes.create_string_buffer(payload_data, len(payload_data))
+
+    state = _DecState()
+    lib.jbg85_dec_init(ctypes.byref(state), linebuf, len(linebuf), _line_out, None)
+
+    cnt = ctypes.c_size_t(0)
+    result = lib.jbg85_dec_in(ctypes.byref(state), inbuf, len(payload_data), ctypes.byref(cnt))
+    if result in (JBG_EAGAIN, JBG_EOK_INTR):
+        #? Signal end-of-BIE explicitely
+        result = lib.jbg85_dec_end(ctypes.byref(state))
+
+    if result != JBG_EOK:
+        raise RuntimeError(lib.jbg85_strerror(result).decode('utf-8'))
+
+    return ~numpy.unpackbits(lines, axis=1, count=cols).astype(bool)
+
 
 def encode_binary_matrix(binary_matrix) -> bytes:
+    lib = _load_libjbig85()
+    libc = _load_libc() if lib is not None else None
+    if libc is not None:
+        return _encode_binary_matrix_lib(lib, libc, binary_matrix)
+
+    return _encode_binary_matrix_cli(binary_matrix)
+
+
+def decode_binary_matrix(payload_data: bytes) -> numpy.ndarray:
+    lib = _load_libjbig85()
+    if lib is not None:
+        return _decode_binary_matrix_lib(lib, payload_data)
+
+    return _decode_binary_matrix_cli(payload_data)
+
+
+def _encode_binary_matrix_cli(binary_matrix) -> bytes:
+    _pbmtojbg_path = _jbigkit_path('pbmtools', 'pbmtojbg85')
+    utils.check_executable(_pbmtojbg_path)
+    Image = _load_pil_image()
     with tempfile.TemporaryDirectory(prefix=PBM_TO_JBIG_DIRECTORY_PREFIX) as directory_path:
         pbm_file_path = os.path.join(directory_path, 'temp.pbm')
         jbg_file_path = os.path.join(directory_path, 'temp.jbg')
@@ -50,9 +291,8 @@ def encode_binary_matrix(binary_matrix) -> bytes:
     
         # build arguments 
         options = JBIGOptions.TPBON | JBIGOptions.TPDON
-        stripe_height = (1 << 32) - 1
         arguments = [
-            "-s", str(stripe_height),
+            "-s", str(JBIG_STRIPE_HEIGHT),
             "-p", str(options.value),
         ]
 
@@ -74,7 +314,10 @@ def _get_shape(_payload):
     return rows, cols
 
 
-def decode_binary_matrix(payload_data: bytes) -> numpy.ndarray:
+def _decode_binary_matrix_cli(payload_data: bytes) -> numpy.ndarray:
+    _jbgtopbm_path = _jbigkit_path('pbmtools', 'jbgtopbm85')
+    utils.check_executable(_jbgtopbm_path)
+    Image = _load_pil_image()
     with tempfile.TemporaryDirectory(prefix=JBIG_TO_PBM_DIRECTORY_PREFIX) as directory_path:
         jbg_file_path = os.path.join(directory_path, 'temp.jbg')
         pbm_file_path = os.path.join(directory_path, 'temp.pbm')
@@ -15,8 +15,8 @@ _raw_file_name = 'raw.temp'
 _out_file_name = 'out.temp'
 
 
-_seven_zip_executable_path = os.path.join(consts.THIRD_PARTY_PATH, 'szip-x64', '7zz')
-utils.check_executable(_seven_zip_executable_path)
+def _seven_zip_executable_path() -> str:
+    return os.path.join(consts.get_third_party_path(), 'szip-x64', '7zz')
 
 
 class SevenZipCommand(Enum):
@@ -38,6 +38,8 @@ def encode_bytes(data: bytes, model_order: int = 8) -> bytes:
     if model_order > MAX_MODEL_ORDER:
         raise ValueError('Model-Order > 16 not valid!')
 
+    utils.check_executable(_seven_zip_executable_path())
+
     with tempfile.TemporaryDirectory(prefix='7ZIP_') as directory_path:
         out_file_path = os.path.join(directory_path, _out_file_name)
         raw_file_path = os.path.join(directory_path, _raw_file_name)
@@ -48,7 +50,7 @@ def encode_bytes(data: bytes, model_order: int = 8) -> bytes:
         _command = SevenZipCommand.Add
         _method = SenvenZipMethod.PPMD
         process = subprocess.run([
-            _seven_zip_executable_path,
+            _seven_zip_executable_path(),
             _command.value,
             f'-m0={_method.value}',
             f'-mo={model_order}',
@@ -73,6 +75,7 @@ def encode_bytes(data: bytes, model_order: int = 8) -> bytes:
         
 
 def decode_bytes(data: bytes) -> bytes:
+    utils.check_executable(_seven_zip_executable_path())
     with tempfile.TemporaryDirectory(prefix='7ZIP_') as directory_path:
         out_file_path = os.path.join(directory_path, _out_file_name)
         raw_file_path = os.path.join(directory_path, _raw_file_name)
@@ -83,7 +86,7 @@ def decode_bytes(data: bytes) -> bytes:
         _command = SevenZipCommand.Extract
         _method = SenvenZipMethod.PPMD
         process = subprocess.run([
-            _seven_zip_executable_path,
+            _seven_zip_executable_path(),
             _command.value,
             f'-m0={_method.value}',
             raw_file_path,
@@ -10,7 +10,10 @@ readonly jbig_directory="${third_party_directory}/jbigkit-2.1"
     rm -rf jbigkit-2.1
     tar xzvf jbigkit-2.1.tar.gz
     cd "${jbig_directory}"
-    cd libjbig && make && cd ..
+    cd libjbig && make
+    #? Shared library for the in-process binding (hicmc/wrapper/jbig.py)
+    gcc -shared -fPIC -O2 -o libjbig85.so jbig85.c jbig_ar.c
+    cd ..
     cd pbmtools && make
 )
 
@@ -0,0 +1,125 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import numpy as np
+import pandas as pd
+import cooler
+import pytest
+from hicmc import typing as t
+from hicmc.sparse import SparseContactMatrix
+from hicmc.__main__ import parser
+from benchmarks.synthetic import generate_chromosome, SyntheticChromosome
+
+RES = 10_000
+INSULATION_WINDOW = 4 * RES
+TILE_SIZE = 16
+
+#? Number of bins and seed of every chromosome, chrM has a single bin
+CHROMOSOMES = {
+    'chr1': (120, 1),
+    'chr2': (75, 2),
+    'chrM': (1, None),
+}
+
+class Dataset(t.NamedTuple):
+    mcool_fpath: str
+    insulation_fpath: str
+
+    @property
+    def cooler_uri(self) -> str:
+        return self.mcool_fpath + f'::/resolutions/{RES}'
+
+def synthetic_chromosome(
+    n:int,
+    seed:t.Optional[int]
+) -> SyntheticChromosome:
+
+    if seed is not None:
+        return generate_chromosome(n, seed=seed, depth=20, tad_size=10)
+
+    contact_mat = SparseContactMatrix.from_dense(np.full((n, n), 7, dtype=np.uint8))
+    return SyntheticChromosome(contact_mat, np.ones(n, dtype=np.float32), np.zeros(n, dtype=bool))
+
+def write_dataset(dpath:str) -> Dataset:
+
+    #? .mcool file with the KR-weights (divisive, as written by hic2cool) and the matching insulation-table
+    chromosomes = {chr_name: synthetic_chromosome(n, seed) for chr_name, (n, seed) in CHROMOSOMES.items()}
+    chrom_sizes = pd.Series({chr_name: chrom.contact_mat.n * RES for chr_name, chrom in chromosomes.items()})
+    bins = cooler.binnify(chrom_sizes, RES)
+
+    offsets = np.cumsum([0] + [chrom.contact_mat.n for chrom in chromosomes.values()])
+    pixels = pd.DataFrame({
+        'bin1_id': np.concatenate([chrom.contact_mat.row_ids + offset for chrom, offset in zip(chromosomes.values(), offsets)]),
+        'bin2_id': np.concatenate([chrom.contact_mat.col_ids + offset for chrom, offset in zip(chromosomes.values(), offsets)]),
+        'count': np.concatenate([chrom.contact_mat.data.astype(np.int32) for chrom in chromosomes.values()]),
+    })
+
+    mcool_fpath = os.path.join(dpath, 'synthetic.mcool')
+    cooler.create_cooler(mcool_fpath + f'::/resolutions/{RES}', bins, pixels, mode='w')
+    with cooler.Cooler(mcool_fpath + f'::/resolutions/{RES}').open('r+') as grp:
+        grp['bins'].create_dataset('KR', data=np.concatenate([chrom.weights for chrom in chromosomes.values()]).astype(np.float64))
+
+    insulation_table = bins.copy()
+    insulation_table[f'log2_insulation_score_{INSULATION_WINDOW}'] = 0.0
+    insulation_table[f'is_boundary_{INSULATION_WINDOW}'] = np.concatenate([chrom.boundary_mask for chrom in chromosomes.values()])
+    insulation_fpath = os.path.join(dpath, 'insulation.tsv')
+    insulation_table.to_csv(insulation_fpath, sep='\t', index=False)
+
+    return Dataset(mcool_fpath, insulation_fpath)
+
+def run(*argv:str):
+    #? Run a mode as from the command line
+    args = parser.parse_args([str(arg) for arg in argv])
+    if args.mode == 'ENCODE':
+        from hicmc.encode import encode
+        encode(args)
+    elif args.mode == 'DECODE':
+        from hicmc.decode import decode
+        decode(args)
+    elif args.mode == 'VERIFY':
+        from hicmc.verify import verify
+        verify(args)
+    elif args.mode == 'SWEEP':
+        from hicmc.sweep import sweep
+        sweep(args)
+    else:
+        raise ValueError(f'Invalid value for mode: {args.mode}')
+
+def encode_args(
+    dataset:Dataset,
+    output_fpath:str,
+    *options:str
+) -> t.List[str]:
+
+    return [
+        'ENCODE',
+        '--insulation-file', dataset.insulation_fpath,
+        '--insulation-window', INSULATION_WINDOW,
+        *options,
+        dataset.mcool_fpath,
+        RES,
+        output_fpath
+    ]
+
+def expected_matrix(
+    dataset:Dataset,
+    chr_name:str
+) -> t.NDArray[np.integer]:
+
+    return cooler.Cooler(dataset.cooler_uri).matrix(balance=False).fetch(chr_name)
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory) -> Dataset:
+    return write_dataset(str(tmp_path_factory.mktemp('dataset')))
+
+@pytest.fixture(scope='session', params=[None, TILE_SIZE], ids=['untiled', 'tiled'])
+def payload(request, dataset, tmp_path_factory) -> str:
+    #? Encoded dataset, untiled and tiled
+    tile_size = request.param
+    output_fpath = str(tmp_path_factory.mktemp('payload') / 'synthetic.hicmc')
+    options = ['--check-result'] + (['--tile-size', tile_size] if tile_size is not None else [])
+    run(*encode_args(dataset, output_fpath, *options))
+    return output_fpath
@@ -0,0 +1,15 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import sys
+import subprocess
+
+def test_lazy_imports():
+    #? The CLI (e.g. --help) does not import the dependencies of the modes and codecs
+    modules = ['cooler', 'pandas', 'pyppmd']
+    script = f'import sys, hicmc.__main__; print([name for name in {modules!r} if name in sys.modules])'
+    result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.dirname(__file__)) or '.', capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
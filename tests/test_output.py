@@ -0,0 +1,107 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import numpy as np
+import pandas as pd
+import cooler
+import pytest
+from hicmc import typing as t
+from hicmc import output
+from hicmc import decode
+from conftest import CHROMOSOMES, run, expected_matrix
+
+def _read_pixels(
+    fpath:str,
+    output_format:str
+) -> t.Tuple[t.NDArray, t.NDArray, t.NDArray, t.Optional[int]]:
+
+    #? Upper-triangle pixels of one chromosome (and the number of bins, if stored)
+    if output_format == 'npz':
+        pixels = np.load(fpath)
+        n = int(pixels['n'])
+        row_ids, col_ids, counts = pixels['row_ids'], pixels['col_ids'], pixels['counts']
+    else:
+        pixels = pd.read_csv(fpath) if output_format == 'csv' else pd.read_parquet(fpath)
+        n = None
+        row_ids, col_ids, counts = (pixels[name].to_numpy() for name in ('row_ids', 'col_ids', 'counts'))
+
+    assert np.all(row_ids <= col_ids)
+    return row_ids, col_ids, counts, n
+
+@pytest.mark.parametrize('output_format', list(output.FILE_WRITERS))
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_file_formats(dataset, payload, tmp_path, output_format, jobs):
+    output_dpath = str(tmp_path / 'decoded')
+    run('DECODE', '-j', jobs, '--output-format', output_format, payload, output_dpath)
+
+    for chr_idx, chr_name in enumerate(CHROMOSOMES):
+        fpath = os.path.join(output_dpath, f'{chr_idx:02}-{chr_idx:02}.{output.FILE_WRITERS[output_format][1]}')
+        expected = expected_matrix(dataset, chr_name)
+        if output_format == 'npy':
+            np.testing.assert_array_equal(np.load(fpath), expected)
+            continue
+
+        row_ids, col_ids, counts, n = _read_pixels(fpath, output_format)
+        if n is not None:
+            assert n == len(expected)
+
+        contact_mat = np.zeros_like(expected)
+        contact_mat[row_ids, col_ids] = counts
+        contact_mat[col_ids, row_ids] = counts
+        np.testing.assert_array_equal(contact_mat, expected)
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_cool_format(dataset, payload, tmp_path, jobs):
+    output_fpath = str(tmp_path / 'decoded.cool')
+    run('DECODE', '-j', jobs, '--output-format', 'cool', payload, output_fpath)
+
+    store = cooler.Cooler(output_fpath)
+    original = cooler.Cooler(dataset.cooler_uri)
+    assert store.chromnames == original.chromnames
+    assert store.binsize == original.binsize
+    for chr_name in CHROMOSOMES:
+        np.testing.assert_array_equal(store.matrix(balance=False).fetch(chr_name), expected_matrix(dataset, chr_name))
+
+    #? The KR-weights are divisive, the weight column multiplicative (default precision is float32)
+    weights = store.bins()[:]['weight'].to_numpy()
+    kr_weights = original.bins()[:]['KR'].to_numpy()
+    np.testing.assert_array_equal(np.isnan(weights), np.isnan(kr_weights))
+    np.testing.assert_allclose(weights, 1 / kr_weights, rtol=1e-6)
+
+def test_chromosome_error(dataset, payload, tmp_path, monkeypatch):
+    #? chr2 fails after its first chunk, the other chromosomes are written and the failure is raised at the end
+    iter_chromosome_pixels = decode.iter_chromosome_pixels
+
+    def _iter_chromosome_pixels(input_path, res, chr_name):
+        chunks = iter_chromosome_pixels(input_path, res, chr_name)
+        yield next(chunks)
+        if chr_name == 'chr2':
+            raise ValueError('decoding failed')
+
+        yield from chunks
+
+    monkeypatch.setattr(decode, 'iter_chromosome_pixels', _iter_chromosome_pixels)
+    output_dpath = str(tmp_path / 'decoded')
+    with pytest.raises(RuntimeError, match='chr2'):
+        run('DECODE', '-j', 1, '--output-format', 'npy', payload, output_dpath)
+
+    for chr_idx, chr_name in enumerate(CHROMOSOMES):
+        if chr_name == 'chr2':
+            continue
+
+        fpath = os.path.join(output_dpath, f'{chr_idx:02}-{chr_idx:02}.npy')
+        np.testing.assert_array_equal(np.load(fpath), expected_matrix(dataset, chr_name))
+
+def test_background_writer_error():
+    #? consume fails after the last item, close raises instead of waiting for more items
+    def consume(items):
+        list(items)
+        raise ValueError('consume failed')
+
+    writer = output.BackgroundWriter(consume)
+    writer.put(0)
+    with pytest.raises(ValueError):
+        writer.close()
@@ -0,0 +1,25 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+from hicmc import profiling
+from hicmc.decode import iter_chromosome_pixels
+from conftest import RES
+
+def test_iter_scope(payload):
+    #? Spans of the consumer between the chunks do not get the context of the chromosome
+    spans = []
+    profiling.add_hook(spans.append)
+    try:
+        for _ in iter_chromosome_pixels(payload, RES, 'chr1'):
+            with profiling.span('consume'):
+                pass
+
+    finally:
+        profiling.remove_hook(spans.append)
+
+    assert {_span.name for _span in spans} >= {'consume', 'decode_chromosome', 'read_chromosome', 'decode_model'}
+    for _span in spans:
+        expected = {} if _span.name == 'consume' else dict(res=RES, chr_name='chr1')
+        assert _span.context == expected
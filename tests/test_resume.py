@@ -0,0 +1,156 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import shutil
+import numpy as np
+import cooler
+import pytest
+from hicmc import constants as consts
+from hicmc import container
+from hicmc import encode
+from hicmc.decode import decode_chromosome
+from conftest import CHROMOSOMES, Dataset, run, encode_args, expected_matrix
+
+@pytest.fixture
+def local_dataset(dataset, tmp_path) -> Dataset:
+    #? Copy of the dataset, the tests modify the input
+    return Dataset(
+        shutil.copy(dataset.mcool_fpath, tmp_path),
+        shutil.copy(dataset.insulation_fpath, tmp_path)
+    )
+
+@pytest.fixture
+def calls(monkeypatch):
+    #? Chromosomes encoded and hashed by the encoder
+    _calls = dict(encoded=[], hashed=[])
+    for name, key in (('encode_chromosome_job', 'encoded'), ('hash_chromosome_job', 'hashed')):
+        def _job(_func=getattr(encode, name), _key=key, **kwargs):
+            _calls[_key].append(kwargs['chr_name'])
+            return _func(**kwargs)
+
+        monkeypatch.setattr(encode, name, _job)
+
+    return _calls
+
+def _encode(
+    calls,
+    dataset:Dataset,
+    output_fpath:str,
+    *options:str
+):
+    for _calls in calls.values():
+        _calls.clear()
+
+    run(*encode_args(dataset, output_fpath, '--resume', *options))
+
+def _assert_decoded(
+    dataset:Dataset,
+    output_fpath:str
+):
+    reader = container.open_payload(output_fpath)
+    for chr_name in CHROMOSOMES:
+        contact_mat = decode_chromosome(reader.read_chromosome(chr_name), reader.meta['tile_size'])
+        np.testing.assert_array_equal(contact_mat, expected_matrix(dataset, chr_name))
+
+def test_up_to_date(local_dataset, tmp_path, calls):
+    output_fpath = str(tmp_path / 'synthetic.hicmc')
+    _encode(calls, local_dataset, output_fpath)
+    assert calls['encoded'] == list(CHROMOSOMES)
+
+    #? Neither re-encoded nor hashed
+    _encode(calls, local_dataset, output_fpath)
+    assert calls == dict(encoded=[], hashed=[])
+    _assert_decoded(local_dataset, output_fpath)
+
+    with pytest.raises(FileExistsError):
+        run(*encode_args(local_dataset, output_fpath))
+
+def test_source_key(local_dataset, tmp_path, monkeypatch):
+    #? Without candidates, the source-key is only computed by the encoding job (the cooler is not opened before)
+    events = []
+    encode_chromosome_job = encode.encode_chromosome_job
+    input_source_key = encode.input_source_key
+
+    def _job(**kwargs):
+        events.append(('encode', kwargs['chr_name']))
+        return encode_chromosome_job(**kwargs)
+
+    def _source_key(cooler_uri, chr_name, boundary_mask):
+        events.append(('source_key', chr_name))
+        return input_source_key(cooler_uri, chr_name, boundary_mask)
+
+    monkeypatch.setattr(encode, 'encode_chromosome_job', _job)
+    monkeypatch.setattr(encode, 'input_source_key', _source_key)
+    run(*encode_args(local_dataset, str(tmp_path / 'synthetic.hicmc')))
+    assert events == [(event, chr_name) for chr_name in CHROMOSOMES for event in ('encode', 'source_key')]
+
+def test_params_changed(local_dataset, tmp_path, calls, monkeypatch):
+    output_fpath = str(tmp_path / 'synthetic.hicmc')
+    _encode(calls, local_dataset, output_fpath)
+
+    _encode(calls, local_dataset, output_fpath, '--tile-size', 16)
+    assert calls['encoded'] == list(CHROMOSOMES)
+    _assert_decoded(local_dataset, output_fpath)
+
+    #? Chromosomes encoded by an older model are stale
+    monkeypatch.setattr(consts, 'MODEL_VERSION', consts.MODEL_VERSION + 1)
+    _encode(calls, local_dataset, output_fpath, '--tile-size', 16)
+    assert calls['encoded'] == list(CHROMOSOMES)
+
+def test_input_touched(local_dataset, tmp_path, calls):
+    output_fpath = str(tmp_path / 'synthetic.hicmc')
+    _encode(calls, local_dataset, output_fpath)
+
+    #? The source-key changed, the input did not
+    stat = os.stat(local_dataset.mcool_fpath)
+    os.utime(local_dataset.mcool_fpath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    _encode(calls, local_dataset, output_fpath)
+    assert calls == dict(encoded=[], hashed=list(CHROMOSOMES))
+
+    #? The source-key is updated
+    _encode(calls, local_dataset, output_fpath)
+    assert calls == dict(encoded=[], hashed=[])
+
+def test_input_changed(local_dataset, tmp_path, calls):
+    output_fpath = str(tmp_path / 'synthetic.hicmc')
+    _encode(calls, local_dataset, output_fpath)
+
+    #? Change one pixel of chr2
+    with cooler.Cooler(local_dataset.cooler_uri).open('r+') as grp:
+        pixel_id = grp['indexes']['chrom_offset'][1]
+        pixel_id = grp['indexes']['bin1_offset'][pixel_id]
+        grp['pixels']['count'][pixel_id] += 1
+
+    _encode(calls, local_dataset, output_fpath)
+    assert calls['encoded'] == ['chr2']
+    _assert_decoded(local_dataset, output_fpath)
+
+def test_interrupted(local_dataset, tmp_path, calls, monkeypatch):
+    output_fpath = str(tmp_path / 'synthetic.hicmc')
+    encode_chromosome_job = encode.encode_chromosome_job
+
+    def _job(**kwargs):
+        if kwargs['chr_name'] == 'chr2':
+            raise KeyboardInterrupt
+
+        return encode_chromosome_job(**kwargs)
+
+    monkeypatch.setattr(encode, 'encode_chromosome_job', _job)
+    with pytest.raises(KeyboardInterrupt):
+        run(*encode_args(local_dataset, output_fpath))
+
+    assert not os.path.exists(output_fpath)
+    assert len(os.listdir(output_fpath + '.parts')) == 1
+
+    #? Parts of the interrupted run are reused without --resume
+    monkeypatch.setattr(encode, 'encode_chromosome_job', encode_chromosome_job)
+    for _calls in calls.values():
+        _calls.clear()
+
+    run(*encode_args(local_dataset, output_fpath))
+    assert calls['encoded'] == ['chr2', 'chrM']
+    assert not os.path.exists(output_fpath + '.parts')
+    _assert_decoded(local_dataset, output_fpath)
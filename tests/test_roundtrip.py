@@ -0,0 +1,73 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import os
+import shutil
+import numpy as np
+import cooler
+import pytest
+from hicmc import container
+from hicmc.decode import RegionDecoder, decode_chromosome
+from conftest import CHROMOSOMES, RES, run, expected_matrix
+
+LEGACY_DPATH = os.path.join(os.path.dirname(__file__), 'data', 'legacy-10kb')
+
+def test_decode_chromosome(dataset, payload):
+    reader = container.open_payload(payload)
+    for chr_name in CHROMOSOMES:
+        contact_mat = decode_chromosome(reader.read_chromosome(chr_name), reader.meta['tile_size'], reader.meta['stable_order'])
+        np.testing.assert_array_equal(contact_mat, expected_matrix(dataset, chr_name))
+
+@pytest.mark.parametrize('chr_name,start,end', [
+    ('chr1', 0, 120 * RES),
+    ('chr1', 155_000, 505_000),
+    ('chr1', 1_000_000, 1_195_000),
+    ('chr2', 730_000, 750_000),
+    ('chrM', 0, RES),
+])
+def test_decode_region(dataset, payload, chr_name, start, end):
+    #? Bins overlapping the region, as fetched by cooler
+    contact_mat = RegionDecoder(payload).decode_region(chr_name, start, end)
+    expected = cooler.Cooler(dataset.cooler_uri).matrix(balance=False).fetch(f'{chr_name}:{start}-{end}')
+    np.testing.assert_array_equal(contact_mat, expected)
+
+def test_legacy_distance_table(payload):
+    #? The distance-table is bit-identical to the one of the original encoder (same input and parameters)
+    reader = container.open_payload(payload)
+    legacy_reader = container.open_payload(LEGACY_DPATH)
+    stream_name = 'distance-table.fpizp'
+    for chr_name in CHROMOSOMES:
+        stream = reader.read_chromosome(chr_name, [stream_name])[stream_name]
+        assert stream.payload == legacy_reader.read_chromosome(chr_name, [stream_name])[stream_name].payload
+
+def test_verify(payload, tmp_path):
+    run('VERIFY', payload)
+
+    #? Flip the first byte of the largest stream of the container
+    corrupted_fpath = str(tmp_path / 'corrupted.hicmc')
+    shutil.copyfile(payload, corrupted_fpath)
+    reader = container.ContainerReader(corrupted_fpath)
+    entries = [entry for chromosome in reader.chromosomes.values() for entry in chromosome.values()]
+    offset = max(entries, key=lambda entry: entry['length'])['offset']
+    with open(corrupted_fpath, 'r+b') as file:
+        file.seek(offset)
+        value = file.read(1)
+        file.seek(offset)
+        file.write(bytes([value[0] ^ 0xFF]))
+
+    with pytest.raises(RuntimeError):
+        run('VERIFY', corrupted_fpath)
+
+def test_legacy_layout():
+    #? Payload of the original encoder (one directory per chromosome, np.argsort model-order)
+    expected = np.load(LEGACY_DPATH + '.npz')
+    reader = container.open_payload(LEGACY_DPATH)
+    assert reader.chr_names == list(CHROMOSOMES)
+    for chr_name in reader.chr_names:
+        contact_mat = decode_chromosome(reader.read_chromosome(chr_name), stable_order=False)
+        np.testing.assert_array_equal(contact_mat, expected[chr_name])
+
+    decoder = RegionDecoder(LEGACY_DPATH)
+    np.testing.assert_array_equal(decoder.decode_region('chr1', 155_000, 505_000), expected['chr1'][15:51, 15:51])
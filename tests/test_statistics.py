@@ -0,0 +1,53 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import numpy as np
+import pytest
+from hicmc import statistics as stats
+
+def _dense_symmetric(
+    rng:np.random.Generator,
+    n:int,
+    offset:float
+) -> np.ndarray:
+
+    mat = rng.poisson(3, size=(n, n)) * (rng.random((n, n)) < 0.4) + offset
+    mat = np.triu(mat)
+    return mat + np.triu(mat, 1).T
+
+@pytest.mark.parametrize('offset', [0, 1e9])
+def test_domain_moments(offset):
+    #? Statistics of every domain-matrix, including empty domains and values with a large mean (no cancellation)
+    rng = np.random.default_rng(0)
+    n = 60
+    contact_mat = _dense_symmetric(rng, n, offset)
+    boundaries = np.array([5, 17, 17, 30, 44])
+
+    moments = stats.domain_moments(contact_mat, boundaries)
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [n]])
+    for stat_name, stat_f in (('average', np.mean), ('deviation', np.std), ('sparsity', lambda block: 1 - np.count_nonzero(block) / block.size)):
+        domain_stats = stats.STATISTIC_FUNCS[stat_name](moments)
+        for row_idx, col_idx in np.ndindex(domain_stats.shape):
+            block = contact_mat[starts[row_idx]:ends[row_idx], starts[col_idx]:ends[col_idx]]
+            if not block.size:
+                assert np.isnan(domain_stats[row_idx, col_idx])
+                continue
+
+            np.testing.assert_allclose(domain_stats[row_idx, col_idx], stat_f(block), rtol=1e-12, atol=1e-6)
+
+@pytest.mark.parametrize('offset', [0, 1e9])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_grouped_statistic(offset, dtype):
+    #? Bit-identical to numpy, including groups larger than a pairwise-block and the buffer-size
+    rng = np.random.default_rng(0)
+    sizes = np.array([10, 1, 7, 8, 9, 128, 129, 1000, np.getbufsize() + 1, 20_000])
+    values = (rng.random(np.sum(sizes)) * 10 + offset).astype(dtype)
+    values[rng.random(len(values)) < 0.3] = 0
+
+    groups = np.split(values, np.cumsum(sizes)[:-1])
+    np.testing.assert_array_equal(stats.grouped_statistic(stats.average, values, sizes), [np.average(group) for group in groups])
+    np.testing.assert_array_equal(stats.grouped_statistic(stats.deviation, values, sizes), [np.std(group) for group in groups])
+    np.testing.assert_allclose(stats.grouped_statistic(stats.sparsity, values, sizes), [1 - np.count_nonzero(group) / len(group) for group in groups])
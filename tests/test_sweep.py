@@ -0,0 +1,45 @@
+##
+# @author Yeremia G. Adhisantoso <adhisant@tnt.uni-hannover.de>
+# @file Description
+# @copyright Institute fuer Informationsverarbeitung
+
+import json
+from hicmc import sweep
+from hicmc import container
+from conftest import CHROMOSOMES, INSULATION_WINDOW, RES, run, encode_args
+
+def test_sweep(dataset, tmp_path, monkeypatch):
+    #? Each chromosome is fetched once for all weights-precisions
+    fetched = []
+    fetch_chromosome = sweep.fetch_chromosome
+
+    def _fetch_chromosome(cooler_uri, chr_name, balancing_name):
+        fetched.append(chr_name)
+        return fetch_chromosome(cooler_uri, chr_name, balancing_name)
+
+    monkeypatch.setattr(sweep, 'fetch_chromosome', _fetch_chromosome)
+    report_fpath = str(tmp_path / 'report.json')
+    run(
+        'SWEEP',
+        '--insulation-file', dataset.insulation_fpath,
+        '--insulation-window', INSULATION_WINDOW,
+        '--weights-precision', '16,32',
+        dataset.mcool_fpath,
+        RES,
+        report_fpath
+    )
+    assert fetched == list(CHROMOSOMES)
+
+    with open(report_fpath) as f:
+        report = json.load(f)
+
+    #? The sizes of the default setting are those of the encoded streams
+    output_fpath = str(tmp_path / 'synthetic.hicmc')
+    run(*encode_args(dataset, output_fpath))
+    reader = container.open_payload(output_fpath)
+    for chr_name in CHROMOSOMES:
+        results = report['chromosomes'][f'{RES}/{chr_name}']['results']
+        assert [result['weights_precision'] for result in results] == [16, 32]
+
+        size = sum(len(stream.payload) for stream in reader.read_chromosome(chr_name).values())
+        assert results[1]['size'] == size